@@ -0,0 +1,353 @@
+# cassette.py
+import atexit
+import io
+import json
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from profiling import count_exec
+
+# ================================ Record / replay ================================
+# record: every command boundary (run_remote, run_local, scp, SSHSession, Popen'ed processes, RPC)
+#         is executed for real and logged with its arguments, outputs, exit code and timing.
+# replay: the same boundaries are served from the cassette, nothing is executed; either instantly
+#         or with the recorded delays. Lets verify()/perform_swap be benchmarked and regression-tested
+#         without SSH, validators or RPC (local key/ledger paths still have to exist).
+#
+# Interactions are matched per (kind, normalized key) in recorded order. Volatile tokens in keys
+# (timestamps, time_ns-based file names) are normalized so a replay matches a later run.
+
+_MODE = "off"                 # off | record | replay
+_PATH: Path | None = None
+_REALTIME = False
+_LOCK = threading.Lock()
+_TAPE: list[dict] = []
+_QUEUES: dict[str, list[dict]] = {}
+_T0 = time.monotonic()
+_VOLATILE = re.compile(r"\d{9,}(?:\.\d+)?")
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+def set_cassette(mode: str, path: Path | str | None, realtime: bool = False) -> None:
+    global _MODE, _PATH, _REALTIME, _TAPE, _QUEUES
+    if mode not in ("off", "record", "replay"):
+        raise RuntimeError(f"unknown cassette mode '{mode}'")
+    _MODE, _PATH, _REALTIME = mode, (Path(path) if path else None), realtime
+    _TAPE, _QUEUES = [], {}
+    if mode == "replay":
+        data = json.loads(Path(path).read_text())
+        for it in data.get("interactions", []):
+            _QUEUES.setdefault(_match_key(it["kind"], it["key"]), []).append(it)
+    elif mode == "record":
+        atexit.register(save)
+
+
+def cassette_mode() -> str:
+    return _MODE
+
+
+def save() -> None:
+    if _MODE != "record" or _PATH is None:
+        return
+    with _LOCK:
+        data = {"version": 1, "interactions": list(_TAPE)}
+    _PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _PATH.with_suffix(_PATH.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=1, default=str))
+    tmp.replace(_PATH)
+
+
+def _norm(v):
+    if isinstance(v, str):
+        return _VOLATILE.sub("#", v)
+    if isinstance(v, (list, tuple)):
+        return [_norm(x) for x in v]
+    if isinstance(v, dict):
+        return {k: _norm(x) for k, x in sorted(v.items())}
+    return v
+
+
+def _match_key(kind: str, key: dict) -> str:
+    return kind + " " + json.dumps(_norm(key), sort_keys=True, default=str)
+
+
+def _new(kind: str, key: dict) -> dict:
+    it = {"kind": kind, "key": key, "t": round(time.monotonic() - _T0, 4)}
+    with _LOCK:
+        _TAPE.append(it)
+    return it
+
+
+def _next(kind: str, key: dict) -> dict:
+    with _LOCK:
+        q = _QUEUES.get(_match_key(kind, key))
+        if not q:
+            raise CassetteMiss(f"[CASSETTE] no recorded {kind} for {json.dumps(key, default=str)[:300]}")
+        return q.pop(0)
+
+
+def _sleep(ms: float | None) -> None:
+    if _REALTIME and ms:
+        time.sleep(ms / 1000.0)
+
+
+def _encode(v):
+    if isinstance(v, subprocess.CompletedProcess):
+        return {"__cp__": True, "args": v.args, "rc": v.returncode, "stdout": v.stdout, "stderr": v.stderr}
+    return v
+
+
+def _decode(v):
+    if isinstance(v, dict) and v.get("__cp__"):
+        return subprocess.CompletedProcess(v["args"], v["rc"], v["stdout"], v["stderr"])
+    if isinstance(v, list):
+        return tuple(v)
+    return v
+
+
+# attributes that are not in .args but are needed to rebuild the exception (OSError, subprocess errors)
+_EXC_ATTRS = ("errno", "strerror", "filename", "returncode", "cmd", "timeout", "output", "stderr")
+
+
+def _record_exc(it: dict, e: Exception, t0: float) -> None:
+    it.update(exc=type(e).__name__, module=type(e).__module__, msg=str(e),
+              args=[a if isinstance(a, (str, int, float, bool, type(None))) else str(a) for a in e.args],
+              attrs={k: getattr(e, k) for k in _EXC_ATTRS if getattr(e, k, None) is not None},
+              ms=round((time.perf_counter() - t0) * 1000.0, 3))
+
+
+def _exc_class(it: dict) -> type:
+    # domain exceptions (RttGateClosed, BudgetExceeded, ...) live in modules a replay has imported already
+    for mod in (it.get("module"), "builtins", "subprocess"):
+        cls = getattr(sys.modules.get(mod or ""), it["exc"], None)
+        if isinstance(cls, type) and issubclass(cls, Exception):
+            return cls
+    return RuntimeError
+
+
+def _raise(it: dict):
+    """Raise the recorded exception again, as its own type with its arguments."""
+    cls, msg, a = _exc_class(it), it.get("msg", ""), it.get("attrs") or {}
+    if issubclass(cls, subprocess.TimeoutExpired):
+        raise cls(a.get("cmd", it["key"].get("cmd", it["kind"])), a.get("timeout", it.get("timeout")) or 0,
+                  output=a.get("output"), stderr=a.get("stderr"))
+    if issubclass(cls, subprocess.CalledProcessError):
+        raise cls(a.get("returncode", 1), a.get("cmd", it["key"].get("cmd", it["kind"])),
+                  output=a.get("output"), stderr=a.get("stderr"))
+    if issubclass(cls, OSError) and "errno" in a:
+        raise cls(a["errno"], a.get("strerror", msg), *([a["filename"]] if "filename" in a else []))
+    try:
+        e = cls(*it.get("args", [msg]))
+    except Exception:
+        e = RuntimeError(msg)
+    raise e
+
+
+def cassette_call(kind: str, key: dict, fn: Callable):
+    """Run fn() (record/off) or serve its recorded result/exception (replay)."""
+    count_exec(kind)
+    if _MODE == "off":
+        return fn()
+    if _MODE == "replay":
+        it = _next(kind, key)
+        _sleep(it.get("ms"))
+        if "exc" in it:
+            _raise(it)
+        return _decode(it.get("result"))
+    it = _new(kind, key)
+    t0 = time.perf_counter()
+    try:
+        res = fn()
+    except Exception as e:
+        _record_exc(it, e, t0)
+        raise
+    it.update(result=_encode(res), ms=round((time.perf_counter() - t0) * 1000.0, 3))
+    return res
+
+
+# ------------------------------- Popen'ed processes -------------------------------
+
+class _RecStream:
+    """Line iterator over a real text stream; records (ms since spawn, line)."""
+
+    def __init__(self, stream, rec: list, t0: float):
+        self._s, self._rec, self._t0 = stream, rec, t0
+
+    def __iter__(self):
+        for line in self._s:
+            self._rec.append([round((time.perf_counter() - self._t0) * 1000.0, 3), line])
+            yield line
+
+    def readline(self):
+        line = self._s.readline()
+        if line:
+            self._rec.append([round((time.perf_counter() - self._t0) * 1000.0, 3), line])
+        return line
+
+    def __getattr__(self, name):
+        return getattr(self._s, name)
+
+
+class RecordingProcess:
+    """Popen proxy that logs streamed lines, communicate() results and the exit code."""
+
+    def __init__(self, real, it: dict):
+        self._p, self._it = real, it
+        self._t0 = time.perf_counter()
+        it.update(lines=[], rc=None, exit_ms=None)
+        self.stdin = real.stdin
+        self.stdout = _RecStream(real.stdout, it["lines"], self._t0) if real.stdout is not None else None
+        self.stderr = real.stderr
+        self.pid = real.pid
+
+    def _done(self, rc):
+        if rc is not None and self._it["rc"] is None:
+            self._it.update(rc=rc, exit_ms=round((time.perf_counter() - self._t0) * 1000.0, 3))
+        return rc
+
+    @property
+    def returncode(self):
+        return self._done(self._p.returncode)
+
+    def poll(self):
+        return self._done(self._p.poll())
+
+    def wait(self, timeout=None):
+        return self._done(self._p.wait(timeout))
+
+    def communicate(self, input=None, timeout=None):
+        t = time.perf_counter()
+        try:
+            out, err = self._p.communicate(input=input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._it.setdefault("communicate", []).append({"timeout": True})
+            raise
+        self._it.setdefault("communicate", []).append(
+            {"out": out, "err": err, "ms": round((time.perf_counter() - t) * 1000.0, 3)})
+        self._done(self._p.returncode)
+        return out, err
+
+    def kill(self):
+        self._p.kill()
+
+    def terminate(self):
+        self._p.terminate()
+
+    def send_signal(self, sig):
+        self._p.send_signal(sig)
+
+
+class _ReplayStream:
+    def __init__(self, lines: list, t0: float):
+        self._lines, self._t0 = list(lines), t0
+        self.closed = False
+
+    def _wait_until(self, ms: float) -> None:
+        if _REALTIME:
+            left = ms / 1000.0 - (time.perf_counter() - self._t0)
+            if left > 0:
+                time.sleep(left)
+
+    def __iter__(self):
+        while self._lines:
+            yield self.readline()
+
+    def readline(self):
+        if not self._lines:
+            return ""
+        ms, line = self._lines.pop(0)
+        self._wait_until(ms)
+        return line
+
+    def read(self, n: int = -1):
+        return "".join(iter(self.readline, ""))
+
+    def close(self):
+        self.closed = True
+
+
+class ReplayProcess:
+    """Serves a recorded process: streamed lines, communicate() results, exit code (instant or timed)."""
+
+    pid = 0
+
+    def __init__(self, it: dict):
+        self._it = it
+        self._t0 = time.perf_counter()
+        self._comm = list(it.get("communicate") or [])
+        self._killed = False
+        self.stdin = io.StringIO()
+        self.stdout = _ReplayStream(it.get("lines") or [], self._t0)
+        self.stderr = None
+        self.returncode = None
+
+    def _exited(self) -> bool:
+        if self._killed:
+            return True
+        if self._it.get("rc") is None:
+            return False
+        if not _REALTIME:
+            return not self.stdout._lines
+        return (time.perf_counter() - self._t0) * 1000.0 >= (self._it.get("exit_ms") or 0)
+
+    def poll(self):
+        if self.returncode is None and self._exited():
+            self.returncode = -9 if self._killed and self._it.get("rc") is None else self._it.get("rc")
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.poll() is None:
+            if self._it.get("rc") is None and not _REALTIME:
+                raise subprocess.TimeoutExpired("replay", timeout or 0)
+            if deadline is not None and time.perf_counter() >= deadline:
+                raise subprocess.TimeoutExpired("replay", timeout)
+            time.sleep(0.001)
+        return self.returncode
+
+    def communicate(self, input=None, timeout=None):
+        rec = self._comm.pop(0) if self._comm else {"timeout": True}
+        if rec.get("timeout"):
+            if _REALTIME and timeout:
+                time.sleep(timeout)
+            raise subprocess.TimeoutExpired("replay", timeout or 0)
+        _sleep(rec.get("ms"))
+        self.stdout._lines = []
+        self.returncode = self._it.get("rc")
+        return rec.get("out"), rec.get("err")
+
+    def kill(self):
+        self._killed = True
+
+    terminate = kill
+
+    def send_signal(self, sig):
+        self._killed = True
+
+
+def cassette_popen(kind: str, key: dict, factory: Callable):
+    """Popen-like object: real (off), recording proxy (record) or recorded playback (replay)."""
+    count_exec(kind)
+    if _MODE == "off":
+        return factory()
+    if _MODE == "replay":
+        it = _next(kind, key)
+        if "exc" in it:
+            _raise(it)
+        return ReplayProcess(it)
+    it = _new(kind, key)
+    t0 = time.perf_counter()
+    try:
+        real = factory()
+    except Exception as e:
+        _record_exc(it, e, t0)    # e.g. a missing binary: replayed as the same error
+        raise
+    return RecordingProcess(real, it)
@@ -8,13 +8,17 @@ from remote_config import (
     LEDGER_PATH_DEFAULT,
     LOCAL_VALIDATOR_KEY,
     LOCAL_UNSTAKED_IDENTITY,
+    MAIN_UNSTAKED_IDENTITY,
+    MAIN_VALIDATOR_KEY,
     REMOTE_VALIDATOR_KEY,
 )
-from verify_identity import verify
+# the command modules (SSH helpers, swap machinery, seed) are imported in main() after argument parsing:
+# usage errors, --plan scripting and the fleet runner do not pay for what the command never uses
 
 
 @dataclass(frozen=True)
 class CliArgs:
+    command: str
     ledger: Path
     local_validator_key: Path
     local_unstaked_identity: Path
@@ -25,13 +29,60 @@ class CliArgs:
     force_main_client: str | None
     force_remote_client: str | None
     verbose: bool
+    login_shell: bool
+    refresh_env: bool
+    fd_mode: str
+    fd_trigger_delay_ms: int
+    agave_mode: str
+    main_timeout: float | None
+    main_early_signal: str | None
+    auto_rollback: bool
+    update_hook: str | None
+    catchup_timeout: float
+    rpc_url: str | None
+    remote_unstaked_identity: str | None
+    max_slot_lag: int | None
+    slot_lag_wait: float
+    plan_only: bool
+    spawn_method: str | None
+    low_jitter: bool
+    low_jitter_cpu: int | None
+    low_jitter_rt: bool
+    low_jitter_report: bool
+    vote_gap: bool
+    vote_gap_wait: float
+    vote_account_check: bool
+    vote_account_wait: float
+    metrics_out: Path | None
+    prewarm: bool
+    prewarm_exec: bool
+    budget: float | None
+    controller: bool
+    tower_trigger: bool
+    tower_trigger_wait: float
+    rtt_gate: bool
+    rtt_gate_factor: float
+    rtt_gate_wait: float
+    rtt_gate_rebaseline: bool
+    record: Path | None
+    replay: Path | None
+    replay_realtime: bool
+    profile: Path | None
+    profile_top: int
+    streams: int | None
+    chunk_mb: int | None
+    rate_limit_mbps: float
+    snapshots_dir: Path | None
+    remote_snapshots_dir: str | None
 
 
 def parse_args(argv: list[str]) -> CliArgs:
-    if len(argv) < 2 or argv[1] != "verify":
+    if len(argv) < 2 or argv[1] not in ("verify", "update", "seed"):
         print("Usage:")
         print("python ... verify [--ledger /path] [--local-validator-key /path] [--local-unstaked-identity /path]")
         print("[--remote-validator-key '$HOME/...'] [--remote-ledger '/path/on/secondary']")
+        print("python ... update [verify options] [--update-hook 'cmd'] [--catchup-timeout SEC] [--rpc-url URL]")
+        print("python ... seed [--ledger /path] [--remote-ledger /path] [--streams N] [--chunk-mb MB] [--rate-limit-mbps MBIT]")
         raise SystemExit(2)
 
     rest = argv[2:]
@@ -46,6 +97,72 @@ def parse_args(argv: list[str]) -> CliArgs:
     p.add_argument("--fast", dest="fast", action="store_true")
     p.add_argument("--main-client", dest="force_main_client", choices=["AGAVE","FD"], default=None)
     p.add_argument("--remote-client", dest="force_remote_client", choices=["AGAVE","FD"], default=None)
+    # SECONDARY env: snapshot of login env by default; --login-shell forces `bash -lc` per call
+    p.add_argument("--login-shell", dest="login_shell", action="store_true")
+    p.add_argument("--refresh-env", dest="refresh_env", action="store_true")
+    # FD trigger: auto picks mode/delay from RTT probes and recorded swap timings
+    p.add_argument("--fd-mode", dest="fd_mode", choices=["sequential", "armed", "bg", "auto"], default="sequential")
+    p.add_argument("--fd-trigger-delay-ms", dest="fd_trigger_delay_ms", type=int, default=10)
+    p.add_argument("--agave-mode", dest="agave_mode", choices=["sequential", "armed", "bg"], default="sequential")
+    # MAIN set-identity gating: timeout and optional early-signal regex on its output
+    p.add_argument("--main-timeout", dest="main_timeout", type=float, default=None)
+    p.add_argument("--main-early-signal", dest="main_early_signal", type=str, default=None)
+    p.add_argument("--no-rollback", dest="auto_rollback", action="store_false")
+    # preflight slot-lag gate (MAIN vs SECONDARY local RPCs)
+    p.add_argument("--max-slot-lag", dest="max_slot_lag", type=int, default=10)
+    p.add_argument("--slot-lag-wait", dest="slot_lag_wait", type=float, default=60.0)
+    p.add_argument("--skip-slot-check", dest="skip_slot_check", action="store_true")
+    # dry run: read-only checks + swap step plan (round trips, critical-path estimate), no changes
+    p.add_argument("--plan", dest="plan_only", action="store_true")
+    # local process spawn for MAIN set-identity and local helpers (benchmark: python spawner.py)
+    p.add_argument("--spawn", dest="spawn_method", choices=["popen", "posix_spawn", "zygote"], default=None)
+    # critical section: gc off, CPU pin, priority boost, mlock (best effort) + wake-up jitter rehearsal
+    p.add_argument("--low-jitter", dest="low_jitter", action="store_true")
+    p.add_argument("--low-jitter-cpu", dest="low_jitter_cpu", type=int, default=None)
+    p.add_argument("--low-jitter-rt", dest="low_jitter_rt", action="store_true")
+    p.add_argument("--low-jitter-report", dest="low_jitter_report", action="store_true")
+    # after the swap: real vote gap from both validator logs (attached to the swap record)
+    p.add_argument("--vote-gap", dest="vote_gap", action="store_true")
+    p.add_argument("--vote-gap-wait", dest="vote_gap_wait", type=float, default=10.0)
+    # vote account lastVote/credits before the trigger vs. first post-swap landed vote (MAIN local RPC)
+    p.add_argument("--vote-account-check", dest="vote_account_check", action="store_true")
+    p.add_argument("--vote-account-wait", dest="vote_account_wait", type=float, default=30.0)
+    # append the swap record (timings + vote metrics) as a JSON line
+    p.add_argument("--metrics-out", dest="metrics_out", type=Path, default=None)
+    # pre-trigger page-cache warm-up of set-identity binaries/libs/keys on both nodes (+ optional version exec)
+    p.add_argument("--no-prewarm", dest="prewarm", action="store_false")
+    p.add_argument("--prewarm-exec", dest="prewarm_exec", action="store_true")
+    # swap-wide deadline (s, from ENTER): steps get the time left; overrun before the trigger aborts cleanly
+    p.add_argument("--budget", dest="budget", type=float, default=None)
+    # run from a third host: MAIN is reached over SSH (MAIN_SSH_* in .env), MAIN paths are remote
+    p.add_argument("--controller", dest="controller", action="store_true")
+    # fire right after MAIN's next tower write (its vote), shipping the fresh tower with the trigger
+    p.add_argument("--tower-trigger", dest="tower_trigger", action="store_true")
+    p.add_argument("--tower-trigger-wait", dest="tower_trigger_wait", type=float, default=5.0)
+    # right before MAIN is touched: pings over the open SECONDARY session vs. the pair's baseline RTT
+    p.add_argument("--rtt-gate", dest="rtt_gate", action="store_true")
+    p.add_argument("--rtt-gate-factor", dest="rtt_gate_factor", type=float, default=2.0)
+    p.add_argument("--rtt-gate-wait", dest="rtt_gate_wait", type=float, default=5.0)
+    p.add_argument("--rtt-gate-rebaseline", dest="rtt_gate_rebaseline", action="store_true")
+    # record every command/RPC boundary to a cassette, or replay one without SSH/validators/RPC
+    p.add_argument("--record", dest="record", type=Path, default=None)
+    p.add_argument("--replay", dest="replay", type=Path, default=None)
+    p.add_argument("--replay-realtime", dest="replay_realtime", action="store_true")
+    # cProfile + per-phase CPU/spawn/SSH accounting of the tool itself; pstats written to PATH
+    p.add_argument("--profile", dest="profile", type=Path, default=None)
+    p.add_argument("--profile-top", dest="profile_top", type=int, default=15)
+    # seed: newest full + incremental snapshot MAIN -> SECONDARY (parallel, resumable, sha256 per chunk)
+    p.add_argument("--streams", dest="streams", type=int, default=None)        # None -> seed.STREAMS_DEFAULT
+    p.add_argument("--chunk-mb", dest="chunk_mb", type=int, default=None)      # None -> seed.CHUNK_MB_DEFAULT
+    p.add_argument("--rate-limit-mbps", dest="rate_limit_mbps", type=float, default=0.0)
+    p.add_argument("--snapshots-dir", dest="snapshots_dir", type=Path, default=None)
+    p.add_argument("--remote-snapshots-dir", dest="remote_snapshots_dir", type=str, default=None)
+    # update: swap out, run/await hook on MAIN, wait for catch-up, swap back
+    p.add_argument("--update-hook", dest="update_hook", type=str, default=None)
+    p.add_argument("--catchup-timeout", dest="catchup_timeout", type=float, default=3600.0)
+    p.add_argument("--rpc-url", dest="rpc_url", type=str, default=None)
+    # SECONDARY's unstaked key: swap back, and the way off the validator key if MAIN fails after an early trigger
+    p.add_argument("--remote-unstaked-identity", dest="remote_unstaked_identity", type=str, default=None)
     # Verbosity: default ON, allow --quiet to turn off
     p.add_argument("-v", "--verbose", action="store_true", default=None)
     p.add_argument("-q", "--quiet", action="store_true", default=False)
@@ -57,11 +174,17 @@ def parse_args(argv: list[str]) -> CliArgs:
 
     # verbose default: True unless --quiet; if -v set, keep True
     verbose_effective = False if args.quiet else (True if args.verbose is None else args.verbose)
+    if args.controller and argv[1] != "verify":
+        print(f"--controller is supported for verify only (the {argv[1]} workflow runs on MAIN)")
+        raise SystemExit(2)
+    main_key_default = MAIN_VALIDATOR_KEY if args.controller else LOCAL_VALIDATOR_KEY
+    main_unstaked_default = MAIN_UNSTAKED_IDENTITY if args.controller else LOCAL_UNSTAKED_IDENTITY
 
     return CliArgs(
+        command=argv[1],
         ledger=args.ledger,
-        local_validator_key=(args.local_validator_key or LOCAL_VALIDATOR_KEY),
-        local_unstaked_identity=(args.local_unstaked_identity or LOCAL_UNSTAKED_IDENTITY),
+        local_validator_key=Path(args.local_validator_key or main_key_default),
+        local_unstaked_identity=Path(args.local_unstaked_identity or main_unstaked_default),
         remote_validator_key=(args.remote_validator_key or str(REMOTE_VALIDATOR_KEY)),
         remote_ledger=args.remote_ledger,
         assume_yes=args.assume_yes,
@@ -69,27 +192,143 @@ def parse_args(argv: list[str]) -> CliArgs:
         force_main_client=args.force_main_client,
         force_remote_client=args.force_remote_client,
         verbose=verbose_effective,
+        login_shell=args.login_shell,
+        refresh_env=args.refresh_env,
+        fd_mode=args.fd_mode,
+        fd_trigger_delay_ms=args.fd_trigger_delay_ms,
+        agave_mode=args.agave_mode,
+        main_timeout=args.main_timeout,
+        main_early_signal=args.main_early_signal,
+        auto_rollback=args.auto_rollback,
+        update_hook=args.update_hook,
+        catchup_timeout=args.catchup_timeout,
+        rpc_url=args.rpc_url,
+        remote_unstaked_identity=args.remote_unstaked_identity,
+        max_slot_lag=(None if args.skip_slot_check else args.max_slot_lag),
+        slot_lag_wait=args.slot_lag_wait,
+        plan_only=args.plan_only,
+        spawn_method=args.spawn_method,
+        low_jitter=(args.low_jitter or args.low_jitter_rt or args.low_jitter_report
+                    or args.low_jitter_cpu is not None),
+        low_jitter_cpu=args.low_jitter_cpu,
+        low_jitter_rt=args.low_jitter_rt,
+        low_jitter_report=args.low_jitter_report,
+        vote_gap=args.vote_gap,
+        vote_gap_wait=args.vote_gap_wait,
+        vote_account_check=args.vote_account_check,
+        vote_account_wait=args.vote_account_wait,
+        metrics_out=args.metrics_out,
+        prewarm=args.prewarm,
+        prewarm_exec=args.prewarm_exec,
+        budget=args.budget,
+        controller=args.controller,
+        tower_trigger=args.tower_trigger,
+        tower_trigger_wait=args.tower_trigger_wait,
+        rtt_gate=args.rtt_gate,
+        rtt_gate_factor=args.rtt_gate_factor,
+        rtt_gate_wait=args.rtt_gate_wait,
+        rtt_gate_rebaseline=args.rtt_gate_rebaseline,
+        record=args.record,
+        replay=args.replay,
+        replay_realtime=args.replay_realtime,
+        profile=args.profile,
+        profile_top=args.profile_top,
+        streams=args.streams,
+        chunk_mb=args.chunk_mb,
+        rate_limit_mbps=args.rate_limit_mbps,
+        snapshots_dir=args.snapshots_dir,
+        remote_snapshots_dir=args.remote_snapshots_dir,
     )
 
 
-if __name__ == "__main__":
-    a = parse_args(sys.argv)
+def main(argv: list[str]) -> int:
+    a = parse_args(argv)
+    kwargs = dict(
+        local_unstaked_identity=a.local_unstaked_identity,
+        remote_validator_key=a.remote_validator_key,
+        remote_ledger=a.remote_ledger,
+        assume_yes=a.assume_yes,
+        fast=a.fast,
+        force_main_client=a.force_main_client,
+        force_remote_client=a.force_remote_client,
+        verbose=a.verbose,
+        login_shell=a.login_shell,
+        refresh_env=a.refresh_env,
+        fd_mode=a.fd_mode,
+        fd_trigger_delay_ms=a.fd_trigger_delay_ms,
+        agave_mode=a.agave_mode,
+        main_timeout=a.main_timeout,
+        main_early_signal=a.main_early_signal,
+        auto_rollback=a.auto_rollback,
+        max_slot_lag=a.max_slot_lag,
+        slot_lag_wait=a.slot_lag_wait,
+        plan_only=a.plan_only,
+        spawn_method=a.spawn_method,
+        low_jitter=a.low_jitter,
+        low_jitter_cpu=a.low_jitter_cpu,
+        low_jitter_rt=a.low_jitter_rt,
+        low_jitter_report=a.low_jitter_report,
+        vote_gap=a.vote_gap,
+        vote_gap_wait=a.vote_gap_wait,
+        vote_account_check=a.vote_account_check,
+        vote_account_wait=a.vote_account_wait,
+        metrics_out=a.metrics_out,
+        prewarm=a.prewarm,
+        prewarm_exec=a.prewarm_exec,
+        budget=a.budget,
+        controller=a.controller,
+        tower_trigger=a.tower_trigger,
+        tower_trigger_wait=a.tower_trigger_wait,
+        rtt_gate=a.rtt_gate,
+        rtt_gate_factor=a.rtt_gate_factor,
+        rtt_gate_wait=a.rtt_gate_wait,
+        rtt_gate_rebaseline=a.rtt_gate_rebaseline,
+        remote_unstaked_identity=a.remote_unstaked_identity,
+        record=a.record,
+        replay=a.replay,
+        replay_realtime=a.replay_realtime,
+    )
+    if a.profile:
+        from profiling import start_profile
+        start_profile("verify")
     try:
-        code = verify(
-            a.ledger,
-            a.local_validator_key,
-            local_unstaked_identity=a.local_unstaked_identity,
-            remote_validator_key=a.remote_validator_key,
-            remote_ledger=a.remote_ledger,
-            assume_yes=a.assume_yes,
-            fast=a.fast,
-            force_main_client=a.force_main_client,
-            force_remote_client=a.force_remote_client,
-            verbose=a.verbose,
-        )
+        if a.command == "seed":
+            from seed import CHUNK_MB_DEFAULT, STREAMS_DEFAULT, run_seed
+            code = run_seed(
+                a.ledger,
+                remote_ledger=a.remote_ledger,
+                snapshots_dir=a.snapshots_dir,
+                remote_snapshots_dir=a.remote_snapshots_dir,
+                streams=(a.streams if a.streams is not None else STREAMS_DEFAULT),
+                chunk_mb=(a.chunk_mb if a.chunk_mb is not None else CHUNK_MB_DEFAULT),
+                rate_limit_mbps=a.rate_limit_mbps,
+                assume_yes=a.assume_yes,
+                verbose=a.verbose,
+            )
+        elif a.command == "update":
+            from update_workflow import run_update
+            code = run_update(
+                a.ledger,
+                a.local_validator_key,
+                update_hook=a.update_hook,
+                catchup_timeout=a.catchup_timeout,
+                rpc_url=a.rpc_url,
+                **kwargs,
+            )
+        else:
+            from verify_identity import verify
+            code = verify(a.ledger, a.local_validator_key, **kwargs)
     except KeyboardInterrupt:
         code = 130
     except Exception as e:
         print("ERROR:", e)
         code = 1
-    sys.exit(code)
\ No newline at end of file
+    finally:
+        if a.profile:
+            from profiling import stop_profile
+            stop_profile(a.profile, a.profile_top)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,238 @@
+# lowjitter.py
+import gc
+import os
+import resource
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+
+from spawner import set_child_reset
+
+# ============================ Low-jitter critical section ============================
+# Applied around the swap trigger: GC off, CPU pin, higher scheduling priority, mlockall.
+# Every knob is best effort: what could not be applied is reported, never fatal.
+# Children spawned meanwhile (set-identity, ssh, scp) get the original affinity and nice back.
+# The CPU choice samples /proc/stat and the rehearsal runs for a while: both belong to planning,
+# entering the mode right before the critical steps is only a handful of syscalls.
+
+MCL_CURRENT, MCL_FUTURE = 1, 2
+RT_PRIORITY = 10          # SCHED_FIFO priority (1..99); low on purpose, above normal tasks only
+NICE_BOOST = -10
+REHEARSAL_RUNS = 200
+REHEARSAL_PERIOD_S = 0.001
+CPU_SAMPLE_S = 0.2        # /proc/stat sampling window for the automatic CPU choice
+CPU_IDLE_MIN = 0.9        # below this idle share a CPU counts as busy (e.g. a pinned validator tile)
+
+
+@dataclass
+class LowJitterState:
+    applied: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    cpu: int | None = None
+    _gc_was_enabled: bool = True
+    _affinity: set[int] | None = None
+    _sched: tuple[int, int] | None = None
+    _nice: int | None = None
+    _mlocked: bool = False
+
+
+def _libc():
+    try:
+        import ctypes
+        import ctypes.util
+    except ImportError:
+        return None
+    name = ctypes.util.find_library("c")
+    return ctypes.CDLL(name, use_errno=True) if name else None
+
+
+def _cpu_idle(cpus: list[int], sample_s: float = CPU_SAMPLE_S) -> dict[int, float]:
+    """Idle share per CPU over sample_s, from /proc/stat (idle + iowait over all jiffies). {} if unreadable."""
+    def snap() -> dict[int, tuple[int, int]]:
+        res = {}
+        with open("/proc/stat") as f:
+            for line in f:
+                name, *vals = line.split()
+                if name.startswith("cpu") and name[3:].isdigit():
+                    v = [int(x) for x in vals[:8]]
+                    res[int(name[3:])] = (v[3] + v[4], sum(v))
+        return res
+
+    try:
+        a = snap()
+        time.sleep(sample_s)
+        b = snap()
+    except (OSError, ValueError, IndexError):
+        return {}
+    return {c: (b[c][0] - a[c][0]) / max(1, b[c][1] - a[c][1]) for c in cpus if c in a and c in b}
+
+
+def pick_cpu(cpu: int | None) -> tuple[int | None, str]:
+    """(cpu, reason when None). Automatic choice: the idlest allowed CPU other than CPU 0, if it is idle at all."""
+    if not hasattr(os, "sched_getaffinity"):
+        return None, "unsupported"
+    allowed = sorted(os.sched_getaffinity(0))
+    if cpu is not None:
+        return (cpu, "") if cpu in allowed else (None, f"cpu {cpu} not allowed")
+    # validator tiles/threads spin on their cores: the last allowed CPU is often one of them
+    candidates = [c for c in allowed if c != 0] or allowed
+    idle = _cpu_idle(candidates)
+    if not idle:
+        return None, "no /proc/stat; use --low-jitter-cpu"
+    best = max(candidates, key=lambda c: (idle.get(c, 0.0), c))
+    if idle.get(best, 0.0) < CPU_IDLE_MIN:
+        return None, f"no idle CPU (best: cpu {best} {idle.get(best, 0.0):.0%} idle); use --low-jitter-cpu"
+    return best, ""
+
+
+def enter_low_jitter(cpu: int | None = None, realtime: bool = False,
+                     cpu_pick: tuple[int | None, str] | None = None) -> LowJitterState:
+    """cpu_pick: a pick_cpu() result from planning, so no /proc/stat sampling happens here."""
+    st = LowJitterState()
+
+    # 1) GC: collect now, freeze survivors, no collections in the critical section
+    st._gc_was_enabled = gc.isenabled()
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    gc.disable()
+    st.applied.append("gc off")
+
+    # 2) CPU pin (calling thread; threads started later inherit it)
+    target, why = cpu_pick if cpu_pick is not None else pick_cpu(cpu)
+    if target is None:
+        st.skipped.append(f"cpu pin ({why})")
+    else:
+        try:
+            st._affinity = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, {target})
+            st.cpu = target
+            st.applied.append(f"cpu {target}")
+        except OSError as e:
+            st.skipped.append(f"cpu pin ({e.strerror})")
+
+    # 3) priority: SCHED_FIFO (reset on fork, so spawned set-identity stays normal) or nice
+    if realtime and hasattr(os, "sched_setscheduler"):
+        try:
+            st._sched = (os.sched_getscheduler(0), os.sched_getparam(0).sched_priority)
+            policy = os.SCHED_FIFO | getattr(os, "SCHED_RESET_ON_FORK", 0)
+            os.sched_setscheduler(0, policy, os.sched_param(RT_PRIORITY))
+            st.applied.append(f"SCHED_FIFO {RT_PRIORITY}")
+        except (OSError, AttributeError) as e:
+            st._sched = None
+            st.skipped.append(f"SCHED_FIFO ({getattr(e, 'strerror', None) or e})")
+    if not any(x.startswith("SCHED_FIFO") for x in st.applied):
+        try:
+            st._nice = os.getpriority(os.PRIO_PROCESS, 0)
+            os.setpriority(os.PRIO_PROCESS, 0, NICE_BOOST)
+            st.applied.append(f"nice {NICE_BOOST}")
+        except OSError as e:
+            st._nice = None
+            st.skipped.append(f"nice ({e.strerror})")
+
+    # children must not run pinned/boosted (SCHED_FIFO already resets on fork)
+    if st._affinity is not None or st._nice is not None:
+        set_child_reset(_child_reset(st._affinity, st._nice))
+
+    # 4) mlockall: MCL_FUTURE only when the memlock limit cannot make later allocations fail
+    libc = _libc()
+    if libc is None:
+        st.skipped.append("mlock (no libc)")
+    else:
+        soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+        flags = MCL_CURRENT | (MCL_FUTURE if soft == resource.RLIM_INFINITY else 0)
+        if libc.mlockall(flags) == 0:
+            st._mlocked = True
+            st.applied.append("mlockall" + ("" if flags & MCL_FUTURE else " (current)"))
+        else:
+            import ctypes
+            st.skipped.append(f"mlock ({os.strerror(ctypes.get_errno())})")
+    return st
+
+
+def _child_reset(affinity: set[int] | None, nice: int | None):
+    def reset() -> None:
+        # runs in the child between fork and exec
+        if affinity is not None:
+            try:
+                os.sched_setaffinity(0, affinity)
+            except OSError:
+                pass
+        if nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, nice)
+            except OSError:
+                pass
+    return reset
+
+
+def exit_low_jitter(st: LowJitterState) -> None:
+    set_child_reset(None)
+    if st._mlocked:
+        lib = _libc()
+        if lib is not None:
+            lib.munlockall()
+    if st._sched is not None:
+        try:
+            os.sched_setscheduler(0, st._sched[0], os.sched_param(st._sched[1]))
+        except OSError:
+            pass
+    if st._nice is not None:
+        try:
+            # lowering back needs no privilege
+            os.setpriority(os.PRIO_PROCESS, 0, st._nice)
+        except OSError:
+            pass
+    if st._affinity is not None:
+        try:
+            os.sched_setaffinity(0, st._affinity)
+        except OSError:
+            pass
+    if hasattr(gc, "unfreeze"):
+        gc.unfreeze()
+    if st._gc_was_enabled:
+        gc.enable()
+
+
+def rehearse(runs: int = REHEARSAL_RUNS, period_s: float = REHEARSAL_PERIOD_S) -> dict[str, float]:
+    """
+    Rehearse the trigger gate: a helper thread sets an Event every period_s (as MAIN's reader does on
+    exit/early signal); measure how late the waiting thread wakes up. Returns wake latency stats in µs.
+    """
+    go, fired = threading.Event(), threading.Event()
+    stamps: list[float] = []
+    lat: list[float] = []
+    stop = False
+
+    def helper():
+        while True:
+            go.wait()
+            go.clear()
+            if stop:
+                return
+            time.sleep(period_s)
+            stamps.append(time.perf_counter())
+            fired.set()
+
+    t = threading.Thread(target=helper, daemon=True)
+    t.start()
+    for _ in range(runs):
+        fired.clear()
+        go.set()
+        fired.wait(1.0)
+        lat.append((time.perf_counter() - stamps[-1]) * 1e6)
+    stop = True
+    go.set()
+    t.join(1.0)
+    lat.sort()
+    return {
+        "p50": statistics.median(lat),
+        "p99": lat[min(len(lat) - 1, int(0.99 * (len(lat) - 1)))],
+        "max": lat[-1],
+        "stdev": statistics.pstdev(lat),
+    }
+
+
+def format_rehearsal(r: dict[str, float]) -> str:
+    return f"p50 {r['p50']:.0f}µs  p99 {r['p99']:.0f}µs  max {r['max']:.0f}µs  σ {r['stdev']:.0f}µs"
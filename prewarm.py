@@ -0,0 +1,157 @@
+# prewarm.py
+import json
+import shlex
+
+# ================================ Page-cache warm-up ================================
+# Before the trigger, the exact files set-identity will touch (CLI binary + its shared libraries,
+# keypairs, FD config) are read into the page cache on both nodes, optionally followed by the CLI's
+# cheap version path. Residency is checked with mincore before/after, so the report says how much
+# was cold and how long loading it took — time the first exec would otherwise spend faulting it in.
+# Same source runs locally and (via python3) on SECONDARY, like the vote-gap scanner.
+
+_WARM_PY = r'''
+import ctypes, ctypes.util, json, os, subprocess, sys, time
+PAGE = os.sysconf("SC_PAGE_SIZE")
+def _libc():
+    name = ctypes.util.find_library("c")
+    if not name:
+        return None
+    lib = ctypes.CDLL(name, use_errno=True)
+    lib.mmap.restype = ctypes.c_void_p
+    lib.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+    lib.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    lib.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+    return lib
+def resident(lib, path, size):
+    if lib is None or size == 0:
+        return None
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = lib.mmap(None, size, 1, 1, fd, 0)        # PROT_READ, MAP_SHARED
+        if addr is None or addr == ctypes.c_void_p(-1).value:
+            return None
+        try:
+            n = (size + PAGE - 1) // PAGE
+            vec = (ctypes.c_ubyte * n)()
+            if lib.mincore(addr, size, vec) != 0:
+                return None
+            return min(size, sum(b & 1 for b in vec) * PAGE)
+        finally:
+            lib.munmap(addr, size)
+    finally:
+        os.close(fd)
+def libs(path):
+    try:
+        out = subprocess.run(["ldd", path], capture_output=True, text=True, timeout=5).stdout
+    except Exception:
+        return []
+    res = []
+    for line in out.splitlines():
+        tok = line.split("=>")[-1].strip().split(" (")[0].strip()
+        if tok.startswith("/"):
+            res.append(tok)
+    return res
+def load(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        while os.read(fd, 1 << 20):
+            pass
+    finally:
+        os.close(fd)
+def warm(paths, exec_argv=None):
+    files, seen = [], set()
+    def add(p):
+        p = os.path.realpath(os.path.expanduser(os.path.expandvars(p)))
+        if p in seen or not os.path.isfile(p) or not os.access(p, os.R_OK):
+            return
+        seen.add(p)
+        files.append(p)
+        with open(p, "rb") as f:
+            elf = f.read(4) == b"\x7fELF"
+        if elf:
+            for lib_path in libs(p):
+                add(lib_path)
+    for p in paths:
+        add(p)
+    try:
+        lib = _libc()
+    except Exception:
+        lib = None
+    res = {"files": len(files), "bytes": 0, "before": 0, "after": 0, "load_ms": 0.0, "exec_ms": None}
+    for p in files:
+        size = os.path.getsize(p)
+        before = resident(lib, p, size)
+        t = time.perf_counter()
+        load(p)
+        res["load_ms"] += (time.perf_counter() - t) * 1000.0
+        after = resident(lib, p, size)
+        res["bytes"] += size
+        res["before"] = None if before is None or res["before"] is None else res["before"] + before
+        res["after"] = None if after is None or res["after"] is None else res["after"] + after
+    if exec_argv:
+        t = time.perf_counter()
+        try:
+            subprocess.run(exec_argv, capture_output=True, timeout=10)
+            res["exec_ms"] = (time.perf_counter() - t) * 1000.0
+        except Exception:
+            pass
+    return res
+'''
+_WARM_MAIN = r'''
+if __name__ == "__main__":
+    a = json.loads(sys.argv[1])
+    print(json.dumps(warm(a["paths"], a.get("exec"))))
+'''
+_warm_ns: dict = {}
+exec(compile(_WARM_PY, "<prewarm>", "exec"), _warm_ns)
+
+
+def version_argv(client: str, cli: str) -> list[str]:
+    """The CLI's cheap path: loads the binary and its libraries, touches nothing else."""
+    return [cli, "version"] if (client or "").upper() == "FD" else [cli, "--version"]
+
+
+def cmd_paths(cmd: list[str] | str) -> list[str]:
+    """Absolute-path tokens of a set-identity command (binary, key, config; directories are skipped later)."""
+    toks = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+    return [t for t in toks if t.startswith("/")]
+
+
+def prewarm_local(paths: list[str], exec_argv: list[str] | None = None) -> dict:
+    return _warm_ns["warm"]([str(p) for p in paths], exec_argv)
+
+
+def prewarm_remote_cmd(paths: list[str], exec_argv: list[str] | None = None) -> str:
+    """Shell snippet for SECONDARY (fusable into a pre-trigger exchange); prints one JSON line."""
+    args = json.dumps({"paths": paths, "exec": exec_argv})
+    return f"python3 -c {shlex.quote(_WARM_PY + _WARM_MAIN)} {shlex.quote(args)} 2>/dev/null || echo '{{}}'"
+
+
+def parse_prewarm(out: str) -> dict | None:
+    for line in reversed((out or "").splitlines()):
+        line = line.strip()
+        if line.startswith("{"):
+            try:
+                res = json.loads(line)
+            except ValueError:
+                return None
+            return res or None
+    return None
+
+
+def format_prewarm(res: dict | None) -> str:
+    if not res:
+        return "unavailable (no python3?)"
+    mb = lambda b: b / 1048576.0
+    s = f"{res['files']} file(s), {mb(res['bytes']):.1f} MB"
+    if res.get("before") is not None and res.get("after") is not None:
+        cold = max(0, res["bytes"] - res["before"])
+        s += (f"; cold {mb(cold):.1f} MB loaded in {res['load_ms']:.0f} ms (≈ cold-start time saved), "
+              f"resident {mb(res['before']):.1f} → {mb(res['after']):.1f} MB")
+    else:
+        s += f"; read in {res['load_ms']:.0f} ms (mincore unavailable)"
+    if res.get("exec_ms") is not None:
+        s += f"; version exec {res['exec_ms']:.0f} ms"
+    return s
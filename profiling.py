@@ -0,0 +1,118 @@
+# profiling.py
+import cProfile
+import io
+import pstats
+import resource
+import time
+from pathlib import Path
+
+# ================================ Orchestrator profile ================================
+# --profile: cProfile over the whole run (main thread) + per-phase accounting of the tool's own cost:
+# wall time, orchestrator CPU time, local process spawns and SSH execs. The phase is switched by the
+# callers (verify -> pre-trigger -> critical -> post-trigger -> post-swap ...); exec/spawn counts come
+# from the command boundary in cassette.py, so every run_remote/scp/session/Popen is seen exactly once.
+# Output: a pstats file (snakeviz, gprof2dot, flameprof) and a short top-N summary.
+# The tracer itself stays off during the critical phase (its per-call hook would add to the dark window);
+# the phase table still covers it.
+
+SSH_KINDS = {"remote", "scp", "session", "armed"}
+SPAWN_KINDS = {"local", "main", "hook", "local_popen"}
+# kinds that start a new ssh/scp process (session lines reuse the already open one)
+SSH_SPAWN_KINDS = {"remote", "scp", "armed"}
+# phases run without cProfile tracing (wall/CPU/exec accounting only)
+UNTRACED_PHASES = {"critical"}
+
+_PROF: "_Profile | None" = None
+
+
+class _Profile:
+    def __init__(self):
+        self.prof = cProfile.Profile()
+        self.phases: dict[str, dict[str, float]] = {}
+        self.order: list[str] = []
+        self.phase = ""
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self.t_start = self._wall0
+        self.cpu_start = self._cpu0
+        self.children0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def _row(self, name: str) -> dict[str, float]:
+        if name not in self.phases:
+            self.order.append(name)
+            self.phases[name] = {"wall_ms": 0.0, "cpu_ms": 0.0, "ssh": 0, "spawn": 0}
+        return self.phases[name]
+
+    def switch(self, name: str) -> None:
+        now, cpu = time.perf_counter(), time.process_time()
+        if self.phase:
+            row = self._row(self.phase)
+            row["wall_ms"] += (now - self._wall0) * 1000.0
+            row["cpu_ms"] += (cpu - self._cpu0) * 1000.0
+        if (self.phase in UNTRACED_PHASES) != (name in UNTRACED_PHASES):
+            (self.prof.disable if name in UNTRACED_PHASES else self.prof.enable)()
+        self.phase, self._wall0, self._cpu0 = name, now, cpu
+        if name:
+            self._row(name)
+
+
+def start_profile(phase: str = "startup") -> None:
+    global _PROF
+    _PROF = _Profile()
+    _PROF.switch(phase)
+    _PROF.prof.enable()
+
+
+def profile_phase(name: str) -> None:
+    """Attribute everything from now on to phase `name` (no-op unless --profile)."""
+    if _PROF is not None and _PROF.phase != name:
+        _PROF.switch(name)
+
+
+def count_exec(kind: str) -> None:
+    """Called once per command boundary (see cassette.py)."""
+    if _PROF is None:
+        return
+    row = _PROF._row(_PROF.phase)
+    if kind in SSH_KINDS:
+        row["ssh"] += 1
+    if kind in SPAWN_KINDS or kind in SSH_SPAWN_KINDS:
+        row["spawn"] += 1
+
+
+def stop_profile(path: Path | None, top: int = 15) -> None:
+    """Stop profiling, write pstats to path (if given) and print the per-phase table + top-N functions."""
+    global _PROF
+    p = _PROF
+    if p is None:
+        return
+    p.switch("")
+    p.prof.disable()
+    _PROF = None
+    wall = (time.perf_counter() - p.t_start) * 1000.0
+    cpu = (time.process_time() - p.cpu_start) * 1000.0
+    ch = resource.getrusage(resource.RUSAGE_CHILDREN)
+    child_cpu = ((ch.ru_utime - p.children0.ru_utime) + (ch.ru_stime - p.children0.ru_stime)) * 1000.0
+
+    print(f"[PROFILE] {'phase':<14} {'wall ms':>9} {'cpu ms':>8} {'ssh':>4} {'spawn':>5}")
+    for name in p.order:
+        r = p.phases[name]
+        print(f"[PROFILE] {name:<14} {r['wall_ms']:>9.1f} {r['cpu_ms']:>8.1f} {int(r['ssh']):>4} {int(r['spawn']):>5}")
+    print(f"[PROFILE] total: wall {wall:.0f} ms, orchestrator CPU {cpu:.0f} ms ({cpu / wall * 100 if wall else 0:.1f}%), "
+          f"child processes CPU {child_cpu:.0f} ms")
+
+    if path is not None:
+        path = Path(path).expanduser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        p.prof.dump_stats(str(path))
+        print(f"[PROFILE] pstats written to {path} (snakeviz / gprof2dot / flameprof)")
+    buf = io.StringIO()
+    stats = pstats.Stats(p.prof, stream=buf).strip_dirs().sort_stats(pstats.SortKey.TIME)
+    stats.print_stats(top)
+    lines = buf.getvalue().splitlines()
+    # skip the pstats preamble, keep the table
+    start = next((i for i, line in enumerate(lines) if line.lstrip().startswith("ncalls")), 0)
+    print(f"[PROFILE] top {top} by own time (main thread):")
+    for line in lines[start:]:
+        if line.strip():
+            print(f"[PROFILE]   {line}")
@@ -1,25 +1,57 @@
 # remote_config.py
 from pathlib import Path
-from uttils import SSHSettings, build_server_from_env
 
 # --- MAIN paths ---
 LEDGER_PATH_DEFAULT = Path("/mnt/nvme1/ledger")
 LOCAL_VALIDATOR_KEY = Path.home() / "solana/validator-keypair.json"
 LOCAL_UNSTAKED_IDENTITY = Path.home() / "solana/unstaked-identity.json"
+LOCAL_RPC_URL = "http://127.0.0.1:8899"  # MAIN local RPC (catch-up checks)
+LOCAL_VALIDATOR_LOG = Path.home() / "solana/validator.log"  # vote-gap analysis (--vote-gap)
+LOCAL_SNAPSHOTS_DIR: Path | None = None  # snapshot archives for `seed` (None -> ledger)
 
 # --- SECONDARY paths (strings may use $HOME) ---
 REMOTE_VALIDATOR_KEY = "$HOME/solana/validator-keypair.json"
+REMOTE_UNSTAKED_IDENTITY = "$HOME/solana/unstaked-identity.json"  # used when swapping back to MAIN
+REMOTE_RPC_URL = "http://127.0.0.1:8899"  # SECONDARY RPC as seen from SECONDARY itself (queried over SSH)
 # If the ledger path on SECONDARY differs from MAIN — set it here (or pass via --remote-ledger)
 # Example: REMOTE_LEDGER_PATH = "/mnt/nvme1/ledger"
 REMOTE_LEDGER_PATH: str | None = None
 REMOTE_FDCTL = "$HOME/firedancer/bin/fdctl"
 REMOTE_FD_CONFIG_PATH = "$HOME/config.toml"
+REMOTE_VALIDATOR_LOG = "$HOME/solana/validator.log"  # Agave log file or FD log (--vote-gap)
+REMOTE_SNAPSHOTS_DIR: str | None = None  # where `seed` puts snapshot archives (None -> SECONDARY ledger)
+# Optional overrides of the log patterns used by --vote-gap (group 1 of the vote pattern = slot)
+# VOTE_LOG_PATTERN = r"voting: (\d+)"
+# IDENTITY_LOG_PATTERN = r"Identity set to"
 
 # --- MAIN local binaries (fixed/known installs) ---
 AGAVE_CLI_LOCAL = Path.home() / ".local/share/solana/install/active_release/bin/agave-validator"
 FDCTL_LOCAL = Path.home() / "firedancer/bin/fdctl"
 FD_CONFIG_LOCAL = Path.home() / "config.toml"
 
-# --- SECONDARY SSH settings sourced from .env next to this file ---
-ENV_PATH = Path(__file__).with_name(".env")
-SECONDARY: SSHSettings = build_server_from_env(ENV_PATH)
+# --- MAIN over SSH (third-host controller mode, --controller); MAIN_SSH_* in .env ---
+MAIN_VALIDATOR_KEY = "$HOME/solana/validator-keypair.json"
+MAIN_UNSTAKED_IDENTITY = "$HOME/solana/unstaked-identity.json"
+MAIN_AGAVE_CLI = "$HOME/.local/share/solana/install/active_release/bin/agave-validator"
+MAIN_FDCTL = "$HOME/firedancer/bin/fdctl"
+MAIN_FD_CONFIG_PATH = "$HOME/config.toml"
+MAIN_VALIDATOR_LOG = "$HOME/solana/validator.log"  # vote-gap analysis (--vote-gap) read over SSH
+
+# --- Local persistent cache (remote env snapshot, measurements) ---
+STATE_CACHE_PATH = Path.home() / ".cache/updater_swap/state.json"
+REMOTE_ENV_TTL_SEC = 24 * 3600  # re-capture SECONDARY login env after this age
+
+# --- SECONDARY SSH settings sourced from .env next to this file (next to the .pyz in a zipapp) ---
+_HERE = Path(__file__).parent
+ENV_PATH = (_HERE.parent if _HERE.is_file() else _HERE) / ".env"
+# SECONDARY: SSHSettings, MAIN_SSH: SSHSettings | None — built on first access, so importing the
+# config neither parses .env nor pulls in the SSH helpers (fast startup, no .env needed for --help)
+_LAZY_SSH = {"SECONDARY": {}, "MAIN_SSH": {"prefix": "MAIN_SSH_", "optional": True}}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_SSH:
+        from uttils import build_server_from_env
+        value = globals()[name] = build_server_from_env(ENV_PATH, **_LAZY_SSH[name])
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,317 @@
+# seed.py
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import remote_config as rc
+from uttils import SSHSettings, build_ssh_command, remote_expand_path, run_remote
+
+# ============================== Snapshot seeding ==============================
+# `seed`: copy MAIN's newest full + incremental snapshot archives to SECONDARY instead of letting it
+# download them. Files are split into fixed-size chunks sent over N parallel SSH connections (not the
+# ControlMaster: one TCP stream per worker). Every chunk carries a sha256 trailer checked on SECONDARY
+# before it is recorded in a sidecar, so an interrupted seed resumes with the missing chunks only.
+# Archives are written under a hidden .seed-part name and renamed when complete; files that already
+# exist on SECONDARY with the same name and size are skipped (snapshot names carry slot + bank hash).
+# Archives are zstd already: no extra compression on the wire.
+
+STREAMS_DEFAULT = 4
+CHUNK_MB_DEFAULT = 64
+CHUNK_RETRIES = 3
+BLOCK = 1 << 20
+
+_ARCHIVE_EXT = r"\.tar(?:\.(?:zst|bz2|gz|lz4))?"
+_FULL_RE = re.compile(rf"^snapshot-(\d+)-(\w+){_ARCHIVE_EXT}$")
+_INCR_RE = re.compile(rf"^incremental-snapshot-(\d+)-(\d+)-(\w+){_ARCHIVE_EXT}$")
+
+
+@dataclass(frozen=True)
+class SnapshotFile:
+    path: Path
+    kind: str               # full | incremental
+    slot: int
+    size: int
+
+
+def newest_snapshots(snap_dir: Path) -> list[SnapshotFile]:
+    """Newest full snapshot archive and the newest incremental built on top of it (if any)."""
+    full: list[SnapshotFile] = []
+    incr: list[tuple[int, SnapshotFile]] = []
+    for p in Path(snap_dir).expanduser().iterdir():
+        if not p.is_file():
+            continue
+        m = _FULL_RE.match(p.name)
+        if m:
+            full.append(SnapshotFile(p, "full", int(m.group(1)), p.stat().st_size))
+            continue
+        m = _INCR_RE.match(p.name)
+        if m:
+            incr.append((int(m.group(1)), SnapshotFile(p, "incremental", int(m.group(2)), p.stat().st_size)))
+    if not full:
+        return []
+    best = max(full, key=lambda s: s.slot)
+    on_top = [s for base, s in incr if base == best.slot]
+    return [best] + ([max(on_top, key=lambda s: s.slot)] if on_top else [])
+
+
+# ------------------------------ SECONDARY helpers ------------------------------
+
+_STATE_PY = r'''
+import json, os, sys
+a = json.loads(sys.argv[1])
+os.makedirs(a["dir"], exist_ok=True)
+res = {}
+for f in a["files"]:
+    final = os.path.join(a["dir"], f["name"])
+    part = os.path.join(a["dir"], "." + f["name"] + ".seed-part")
+    side = part + ".done"
+    if os.path.isfile(final) and os.path.getsize(final) == f["size"]:
+        res[f["name"]] = "present"
+        continue
+    done = []
+    try:
+        with open(side) as s:
+            head = s.readline().split()
+            if head == ["chunk", str(a["chunk"])] and os.path.isfile(part):
+                done = [int(line.split()[0]) for line in s if line.strip()]
+            else:
+                raise OSError
+    except (OSError, ValueError):
+        for p in (part, side):
+            if os.path.exists(p):
+                os.remove(p)
+        with open(side, "w") as s:
+            s.write("chunk %d\n" % a["chunk"])
+    res[f["name"]] = done
+print(json.dumps(res))
+'''
+
+_WRITE_PY = r'''
+import hashlib, os, sys
+part, idx, off, size = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+h = hashlib.sha256()
+inp = sys.stdin.buffer
+fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o644)
+try:
+    left, pos = size, off
+    while left:
+        b = inp.read(min(left, 1 << 20))
+        if not b:
+            sys.exit("short read")
+        h.update(b)
+        os.pwrite(fd, b, pos)
+        pos += len(b)
+        left -= len(b)
+    trailer = inp.read(64).decode()
+    if trailer != h.hexdigest():
+        sys.exit("sha256 mismatch")
+    os.fdatasync(fd)
+finally:
+    os.close(fd)
+with open(part + ".done", "a") as s:
+    s.write("%d %s\n" % (idx, trailer))
+print("OK")
+'''
+
+_FINAL_PY = r'''
+import os, sys
+part, final, size, n = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+with open(part + ".done") as s:
+    s.readline()
+    done = {int(line.split()[0]) for line in s if line.strip()}
+missing = sorted(set(range(n)) - done)
+if missing or os.path.getsize(part) != size:
+    sys.exit("incomplete: %d chunk(s) missing, size %d/%d" % (len(missing), os.path.getsize(part), size))
+os.replace(part, final)
+os.remove(part + ".done")
+print("OK")
+'''
+
+
+def _py(src: str, *args) -> str:
+    return "python3 -c " + " ".join(shlex.quote(str(x)) for x in (src, *args))
+
+
+# ------------------------------ Streaming ------------------------------
+
+class RateLimiter:
+    """Token bucket shared by all streams (bytes/s); rate 0 = unlimited."""
+
+    def __init__(self, bytes_per_s: float):
+        self.rate = bytes_per_s
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def take(self, n: int) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + n / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+def _send_chunk(cfg: SSHSettings, src: Path, part: str, idx: int, off: int, size: int,
+                limiter: RateLimiter) -> None:
+    cmd = build_ssh_command(cfg, _py(_WRITE_PY, part, idx, off, size), multiplex=False)
+    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    h = hashlib.sha256()
+    try:
+        with open(src, "rb") as f:
+            left, pos = size, off
+            while left:
+                b = os.pread(f.fileno(), min(left, BLOCK), pos)
+                if not b:
+                    raise RuntimeError(f"[SEED] {src.name}: short read at {pos}")
+                limiter.take(len(b))
+                h.update(b)
+                p.stdin.write(b)
+                pos += len(b)
+                left -= len(b)
+        p.stdin.write(h.hexdigest().encode())
+        p.stdin.close()
+    except BrokenPipeError:
+        pass
+    except BaseException:
+        p.kill()
+        p.wait()
+        raise
+    out, err = p.stdout.read(), p.stderr.read()
+    p.wait()
+    if p.returncode != 0 or b"OK" not in out:
+        raise RuntimeError(f"[SEED] {src.name} chunk {idx}: rc={p.returncode} {err.decode(errors='replace').strip()[:200]}")
+
+
+def _mb(b: float) -> float:
+    return b / 1048576.0
+
+
+def run_seed(
+        main_ledger: Path,
+        *,
+        secondary_cfg: SSHSettings | None = None,
+        remote_ledger: Path | None = None,
+        snapshots_dir: Path | None = None,
+        remote_snapshots_dir: str | None = None,
+        streams: int = STREAMS_DEFAULT,
+        chunk_mb: int = CHUNK_MB_DEFAULT,
+        rate_limit_mbps: float = 0.0,
+        assume_yes: bool = False,
+        verbose: bool = False,
+) -> int:
+    cfg = secondary_cfg or rc.SECONDARY
+    snap_dir = Path(snapshots_dir or getattr(rc, "LOCAL_SNAPSHOTS_DIR", None) or main_ledger).expanduser()
+    remote_dir_raw = (remote_snapshots_dir or getattr(rc, "REMOTE_SNAPSHOTS_DIR", None)
+                      or str(remote_ledger or getattr(rc, "REMOTE_LEDGER_PATH", None) or main_ledger))
+    files = newest_snapshots(snap_dir)
+    if not files:
+        print(f"[SEED] no snapshot archives in {snap_dir}")
+        return 2
+    remote_dir = remote_expand_path(cfg, remote_dir_raw)
+    chunk = max(1, chunk_mb) * 1048576
+    streams = max(1, streams)
+
+    res = run_remote(cfg, _py(_STATE_PY, json.dumps({
+        "dir": remote_dir, "chunk": chunk, "files": [{"name": f.path.name, "size": f.size} for f in files]})),
+        timeout=30, login_shell=False)
+    if res.returncode != 0:
+        raise RuntimeError(f"[SECONDARY] snapshot dir check failed: {(res.stderr or res.stdout or '').strip()[:200]}")
+    state = json.loads((res.stdout or "{}").strip().splitlines()[-1])
+
+    todo: list[tuple[SnapshotFile, int]] = []
+    pending: dict[str, SnapshotFile] = {}
+    print(f"[SEED] MAIN {snap_dir} -> SECONDARY {remote_dir}")
+    for f in files:
+        st = state.get(f.path.name)
+        n = (f.size + chunk - 1) // chunk
+        if st == "present":
+            print(f"[SEED] {f.kind:<11} {f.path.name}: already on SECONDARY ({_mb(f.size):.0f} MB), skipped")
+            continue
+        missing = [i for i in range(n) if i not in set(st or [])]
+        resumed = f", resuming: {n - len(missing)}/{n} chunk(s) already there" if len(missing) < n else ""
+        print(f"[SEED] {f.kind:<11} {f.path.name}: {_mb(f.size):.0f} MB in {n} chunk(s){resumed}")
+        todo += [(f, i) for i in missing]
+        pending[f.path.name] = f
+    to_send = sum(min(chunk, f.size - i * chunk) for f, i in todo)
+    print(f"[SEED] {len(todo)} chunk(s), {_mb(to_send):.0f} MB over {streams} SSH stream(s)"
+          + (f", limited to {rate_limit_mbps:g} Mbit/s" if rate_limit_mbps > 0 else ""))
+
+    if todo and not assume_yes:
+        try:
+            input("Press ENTER to start seeding. Ctrl+C to cancel… ")
+        except KeyboardInterrupt:
+            print("Cancelled by user.")
+            return 130
+
+    limiter = RateLimiter(rate_limit_mbps * 1e6 / 8.0)
+    sent = 0
+    failed: set[str] = set()
+    t0 = time.perf_counter()
+    lock = threading.Lock()
+
+    def job(f: SnapshotFile, i: int) -> int:
+        off = i * chunk
+        size = min(chunk, f.size - off)
+        part = f"{remote_dir}/.{f.path.name}.seed-part"
+        for attempt in range(1, CHUNK_RETRIES + 1):
+            try:
+                _send_chunk(cfg, f.path, part, i, off, size, limiter)
+                return size
+            except OSError as e:
+                # local read or ssh spawn failure: retried like a failed transfer, reported like one
+                err = RuntimeError(f"[SEED] {f.path.name} chunk {i}: {e}")
+            except RuntimeError as e:
+                err = e
+            if attempt == CHUNK_RETRIES:
+                raise err
+            if verbose:
+                print(f"[VERBOSE] {err}; retry {attempt}/{CHUNK_RETRIES - 1}")
+        return 0
+
+    with ThreadPoolExecutor(max_workers=streams) as pool:
+        futs = {pool.submit(job, f, i): (f, i) for f, i in todo}
+        for fut in as_completed(futs):
+            f, i = futs[fut]
+            try:
+                n = fut.result()
+            except RuntimeError as e:
+                print(e)
+                failed.add(f.path.name)
+                continue
+            with lock:
+                sent += n
+                dt = time.perf_counter() - t0
+            if verbose:
+                print(f"[VERBOSE] [SEED] {f.path.name} chunk {i} ok; {_mb(sent):.0f}/{_mb(to_send):.0f} MB, "
+                      f"{_mb(sent) / dt if dt else 0:.1f} MB/s")
+
+    for name, f in pending.items():
+        if name in failed:
+            continue
+        n = (f.size + chunk - 1) // chunk
+        part = f"{remote_dir}/.{name}.seed-part"
+        r = run_remote(cfg, _py(_FINAL_PY, part, f"{remote_dir}/{name}", f.size, n), timeout=60, login_shell=False)
+        if r.returncode != 0:
+            print(f"[SEED] {name}: finalize failed: {(r.stderr or r.stdout or '').strip()[:200]}")
+            failed.add(name)
+        else:
+            print(f"[SEED] {name}: complete and verified (sha256 per {chunk_mb} MB chunk)")
+
+    dt = time.perf_counter() - t0
+    if sent:
+        print(f"[SEED] sent {_mb(sent):.0f} MB in {dt:.1f}s: {_mb(sent) / dt:.1f} MB/s "
+              f"({sent * 8 / dt / 1e6:.0f} Mbit/s) over {streams} stream(s)")
+    if failed:
+        print(f"[SEED] incomplete: {', '.join(sorted(failed))}; run `seed` again to resume")
+        return 1
+    return 0
@@ -0,0 +1,267 @@
+# spawner.py
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Sequence
+
+# ============================== Local process spawn ==============================
+# popen       — subprocess.Popen (fork/exec, close_fds scan, pipe bookkeeping in Python)
+# posix_spawn — os.posix_spawn (vfork/clone-vfork in libc; fds are non-inheritable by default, no scan)
+# zygote      — a /bin/sh pre-spawned before the critical window, blocked on `read`; firing it
+#               costs one pipe write + exec (one-shot, like the armed SECONDARY session)
+
+SPAWN_METHODS = ("popen", "posix_spawn", "zygote")
+_SPAWN_DEFAULT = "popen"
+
+
+def set_spawn_default(method: str) -> None:
+    global _SPAWN_DEFAULT
+    if method not in SPAWN_METHODS:
+        raise RuntimeError(f"unknown spawn method '{method}' (use {'|'.join(SPAWN_METHODS)})")
+    if method != "popen" and not hasattr(os, "posix_spawn"):
+        method = "popen"
+    _SPAWN_DEFAULT = method
+
+
+def spawn_default() -> str:
+    return _SPAWN_DEFAULT
+
+
+# --low-jitter pins and boosts this process; children (set-identity, ssh, scp) must not inherit that
+_CHILD_RESET: Callable[[], None] | None = None
+
+
+def set_child_reset(fn: Callable[[], None] | None) -> None:
+    global _CHILD_RESET
+    _CHILD_RESET = fn
+
+
+def child_preexec() -> Callable[[], None] | None:
+    """preexec_fn for subprocess: undoes --low-jitter in the child; None (no fork-path cost) when it is off."""
+    return _CHILD_RESET
+
+
+class SpawnedProcess:
+    """Minimal Popen-compatible handle (pid, stdout/stdin, poll/wait/kill) for posix_spawn'ed children."""
+
+    def __init__(self, pid: int, stdout_fd: int | None, stdin_fd: int | None = None):
+        self.pid = pid
+        self.returncode: int | None = None
+        self.stdout = os.fdopen(stdout_fd, "r") if stdout_fd is not None else None
+        self.stdin = os.fdopen(stdin_fd, "w") if stdin_fd is not None else None
+        self._lock = threading.Lock()
+
+    def _reap(self, flags: int) -> int | None:
+        # like Popen: a non-blocking poll never waits behind a blocking wait() in another thread
+        if not self._lock.acquire(blocking=not (flags & os.WNOHANG)):
+            return self.returncode
+        try:
+            if self.returncode is not None:
+                return self.returncode
+            try:
+                pid, status = os.waitpid(self.pid, flags)
+            except ChildProcessError:
+                self.returncode = -1
+                return self.returncode
+            if pid == 0:
+                return None
+            self.returncode = os.waitstatus_to_exitcode(status)
+            return self.returncode
+        finally:
+            self._lock.release()
+
+    def poll(self) -> int | None:
+        return self._reap(os.WNOHANG)
+
+    def wait(self, timeout: float | None = None) -> int:
+        if timeout is None:
+            while self.returncode is None:
+                self._reap(0)
+            return self.returncode
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(min(delay, left))
+            delay = min(delay * 2, 0.05)
+        return self.returncode
+
+    def send_signal(self, sig: int) -> None:
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self) -> None:
+        import signal
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        import signal
+        self.send_signal(signal.SIGKILL)
+
+
+def _posix_spawn(argv: list[str], *, stdin_pipe: bool = False, merge_stderr: bool = True,
+                 stderr_fd: int | None = None) -> SpawnedProcess:
+    """posix_spawn with stdout (+stderr) on a pipe. Pipes are O_CLOEXEC; dup2 makes only 0/1/2 inheritable."""
+    if _CHILD_RESET is not None:
+        # posix_spawn cannot reset affinity/nice in the child: same pipes over fork + preexec_fn
+        return subprocess.Popen(argv, stdin=(subprocess.PIPE if stdin_pipe else subprocess.DEVNULL),
+                                stdout=subprocess.PIPE, stderr=(subprocess.STDOUT if merge_stderr else stderr_fd),
+                                text=True, preexec_fn=_CHILD_RESET)
+    r_out, w_out = os.pipe()
+    r_in = w_in = None
+    actions = [(os.POSIX_SPAWN_DUP2, w_out, 1)]
+    if merge_stderr:
+        actions.append((os.POSIX_SPAWN_DUP2, w_out, 2))
+    elif stderr_fd is not None:
+        actions.append((os.POSIX_SPAWN_DUP2, stderr_fd, 2))
+    if stdin_pipe:
+        r_in, w_in = os.pipe()
+        actions.append((os.POSIX_SPAWN_DUP2, r_in, 0))
+    else:
+        actions.append((os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0))
+    fn = os.posix_spawn if os.sep in argv[0] else os.posix_spawnp
+    try:
+        pid = fn(argv[0], argv, os.environ, file_actions=actions)
+    except BaseException:
+        for fd in (r_out, w_out, r_in, w_in):
+            if fd is not None:
+                os.close(fd)
+        raise
+    os.close(w_out)
+    if r_in is not None:
+        os.close(r_in)
+    return SpawnedProcess(pid, r_out, w_in)
+
+
+class Zygote:
+    """Pre-spawned shell blocked on stdin; exec(cmd) hands it the command line and it execs in place (one-shot)."""
+
+    SCRIPT = 'printf R; IFS= read -r c && eval "exec $c"'
+
+    def __init__(self):
+        self.proc = _posix_spawn(["/bin/sh", "-c", self.SCRIPT], stdin_pipe=True)
+        self.fired = False
+        # wait until the shell is up and about to block in `read`
+        if self.proc.stdout.read(1) != "R":
+            self.close()
+            raise RuntimeError("zygote failed to start")
+
+    def exec(self, argv: Sequence[str]) -> SpawnedProcess:
+        if self.fired:
+            raise RuntimeError("zygote already used")
+        self.fired = True
+        # exec replaces the shell: the returned handle is the target process (same pid, same stdout pipe)
+        self.proc.stdin.write(shlex.join(argv) + "\n")
+        self.proc.stdin.close()
+        return self.proc
+
+    def close(self) -> None:
+        """Unused zygote: EOF on stdin makes `read` fail and the shell exit without running anything."""
+        if not self.fired:
+            self.fired = True
+            try:
+                self.proc.stdin.close()
+            except Exception:
+                pass
+            try:
+                self.proc.wait(1.0)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        if self.proc.stdout is not None and not self.proc.stdout.closed and self.proc.returncode is not None:
+            self.proc.stdout.close()
+
+
+def spawn_process(argv: Sequence[str], method: str | None = None, zygote: Zygote | None = None):
+    """Start argv with stdout+stderr merged on a text pipe; returns a Popen-like handle."""
+    argv = list(argv)
+    method = method or _SPAWN_DEFAULT
+    if zygote is not None:
+        return zygote.exec(argv)
+    if method == "popen" or not hasattr(os, "posix_spawn"):
+        return subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+                                preexec_fn=_CHILD_RESET)
+    return _posix_spawn(argv)
+
+
+def spawn_run(cmd: Sequence[str] | str, timeout: float | None = None,
+              method: str | None = None) -> subprocess.CompletedProcess:
+    """subprocess.run(capture_output=True, text=True) equivalent on top of the configured spawn method."""
+    argv = [cmd] if isinstance(cmd, str) else list(cmd)
+    method = method or _SPAWN_DEFAULT
+    if method == "popen" or not hasattr(os, "posix_spawn"):
+        return subprocess.run(argv, capture_output=True, text=True, timeout=timeout, preexec_fn=_CHILD_RESET)
+    r_err, w_err = os.pipe()
+    try:
+        proc = _posix_spawn(argv, merge_stderr=False, stderr_fd=w_err)
+    finally:
+        os.close(w_err)
+    err_chunks: list[str] = []
+    with os.fdopen(r_err, "r") as ferr:
+        t = threading.Thread(target=lambda: err_chunks.append(ferr.read()), daemon=True)
+        t.start()
+        out_chunks: list[str] = []
+        r = threading.Thread(target=lambda: out_chunks.append(proc.stdout.read()), daemon=True)
+        r.start()
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise subprocess.TimeoutExpired(argv, timeout)
+        finally:
+            r.join(1.0)
+            t.join(1.0)
+            proc.stdout.close()
+    return subprocess.CompletedProcess(argv, proc.returncode, "".join(out_chunks), "".join(err_chunks))
+
+
+# ----------------------------------- Benchmark -----------------------------------
+
+def bench_spawn(runs: int = 50, argv: Sequence[str] = ("/bin/echo", "x")) -> dict[str, dict[str, float]]:
+    """
+    Per method: `call` = time the parent is blocked in the spawn call, `exec` = spawn call -> first byte
+    from the exec'd target. For zygote the pre-spawn is excluded (it happens before the critical window).
+    """
+    import statistics
+
+    def pct(xs: list[float], q: float) -> float:
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+    res: dict[str, dict[str, float]] = {}
+    methods = SPAWN_METHODS if hasattr(os, "posix_spawn") else ("popen",)
+    for method in methods:
+        calls, execs = [], []
+        for _ in range(runs):
+            z = Zygote() if method == "zygote" else None
+            t0 = time.perf_counter()
+            p = spawn_process(argv, method=method, zygote=z)
+            t1 = time.perf_counter()
+            p.stdout.read(1)
+            t2 = time.perf_counter()
+            p.stdout.read()
+            p.wait()
+            p.stdout.close()
+            calls.append((t1 - t0) * 1000.0)
+            execs.append((t2 - t0) * 1000.0)
+        res[method] = {
+            "call_p50": statistics.median(calls), "call_p95": pct(calls, 0.95),
+            "exec_p50": statistics.median(execs), "exec_p95": pct(execs, 0.95),
+        }
+    return res
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"spawn -> exec latency, {n} runs of /bin/echo (ms)")
+    print(f"  {'method':<12} {'call p50':>9} {'call p95':>9} {'exec p50':>9} {'exec p95':>9}")
+    for m, r in bench_spawn(n).items():
+        print(f"  {m:<12} {r['call_p50']:>9.3f} {r['call_p95']:>9.3f} {r['exec_p50']:>9.3f} {r['exec_p95']:>9.3f}")
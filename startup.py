@@ -0,0 +1,140 @@
+# startup.py
+import argparse
+import os
+import py_compile
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipapp
+from pathlib import Path
+
+# ================================ Fast CLI startup ================================
+# hotswap_for_update.py is started by scripts (daemon, fleet runner) far more often than by hand,
+# so its start-up is budgeted. `check` runs `python -X importtime` on the entry module and fails if
+# the cumulative import time is over budget or if a deferred module (SSH helpers, swap machinery,
+# seed, urllib) is pulled in before argument parsing. `build` packs the CLI into a single-file
+# zipapp with precompiled bytecode (unchecked-hash .pyc: no stat/compile at import, works read-only).
+
+HERE = Path(__file__).resolve().parent
+ENTRY = "hotswap_for_update"
+EXCLUDE = {"startup.py", "wanlab.py"}        # tooling, not part of the CLI
+IMPORT_BUDGET_MS = 40.0
+CHECK_RUNS = 7
+# must not be imported until a command needs them
+DEFERRED = ("uttils", "swap", "seed", "verify_identity", "update_workflow", "cassette", "urllib.request")
+PYZ_DEFAULT = HERE / "dist" / "hotswap.pyz"
+
+_MAIN_PY = f"import sys\nfrom {ENTRY} import main\nsys.exit(main(sys.argv))\n"
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+
+def app_modules() -> list[Path]:
+    return sorted(p for p in HERE.glob("*.py") if p.name not in EXCLUDE)
+
+
+def build_zipapp(out: Path = PYZ_DEFAULT, interpreter: str = "/usr/bin/env python3", optimize: int = -1) -> Path:
+    """Single-file CLI: sources (for tracebacks) + unchecked-hash bytecode + __main__; .env goes next to it."""
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="hotswap-pyz.") as tmp:
+        stage = Path(tmp)
+        (stage / "__main__.py").write_text(_MAIN_PY)
+        for src in app_modules():
+            shutil.copy2(src, stage / src.name)
+        for src in stage.glob("*.py"):
+            # legacy location (module.pyc next to module.py): the only one zipimport looks at
+            py_compile.compile(str(src), cfile=str(src.with_suffix(".pyc")), dfile=src.name, doraise=True,
+                               optimize=optimize, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        zipapp.create_archive(stage, out, interpreter=interpreter)
+    return out
+
+
+def import_profile(target: Path, module: str = ENTRY, python: str = sys.executable) -> dict:
+    """One `-X importtime` run of `import <module>` from target (source dir or .pyz)."""
+    env = dict(os.environ, PYTHONPATH=str(target))
+    res = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], env=env, cwd=tempfile.gettempdir(),
+                         capture_output=True, text=True)
+    if res.returncode != 0:
+        raise RuntimeError(f"[STARTUP] import {module} from {target} failed: {res.stderr.strip().splitlines()[-1:]}")
+    total_us, selfs = None, {}
+    for line in res.stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if not m:
+            continue
+        self_us, cum_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        selfs[name] = self_us
+        if name == module and len(indent) <= 1:
+            total_us = cum_us
+    return {"ms": (total_us or 0) / 1000.0, "modules": selfs}
+
+
+def wall_ms(argv: list[str], runs: int) -> float:
+    """Median wall time of a process start that exits on its own (usage path: parse, no command)."""
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=tempfile.gettempdir())
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples)
+
+
+def check_startup(target: Path = HERE, budget_ms: float = IMPORT_BUDGET_MS, runs: int = CHECK_RUNS,
+                  python: str = sys.executable, verbose: bool = False) -> int:
+    """Median import time of the entry module against the budget; 0 = within budget, 1 = over / leaked."""
+    import_profile(target, python=python)    # warm-up: page cache, __pycache__ for a source tree
+    profiles = [import_profile(target, python=python) for _ in range(max(1, runs))]
+    med = statistics.median(p["ms"] for p in profiles)
+    leaked = [m for m in DEFERRED if m in profiles[-1]["modules"]]
+    script = [python, str(target)] if Path(target).is_file() else [python, str(Path(target) / f"{ENTRY}.py")]
+    base = wall_ms([python, "-c", "pass"], runs)
+    start = wall_ms(script, runs)
+
+    print(f"[STARTUP] target: {target}")
+    print(f"[STARTUP] import {ENTRY}: median {med:.1f} ms over {len(profiles)} run(s) "
+          f"(min {min(p['ms'] for p in profiles):.1f}, max {max(p['ms'] for p in profiles):.1f}); "
+          f"budget {budget_ms:g} ms")
+    print(f"[STARTUP] process start to exit (usage path): {start:.1f} ms; bare interpreter {base:.1f} ms")
+    if verbose:
+        top = sorted(profiles[-1]["modules"].items(), key=lambda kv: -kv[1])[:10]
+        for name, us in top:
+            print(f"[VERBOSE]   {us / 1000.0:7.2f} ms self  {name}")
+    ok = True
+    if leaked:
+        print(f"[STARTUP] FAIL: imported before argument parsing: {', '.join(leaked)}")
+        ok = False
+    if med > budget_ms:
+        print(f"[STARTUP] FAIL: import time {med:.1f} ms over the {budget_ms:g} ms budget")
+        ok = False
+    if ok:
+        print("[STARTUP] OK")
+    return 0 if ok else 1
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description="Single-file build and start-up budget of hotswap_for_update.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="zipapp with precompiled bytecode")
+    b.add_argument("--out", type=Path, default=PYZ_DEFAULT)
+    b.add_argument("--python", dest="interpreter", default="/usr/bin/env python3", help="shebang interpreter")
+    b.add_argument("-O", dest="optimize", type=int, choices=[-1, 0, 1, 2], default=-1)
+    c = sub.add_parser("check", help="-X importtime budget of the entry module")
+    c.add_argument("--target", type=Path, default=HERE, help="source dir (default) or a built .pyz")
+    c.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    c.add_argument("--runs", type=int, default=CHECK_RUNS)
+    c.add_argument("-v", "--verbose", action="store_true")
+    args = p.parse_args(argv)
+
+    if args.cmd == "build":
+        out = build_zipapp(args.out, args.interpreter, args.optimize)
+        print(f"[BUILD] {out} ({out.stat().st_size / 1024:.0f} KiB, {len(app_modules())} modules); "
+              f"put .env next to it")
+        return 0
+    return check_startup(args.target.resolve(), args.budget_ms, args.runs, verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,58 +1,195 @@
+import json
+import os
+import re
+import selectors
 import shlex
+import statistics
 import subprocess
+import threading
 import time
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
 
-from remote_config import AGAVE_CLI_LOCAL, FDCTL_LOCAL, FD_CONFIG_LOCAL
+from cassette import cassette_call, cassette_mode, cassette_popen
+from prewarm import cmd_paths, format_prewarm, parse_prewarm, prewarm_local, prewarm_remote_cmd, version_argv
+from profiling import profile_phase
+from lowjitter import enter_low_jitter, exit_low_jitter, format_rehearsal, pick_cpu, rehearse
+from spawner import Zygote, child_preexec, spawn_default, spawn_process
+from towerwatch import TOWER_WAIT_DEFAULT_S, TowerWatch, tower_payload, tower_read_sh, tower_write_sh
+from votegap import current_slot, measure_vote_gap, vote_account_snapshot, wait_votes_resumed
+
+from remote_config import (
+    AGAVE_CLI_LOCAL, FDCTL_LOCAL, FD_CONFIG_LOCAL, LOCAL_RPC_URL, REMOTE_RPC_URL, REMOTE_UNSTAKED_IDENTITY,
+)
 from uttils import (
     SSHSettings,
     run_remote,
+    remote_env_prefix,
     build_ssh_command,
+    host_key,
+    measure_rtt_ms,
+    state_get,
+    state_put,
     _build_remote_set_identity_cmd_no_shell,
     remote_expand_path,
-    remove_tower_on_secondary,
-    copy_tower_main_to_secondary,
+    remote_set_identity_paths,
+    remote_stat,
+    remote_stat_cmd,
+    parse_remote_stat,
+    baseline_rtt_ms,
+    copy_file,
+    copy_tower_secondary_to_main,
+    is_local,
+    remote_rpc_call,
+    rpc_call,
 )
 
 
+@dataclass(frozen=True)
+class SwapLeg:
+    """Everything needed to reverse a completed MAIN -> SECONDARY swap."""
+    main_client: str
+    remote_client: str
+    voting_pubkey: str
+    main_ledger: Path
+    remote_ledger: Path
+    local_unstaked_identity: Path
+    local_validator_key: Path | None
+    remote_validator_key: str
+    secondary_cfg: SSHSettings
+
+
 # -------------------- Local/remote helpers for swap orchestration --------------------
 class SSHSession:
-    def __init__(self, cfg, init_script=None):
+    """
+    Persistent remote shell. stdout/stderr are non-blocking pipes multiplexed with `selectors`:
+    every command has a deadline and a unique completion marker, output is streamed to verbose
+    logs as it arrives, and nothing ever blocks on a pipe the remote side keeps open.
+    """
+
+    def __init__(self, cfg, init_script=None, verbose: bool = False):
         from uttils import build_ssh_command
+        env_prefix = None
         if init_script is None:
-            init_script = ["/bin/bash", "-s", "-l"]
+            # Plain shell + captured login env; login shell only if no snapshot is available
+            env_prefix = remote_env_prefix(cfg)
+            init_script = ["/bin/bash", "-s"] if env_prefix else ["/bin/bash", "-s", "-l"]
         self._cmd = build_ssh_command(cfg, init_script)
+        self._host = host_key(cfg)
+        self.verbose = verbose
+        if cassette_mode() == "replay":
+            # served from the cassette: no process, run()/wait_exit() return the recorded results
+            self.p = self._sel = None
+            return
         self.p = subprocess.Popen(self._cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                                  stderr=subprocess.PIPE, text=True)
+                                  stderr=subprocess.PIPE, bufsize=0, preexec_fn=child_preexec())
+        self._sel = selectors.DefaultSelector()
+        self._buf = {"out": bytearray(), "err": bytearray()}
+        self._partial = {"out": b"", "err": b""}
+        for name, pipe in (("out", self.p.stdout), ("err", self.p.stderr)):
+            os.set_blocking(pipe.fileno(), False)
+            self._sel.register(pipe, selectors.EVENT_READ, name)
+        if env_prefix:
+            self._write(env_prefix.rstrip("; ") + "\n")
 
-    def run(self, line: str, wait_output=True):
-        if not self.p.stdin:
+    def _write(self, data: str) -> None:
+        if not self.p.stdin or self.p.stdin.closed:
             raise RuntimeError("SSH stdin closed")
-        marker = "__RC__=$?; echo __RC__:$__RC__"
-        self.p.stdin.write(line + f"; {marker}\n")
-        self.p.stdin.flush()
+        try:
+            self.p.stdin.write(data.encode())
+        except BrokenPipeError:
+            raise RuntimeError("SSH session closed by remote")
+
+    def _stream(self, name: str, chunk: bytes) -> None:
+        data = self._partial[name] + chunk
+        *lines, self._partial[name] = data.split(b"\n")
+        tag = "SECONDARY" if name == "out" else "SECONDARY stderr"
+        for raw in lines:
+            line = raw.decode(errors="replace")
+            if not line.startswith((MARKER_PREFIX, STEP_TAG)):
+                print(f"[VERBOSE] {tag}: {line}")
+
+    def _pump(self, timeout: float) -> bool:
+        """Read whatever is available within timeout. Returns False once both pipes hit EOF."""
+        if not self._sel.get_map():
+            return False
+        for key, _ in self._sel.select(max(0.0, timeout)):
+            try:
+                chunk = os.read(key.fileobj.fileno(), 65536)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                self._sel.unregister(key.fileobj)
+                continue
+            self._buf[key.data] += chunk
+            if self.verbose:
+                self._stream(key.data, chunk)
+        return bool(self._sel.get_map())
+
+    def _take(self, name: str) -> str:
+        data = bytes(self._buf[name])
+        self._buf[name].clear()
+        return data.decode(errors="replace")
+
+    def run(self, line: str, wait_output: bool = True, timeout: float = 30.0) -> tuple[str, str]:
+        """Run one line in the session; (stdout, stderr). Raises on rc != 0, EOF or deadline."""
+        return cassette_call("session", {"host": self._host, "line": line, "wait": wait_output},
+                            lambda: self._run(line, wait_output, timeout))
+
+    def _run(self, line: str, wait_output: bool, timeout: float) -> tuple[str, str]:
+        marker = f"{MARKER_PREFIX}{uuid.uuid4().hex}__"
+        self._write(f"{line}\necho {marker}:$?\n" if wait_output else f"{line}\n")
         if not wait_output:
             return "", ""
-        out_lines = []
+        deadline = time.monotonic() + timeout
+        tag = marker.encode() + b":"
         while True:
-            line = self.p.stdout.readline()
-            if not line:
-                break
-            if line.startswith("__RC__:"):
-                rc = int(line.split(":", 1)[1])
-                if rc != 0:
-                    err = self.p.stderr.read() if self.p.stderr else ""
-                    raise RuntimeError(f"remote rc={rc}\nOUT:\n{''.join(out_lines)}\nERR:\n{err}")
-                return "".join(out_lines), ""
-            out_lines.append(line)
+            out = self._buf["out"]
+            pos = out.find(tag)
+            if pos >= 0:
+                end = out.find(b"\n", pos)
+                if end >= 0:
+                    break
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError(f"[SECONDARY] command did not finish within {timeout:g}s: {line[:80]}")
+            if not self._pump(left):
+                err = self._take("err").strip()
+                raise RuntimeError(f"[SECONDARY] session closed during command (rc={self.p.poll()}): {err}")
+        rc = int(out[pos + len(tag):end])
+        stdout = out[:pos].decode(errors="replace")
+        del out[:end + 1]
+        self._pump(0)    # stderr written before the marker may still be in flight
+        stderr = self._take("err")
+        if rc != 0:
+            raise RuntimeError(f"remote rc={rc}\nOUT:\n{stdout}\nERR:\n{stderr}")
+        return stdout, stderr
+
+    def wait_exit(self, timeout: float) -> tuple[int | None, str]:
+        """After `exec <cmd>` replaced the shell: return (exit code of <cmd> or None on timeout, output)."""
+        return cassette_call("session_exit", {"host": self._host}, lambda: self._wait_exit(timeout))
+
+    def _wait_exit(self, timeout: float) -> tuple[int | None, str]:
+        deadline = time.monotonic() + timeout
+        while self._pump(deadline - time.monotonic()):
+            if time.monotonic() >= deadline:
+                return None, ""
+        try:
+            rc = self.p.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            return None, ""
+        return rc, "\n".join(x.strip() for x in (self._take("out"), self._take("err")) if x.strip())
 
     def close(self):
+        if self.p is None:
+            return
         try:
             if self.p and self.p.poll() is None and self.p.stdin:
                 try:
-                    self.p.stdin.write("exit\n")
-                    self.p.stdin.flush()
-                except BrokenPipeError:
+                    self.p.stdin.write(b"exit\n")
+                except (BrokenPipeError, ValueError):
                     pass
         finally:
             try:
@@ -60,13 +197,37 @@ class SSHSession:
                     self.p.terminate()
             except Exception:
                 pass
+            self._sel.close()
+            for pipe in (self.p.stdin, self.p.stdout, self.p.stderr):
+                try:
+                    if pipe:
+                        pipe.close()
+                except Exception:
+                    pass
+
 
+MARKER_PREFIX = "__RC_"
+PID_TAG = "__PID__:"
 
-def arm_remote_set_identity(secondary_cfg: SSHSettings, cmd_no_shell: str) -> subprocess.Popen:
-    """Open SSH on SECONDARY, remote waits for ENTER, then exec <cmd_no_shell>."""
-    remote_sh = f'read -r _; exec {cmd_no_shell}'
-    ssh_cmd = build_ssh_command(secondary_cfg, remote_sh)
-    return subprocess.Popen(ssh_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+def arm_remote_set_identity(cfg: SSHSettings, cmd_no_shell: str, merge_output: bool = False,
+                            tower_dest: str | None = None, report_pid: bool = False) -> subprocess.Popen:
+    """
+    Open SSH on a target, remote waits for ENTER, then exec <cmd_no_shell> (EOF without ENTER = no-op).
+    merge_output: stderr folded into stdout (MAIN in controller mode is streamed line by line).
+    tower_dest: the ENTER line may carry a base64 tower, written to tower_dest before the exec.
+    report_pid: first output line is the remote PID (kept by the exec), so an unacknowledged run can be stopped.
+    """
+    pid = f'echo {PID_TAG}$$; ' if report_pid else ""
+    if tower_dest:
+        remote_sh = f'{pid}read -r _t && {tower_read_sh(tower_dest)}exec {cmd_no_shell}'
+    else:
+        remote_sh = f'{pid}read -r _ && exec {cmd_no_shell}'
+    remote_sh += " 2>&1" if merge_output else ""
+    ssh_cmd = build_ssh_command(cfg, remote_sh)
+    return cassette_popen("armed", {"host": host_key(cfg), "cmd": cmd_no_shell}, lambda: subprocess.Popen(
+        ssh_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=(subprocess.STDOUT if merge_output else subprocess.PIPE), text=True, preexec_fn=child_preexec()))
 
 
 def build_local_set_identity_cmd(main_client: str, main_ledger: Path, key: Path) -> list[str]:
@@ -82,26 +243,823 @@ def build_local_set_identity_cmd(main_client: str, main_ledger: Path, key: Path)
     raise RuntimeError(f"[MAIN] unknown client '{main_client}'")
 
 
-def _spawn_set_identity_main_async(main_client: str, main_ledger: Path, key: Path) -> subprocess.Popen:
+class MainSetIdentity:
+    """
+    MAIN set-identity process with stdout/stderr streamed and timestamped (ms since spawn).
+    Events: `ready` fires on the early signal (if early_pattern matches a line) or on process exit;
+    `done` fires on process exit. SECONDARY is gated on these instead of fixed waits.
+    armed: a pre-opened session on a remote MAIN (controller mode) released here instead of a local spawn.
+    on_exit: called on the reader thread right after a successful exit (MAIN no longer holds the identity).
+    """
+
+    def __init__(self, cmd: list[str], timeout_s: float, early_pattern: str | None = None, verbose: bool = False,
+                 zygote: Zygote | None = None, armed: subprocess.Popen | None = None,
+                 on_exit: Callable[[], None] | None = None):
+        self.cmd = cmd
+        self.on_exit = on_exit
+        self.timeout_s = timeout_s
+        self.verbose = verbose
+        self.lines: list[tuple[float, str]] = []
+        self.early_ms: float | None = None
+        self.elapsed_ms: float | None = None
+        self._early_re = re.compile(early_pattern) if early_pattern else None
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        self.t0 = time.perf_counter()
+        if armed is not None:
+            _fire_armed(armed)
+            self.p = armed
+        else:
+            self.p = cassette_popen("main", {"cmd": cmd}, lambda: spawn_process(cmd, zygote=zygote))
+        self._reader = threading.Thread(target=self._pump, daemon=True)
+        self._reader.start()
+
+    def since_spawn_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000.0
+
+    def _pump(self) -> None:
+        try:
+            for raw in self.p.stdout:
+                ts = self.since_spawn_ms()
+                line = raw.rstrip()
+                self.lines.append((ts, line))
+                if self.verbose:
+                    print(f"[VERBOSE] MAIN +{ts:.1f}ms: {line}")
+                if self._early_re and self.early_ms is None and self._early_re.search(line):
+                    self.early_ms = ts
+                    self.ready.set()
+        finally:
+            self.p.wait()
+            self.elapsed_ms = self.since_spawn_ms()
+            self.done.set()
+            self.ready.set()
+            if self.on_exit is not None and self.p.returncode == 0:
+                self.on_exit()
+
+    def remaining_s(self) -> float:
+        return max(0.0, self.timeout_s - (time.perf_counter() - self.t0))
+
+    def _check_exit(self, when: str) -> None:
+        if self.p.returncode != 0:
+            tail = "; ".join(line for _, line in self.lines[-3:])
+            raise RuntimeError(f"[MAIN] set-identity failed {when}: rc={self.p.returncode} {tail}".rstrip())
+
+    def wait_ready(self) -> str:
+        """Block until MAIN may be followed by SECONDARY: 'early' or 'exit'. Raises on failure/timeout."""
+        if not self.ready.wait(self.remaining_s()):
+            self.p.kill()    # SECONDARY will not fire: MAIN must not unstake late
+            raise TimeoutError(f"[MAIN] set-identity did not complete within {self.timeout_s:g}s")
+        if self.early_ms is not None:
+            return "early"
+        self._check_exit("before trigger")
+        return "exit"
+
+    def finish(self, when: str = "") -> float:
+        """Wait for MAIN to exit; return elapsed ms. Raises on failure/timeout."""
+        if not self.done.wait(self.remaining_s()):
+            raise TimeoutError(f"[MAIN] set-identity did not complete within {self.timeout_s:g}s {when}".rstrip())
+        self._check_exit(when)
+        return self.elapsed_ms
+
+
+def _spawn_set_identity_main_async(
+        main_client: str,
+        main_ledger: Path,
+        key: Path,
+        *,
+        timeout_s: float | None = None,
+        early_pattern: str | None = None,
+        zygote: Zygote | None = None,
+        verbose: bool = False,
+        on_exit: Callable[[], None] | None = None,
+) -> MainSetIdentity:
     cmd = build_local_set_identity_cmd(main_client, main_ledger, key)
-    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if verbose:
+        print(f"[VERBOSE] MAIN set-identity: {cmd}")
+    if timeout_s is None:
+        timeout_s = 10 if (main_client or "").upper() == "FD" else 6
+    return MainSetIdentity(cmd, timeout_s, early_pattern=early_pattern, verbose=verbose, zygote=zygote,
+                           on_exit=on_exit)
+
+
+class MainRollback:
+    """MAIN set-identity back to the validator key; built and checked before the trigger."""
+
+    def __init__(self, main_client: str, main_ledger: Path, validator_key: Path, timeout_s: float | None = None,
+                 main_cfg: SSHSettings | None = None):
+        self.main_cfg = main_cfg
+        if main_cfg is not None:
+            # remote MAIN (controller mode): same checks, one batched stat over the MAIN channel
+            self.remote_cmd = _build_remote_set_identity_cmd_no_shell(
+                main_client, main_cfg, main_ledger, str(validator_key), role="MAIN")
+            self.cmd = shlex.split(self.remote_cmd)
+            key_st = remote_stat(main_cfg, str(validator_key), max_age_s=60)
+            if not key_st.readable:
+                raise RuntimeError(f"[ROLLBACK] MAIN validator key not found: {key_st.realpath}")
+            cli_st = remote_stat(main_cfg, remote_set_identity_paths(main_client, "MAIN")[0], max_age_s=60)
+            if not cli_st.executable:
+                raise RuntimeError(f"[ROLLBACK] MAIN set-identity binary not found: {cli_st.realpath}")
+        else:
+            self.remote_cmd = None
+            key = Path(validator_key).expanduser()
+            if not key.exists():
+                raise RuntimeError(f"[ROLLBACK] MAIN validator key not found: {key}")
+            self.cmd = build_local_set_identity_cmd(main_client, main_ledger, key)
+            if not Path(self.cmd[0]).exists():
+                raise RuntimeError(f"[ROLLBACK] MAIN set-identity binary not found: {self.cmd[0]}")
+        self.timeout_s = timeout_s if timeout_s is not None else (10 if (main_client or "").upper() == "FD" else 6)
+
+    def fire(self, verbose: bool = False) -> float:
+        if verbose:
+            print(f"[VERBOSE] ROLLBACK MAIN set-identity: {self.cmd}")
+        return _run_main_set_identity(self.cmd, self.timeout_s, "during rollback", verbose,
+                                      main_cfg=self.main_cfg, remote_cmd=self.remote_cmd)
+
+
+def _run_main_set_identity(cmd: list[str], timeout_s: float, when: str, verbose: bool = False,
+                           main_cfg: SSHSettings | None = None, remote_cmd: str | None = None) -> float:
+    """One blocking MAIN set-identity outside the critical path (rollback, unstake retry); returns its ms."""
+    if main_cfg is None:
+        return MainSetIdentity(cmd, timeout_s, verbose=verbose).finish(when)
+    t0 = time.perf_counter()
+    try:
+        res = run_remote(main_cfg, remote_cmd, timeout=timeout_s, login_shell=False)
+    except subprocess.TimeoutExpired:
+        raise TimeoutError(f"[MAIN] set-identity did not complete within {timeout_s:g}s {when}")
+    if res.returncode != 0:
+        tail = "; ".join((res.stderr or res.stdout or "").strip().splitlines()[-3:])
+        raise RuntimeError(f"[MAIN] set-identity failed {when}: rc={res.returncode} {tail}".rstrip())
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def _abort_main_timeout(main: MainSetIdentity, rollback: MainRollback | None, verbose: bool) -> None:
+    """MAIN did not finish before the trigger: SECONDARY untouched, restore MAIN to a known state."""
+    try:
+        main.p.kill()
+    except Exception:
+        pass
+    if rollback is not None:
+        print("[ROLLBACK] MAIN set-identity timed out before trigger: restoring validator identity on MAIN…")
+        rollback.fire(verbose)
+        print(f"[ROLLBACK] MAIN restored; outage ≈ {main.since_spawn_ms():.0f} ms")
+
+
+def _confirm_secondary(
+        label: str,
+        remote_rc: int | None,
+        remote_out: str,
+        main: MainSetIdentity,
+        rollback: MainRollback | None,
+        verbose: bool,
+        secondary_cfg: SSHSettings | None = None,
+        voting_pubkey: str | None = None,
+        stop_remote: Callable[[], str] | None = None,
+) -> None:
+    """
+    Check SECONDARY's set-identity result; on failure fire the pre-staged MAIN rollback.
+    No acknowledgment: the remote attempt is stopped (stop_remote) and SECONDARY's active identity
+    re-read first — MAIN is restored only once SECONDARY is known not to run the validator key.
+    """
+    if verbose:
+        print(f"[VERBOSE] SECONDARY ({label}) rc={remote_rc}")
+        if remote_out:
+            print(f"[VERBOSE] SECONDARY ({label}) output: {remote_out}")
+    if remote_rc == 0:
+        print(f"[SWAP] outage ≈ {main.since_spawn_ms():.0f} ms (MAIN unstake → SECONDARY confirmed)")
+        return
+    reason = "no acknowledgment" if remote_rc is None else f"rc={remote_rc}"
+    if rollback is None:
+        raise RuntimeError(f"SECONDARY ({label}) set-identity failed ({reason}); rollback disabled")
+    if remote_rc is None:
+        # a late finish would leave both nodes on the validator key: stop it and look before touching MAIN
+        if stop_remote is not None:
+            try:
+                print(f"[ROLLBACK] SECONDARY ({label}) no acknowledgment: stopping its set-identity… {stop_remote()}")
+            except Exception as e:
+                print(f"[ROLLBACK] stopping SECONDARY ({label}) set-identity failed: {e}")
+        try:
+            active = secondary_active_identity(secondary_cfg)
+        except Exception as e:
+            raise RuntimeError(
+                f"[ROLLBACK] SECONDARY ({label}) state unknown ({e}): MAIN left on the unstaked identity — "
+                f"check SECONDARY before restoring MAIN by hand"
+            ) from e
+        if active == voting_pubkey:
+            print(f"[SWAP] SECONDARY ({label}) runs the validator identity without an acknowledgment; "
+                  f"outage ≈ {main.since_spawn_ms():.0f} ms — no rollback")
+            return
+        print(f"[ROLLBACK] SECONDARY ({label}) active identity: {active or '?'} (not the validator key)")
+    print(f"[ROLLBACK] SECONDARY ({label}) {reason}: restoring validator identity on MAIN…")
+    # never race MAIN's own (unstake) set-identity
+    main.done.wait(main.remaining_s())
+    rollback.fire(verbose)
+    print(f"[ROLLBACK] MAIN restored; outage ≈ {main.since_spawn_ms():.0f} ms")
+    raise RuntimeError(f"SECONDARY ({label}) set-identity failed ({reason}); rolled back to MAIN")
+
 
+def _settle_main_after_fire(
+        label: str,
+        err: Exception,
+        main: MainSetIdentity,
+        *,
+        voting_pubkey: str,
+        main_cfg: SSHSettings | None,
+        retry_main: Callable[[], float],
+        demote_secondary: Callable[[], subprocess.CompletedProcess],
+        verbose: bool,
+) -> None:
+    """
+    MAIN's unstake failed or timed out after SECONDARY had already taken the validator key (early
+    signal / timed trigger): both nodes may hold it. MAIN's attempt is killed and its identity read over
+    RPC; while MAIN may still run the key its unstake is retried once, and if that does not settle it,
+    SECONDARY is set back to its unstaked identity. Returns only when MAIN is known to be off the key.
+    """
+    try:
+        main.p.kill()
+    except Exception:
+        pass
+    print(f"[SWAP] MAIN set-identity failed after SECONDARY ({label}) took the identity: {err}")
+    print("[SWAP] both nodes may hold the validator identity: settling…")
+    try:
+        active = main_active_identity(main_cfg)
+    except Exception as e:
+        active = ""
+        print(f"[SWAP] MAIN identity unknown: {e}")
+    if active and active != voting_pubkey:
+        print(f"[SWAP] MAIN runs {active} (not the validator key): only SECONDARY ({label}) holds it")
+        return
+    print(f"[SWAP] MAIN identity: {active or '?'}; retrying its unstake…")
+    try:
+        retry_main()
+        print(f"[SWAP] MAIN unstaked on retry; outage ≈ {main.since_spawn_ms():.0f} ms")
+        return
+    except (TimeoutError, RuntimeError) as e:
+        print(f"[SWAP] MAIN unstake retry failed: {e}")
+    print(f"[SWAP] setting SECONDARY ({label}) back to its unstaked identity…")
+    try:
+        res = demote_secondary()
+        failed = "" if res.returncode == 0 else " ".join(
+            [f"rc={res.returncode}", *(res.stderr or res.stdout or "").strip().splitlines()[-3:]])
+    except (subprocess.TimeoutExpired, OSError) as e:
+        failed = str(e) or type(e).__name__
+    if failed:
+        raise RuntimeError(
+            f"[SWAP] both nodes may hold the validator identity: MAIN could not be unstaked and SECONDARY "
+            f"({label}) could not be set back ({failed}) — move one of them off the key by hand now"
+        ) from err
+    state = "MAIN keeps the validator identity" if active == voting_pubkey else "check that MAIN is voting"
+    raise RuntimeError(
+        f"[SWAP] MAIN could not be unstaked after SECONDARY ({label}) took the identity; "
+        f"SECONDARY set back to its unstaked identity — {state}"
+    ) from err
 
-def _prewarm_secondary(secondary_cfg: SSHSettings, remote_ledger: Path) -> None:
-    run_remote(secondary_cfg, "true")  # ControlMaster / known_hosts / auth
-    led = remote_expand_path(secondary_cfg, str(remote_ledger))
-    run_remote(secondary_cfg, f'test -r {shlex.quote(led)}/CURRENT || true', login_shell=False)
 
+BG_STAGE_HOLD_S = 120.0    # a staged bg waiter exits untouched if never released
 
-def _trigger_remote_bg(secondary_cfg: SSHSettings, cmd_no_shell: str, ack: str = "OK") -> None:
 
-    remote_sh = f'echo {shlex.quote(ack)}; nohup setsid {cmd_no_shell} >/dev/null 2>&1 & disown'
-    res = run_remote(secondary_cfg, remote_sh, login_shell=False)
+def _trigger_remote_bg(
+        secondary_cfg: SSHSettings,
+        cmd_no_shell: str,
+        ack: str = "OK",
+        status_file: str | None = None,
+        timeout_s: float | None = None,
+        pre_sh: str = "",
+) -> None:
+    """
+    Fire-and-forget <cmd_no_shell> on SECONDARY. With status_file, the detached process writes its
+    output to <status_file>.log and its exit code to <status_file> (see _remote_bg_ack).
+    pre_sh: runs first in the same exchange (e.g. tower write); the ACK is only sent if it succeeds.
+    """
+    if status_file:
+        st = shlex.quote(status_file)
+        log = shlex.quote(status_file + ".log")
+        inner = f'echo $$ >{st}.pid; {cmd_no_shell} >{log} 2>&1; echo $? >{st}.tmp && mv {st}.tmp {st}'
+        remote_sh = f'echo {shlex.quote(ack)}; nohup setsid sh -c {shlex.quote(inner)} >/dev/null 2>&1 </dev/null & disown'
+    else:
+        remote_sh = f'echo {shlex.quote(ack)}; nohup setsid {cmd_no_shell} >/dev/null 2>&1 & disown'
+    if pre_sh:
+        remote_sh = f'{pre_sh}{{ {remote_sh}; }}'
+    res = run_remote(secondary_cfg, remote_sh, timeout=timeout_s, login_shell=False)
     out = (res.stdout or "").strip()
     if ack not in out:
         raise RuntimeError(f"[SECONDARY] bg-trigger: missing ACK: {out!r}")
 
 
+def stage_remote_bg(
+        secondary_cfg: SSHSettings,
+        cmd_no_shell: str,
+        status_file: str,
+        timeout_s: float | None = None,
+        hold_s: float = BG_STAGE_HOLD_S,
+        tower_dest: str | None = None,
+) -> str:
+    """
+    Pre-stage a detached <cmd_no_shell> on SECONDARY, blocked on the <status_file>.go FIFO. One line
+    written to the FIFO releases it (output/exit code go to the status file, as _trigger_remote_bg);
+    'CANCEL' or hold_s without a line makes it exit untouched. Returns the FIFO path.
+    tower_dest: the release line may carry a base64 tower, written to tower_dest before the command.
+    """
+    go = status_file + ".go"
+    st, log, go_q = shlex.quote(status_file), shlex.quote(status_file + ".log"), shlex.quote(go)
+    pre = tower_read_sh(tower_dest) if tower_dest else ""
+    inner = (
+        f'exec 3<>{go_q}; read -t {hold_s:g} -r _t <&3; rc=$?; exec 3<&-; rm -f {go_q}; '
+        f'[ $rc -eq 0 ] && [ "$_t" != CANCEL ] || exit 0; '
+        f'echo $$ >{st}.pid; {pre}{cmd_no_shell} >{log} 2>&1; echo $? >{st}.tmp && mv {st}.tmp {st}'
+    )
+    remote_sh = (f'rm -f {go_q} && mkfifo {go_q} && echo STAGED && '
+                 f'{{ nohup setsid bash -c {shlex.quote(inner)} >/dev/null 2>&1 </dev/null & disown; }}')
+    res = run_remote(secondary_cfg, remote_sh, timeout=timeout_s, login_shell=False)
+    if "STAGED" not in (res.stdout or ""):
+        raise RuntimeError(f"[SECONDARY] bg stage failed: {(res.stderr or res.stdout or '').strip()!r}")
+    return go
+
+
+def _remote_bg_ack(secondary_cfg: SSHSettings, status_file: str, timeout_s: float = 10.0) -> tuple[int | None, str]:
+    """Wait (remotely, one round trip) for the bg status file; return (rc or None on timeout, output)."""
+    st = shlex.quote(status_file)
+    log = shlex.quote(status_file + ".log")
+    loops = max(1, int(timeout_s / 0.05))
+    wait_sh = (
+        f'i=0; while [ $i -lt {loops} ]; do '
+        f'if [ -f {st} ]; then cat {st}; cat {log} 2>/dev/null; rm -f {st} {log} {st}.pid; exit 0; fi; '
+        f'sleep 0.05; i=$((i+1)); done; echo PENDING'
+    )
+    try:
+        res = run_remote(secondary_cfg, wait_sh, timeout=timeout_s + 5, login_shell=False)
+    except subprocess.TimeoutExpired:
+        return None, ""
+    first, _, rest = (res.stdout or "").partition("\n")
+    first = first.strip()
+    if not first.lstrip("-").isdigit():
+        return None, (res.stdout or "").strip()
+    return int(first), rest.strip()
+
+
+def _fire_armed(arm_proc: subprocess.Popen, line: str = "") -> None:
+    """Release an armed session (it is blocked on `read`); line is handed to it as the ENTER line."""
+    if arm_proc and arm_proc.poll() is None and arm_proc.stdin:
+        try:
+            arm_proc.stdin.write(line + "\n")
+            arm_proc.stdin.flush()
+        except BrokenPipeError:
+            pass
+
+
+def _armed_ack(arm_proc: subprocess.Popen, timeout_s: float = 10.0) -> tuple[int | None, str]:
+    """Collect exit status/output of a fired armed session; (None, '') if it has not finished in time."""
+    try:
+        out, err = arm_proc.communicate(timeout=timeout_s)
+    except subprocess.TimeoutExpired as e:
+        # partial output: carries the PID line of a report_pid session
+        part = e.output.decode(errors="replace") if isinstance(e.output, bytes) else (e.output or "")
+        return None, part.strip()
+    out = "\n".join(line for line in (out or "").splitlines() if not line.startswith(PID_TAG))
+    return arm_proc.returncode, "\n".join(x.strip() for x in (out, err) if x and x.strip())
+
+
+def stop_remote_set_identity(secondary_cfg: SSHSettings, pid: str = "", pid_file: str | None = None,
+                             cleanup: tuple[str, ...] = (), timeout_s: float = 10.0) -> str:
+    """
+    Kill an unacknowledged set-identity on SECONDARY (its process group: a bg wrapper takes the
+    command with it). Only a process whose command line still mentions set-identity is touched.
+    cleanup: files removed afterwards (pid/status files of a bg run). Returns STOPPED, GONE (already exited) or NOPID.
+    """
+    src = f'$(cat {shlex.quote(pid_file)} 2>/dev/null)' if pid_file else shlex.quote(pid.strip())
+    stop_sh = (
+        f'pid={src}; [ -n "$pid" ] || {{ echo NOPID; exit 0; }}; '
+        'grep -q set-identity /proc/$pid/cmdline 2>/dev/null || { echo GONE; exit 0; }; '
+        'kill -TERM -- -$pid 2>/dev/null || kill -TERM $pid 2>/dev/null; '
+        'i=0; while grep -q set-identity /proc/$pid/cmdline 2>/dev/null && [ $i -lt 20 ]; do sleep 0.05; i=$((i+1)); done; '
+        'kill -KILL -- -$pid 2>/dev/null; kill -KILL $pid 2>/dev/null; echo STOPPED'
+    )
+    stop_sh = f'( {stop_sh} ); rm -f {" ".join(shlex.quote(f) for f in cleanup)}' if cleanup else stop_sh
+    res = run_remote(secondary_cfg, stop_sh, timeout=timeout_s, login_shell=False)
+    return ((res.stdout or "").strip().splitlines() or ["?"])[0]
+
+
+def secondary_active_identity(secondary_cfg: SSHSettings, timeout_s: float = 5.0) -> str:
+    """Identity SECONDARY runs right now (getIdentity on its local RPC, over SSH)."""
+    res = remote_rpc_call(secondary_cfg, REMOTE_RPC_URL, "getIdentity", timeout=timeout_s)
+    return str((res or {}).get("identity") or "")
+
+
+def main_active_identity(main_cfg: SSHSettings | None = None, timeout_s: float = 5.0) -> str:
+    """Identity MAIN runs right now (getIdentity on its local RPC; over SSH in controller mode)."""
+    if main_cfg is not None:
+        res = remote_rpc_call(main_cfg, LOCAL_RPC_URL, "getIdentity", timeout=timeout_s, node="MAIN")
+    else:
+        res = rpc_call(LOCAL_RPC_URL, "getIdentity", timeout=timeout_s)
+    return str((res or {}).get("identity") or "")
+
+
+AGAVE_MODES = ("sequential", "armed", "bg")
+REMOTE_ACK_TIMEOUT_S = 10.0
+
+
+# ------------------------- Adaptive fd_mode ('auto') -------------------------
+
+FD_DELAY_MIN_MS = 0
+FD_DELAY_MAX_MS = 1500
+AUTO_MIN_SAMPLES = 3
+AUTO_DELAY_MARGIN_MS = 20
+AUTO_HISTORY_LEN = 20
+
+
+def _percentile(values: list[float], q: float) -> float:
+    v = sorted(values)
+    return v[min(len(v) - 1, max(0, int(round(q * (len(v) - 1)))))]
+
+
+def record_swap_timing(
+        secondary_cfg: SSHSettings,
+        *,
+        main_client: str,
+        remote_client: str,
+        mode: str,
+        main_ms: float | None,
+) -> None:
+    """Append MAIN set-identity duration to the per-SECONDARY history used by fd_mode='auto'."""
+    if main_ms is None:
+        return
+    key = host_key(secondary_cfg)
+    hist = list(state_get("swap_timings", key, []) or [])
+    hist.append({
+        "ts": time.time(),
+        "main_client": (main_client or "").upper(),
+        "remote_client": (remote_client or "").upper(),
+        "mode": mode,
+        "main_ms": round(main_ms, 1),
+    })
+    state_put("swap_timings", key, hist[-AUTO_HISTORY_LEN:])
+
+
+def annotate_swap_timing(secondary_cfg: SSHSettings, **fields) -> None:
+    """Attach extra measurements (e.g. the log-derived vote gap) to the latest swap record."""
+    key = host_key(secondary_cfg)
+    hist = list(state_get("swap_timings", key, []) or [])
+    if hist:
+        hist[-1].update(fields)
+        state_put("swap_timings", key, hist)
+
+
+def export_swap_record(secondary_cfg: SSHSettings, path: Path) -> None:
+    """Append the latest swap record (timings, vote gap, vote-account accounting) to path as one JSON line."""
+    hist = state_get("swap_timings", host_key(secondary_cfg), []) or []
+    if not hist:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps({"secondary": host_key(secondary_cfg), **hist[-1]}, sort_keys=True) + "\n")
+    print(f"[METRICS] swap record appended to {path}")
+
+
+def choose_fd_mode(secondary_cfg: SSHSettings, main_client: str, rtt_samples: int = 3) -> tuple[str, int, str]:
+    """
+    Pick (fd_mode, trigger_delay_ms, reason) from live RTT probes and recorded MAIN set-identity timings.
+    armed: SECONDARY is fired `delay` ms after MAIN spawn; the delay covers MAIN's p90 set-identity time
+    plus a margin, minus the one-way trip of the ENTER, so SECONDARY never takes the identity first.
+    Falls back to sequential when there is not enough (or too noisy) history.
+    """
+    kind = (main_client or "").upper()
+    rtts = measure_rtt_ms(secondary_cfg, samples=rtt_samples)
+    if not rtts:
+        return "sequential", 0, "RTT probe failed"
+    rtt = min(rtts)
+    hist = [
+        float(h["main_ms"])
+        for h in (state_get("swap_timings", host_key(secondary_cfg), []) or [])
+        if h.get("main_client") == kind and h.get("main_ms") is not None
+    ]
+    if len(hist) < AUTO_MIN_SAMPLES:
+        return "sequential", 0, (
+            f"{len(hist)} recorded MAIN ({kind}) set-identity timings, need {AUTO_MIN_SAMPLES}; RTT={rtt:.1f}ms"
+        )
+    p50 = statistics.median(hist)
+    p90 = _percentile(hist, 0.9)
+    if p90 > 2 * p50 + 50:
+        return "sequential", 0, f"MAIN ({kind}) set-identity unstable: p50={p50:.0f}ms p90={p90:.0f}ms"
+    raw = p90 + AUTO_DELAY_MARGIN_MS - rtt / 2
+    if raw > FD_DELAY_MAX_MS:
+        return "sequential", 0, f"MAIN ({kind}) set-identity p90={p90:.0f}ms exceeds delay bound {FD_DELAY_MAX_MS}ms"
+    delay = int(max(FD_DELAY_MIN_MS, raw))
+    return "armed", delay, (
+        f"RTT={rtt:.1f}ms, MAIN ({kind}) set-identity p50={p50:.0f}ms p90={p90:.0f}ms over {len(hist)} swaps; "
+        f"delay=p90+{AUTO_DELAY_MARGIN_MS}-RTT/2"
+    )
+
+
+# ------------------------------- Live RTT gate -------------------------------
+# The last preflight can be seconds old when the trigger fires. Right before MAIN is touched, a few
+# pings go over the already-open SECONDARY session and are compared with the pair's baseline: a
+# congested path holds the swap (bounded retry) or aborts it with both identities unchanged.
+# The baseline is the median of recent passed gates. Until there are RTT_GATE_SEED of them the gate
+# only seeds the history (the exec RTT measures something else); closed gates are kept apart, and only
+# a run of them spread over hours (or --rtt-gate-rebaseline) replaces the baseline: a lasting change
+# of the path, not a congested evening.
+
+RTT_GATE_PINGS = 3
+RTT_GATE_FACTOR = 2.0
+RTT_GATE_SLACK_MS = 5.0     # absolute headroom: sub-ms LAN baselines are not "degraded" by scheduler noise
+RTT_GATE_WAIT_S = 5.0
+RTT_GATE_RETRY_S = 0.25
+RTT_GATE_HISTORY = 20
+RTT_GATE_HISTORY_MAX_AGE_S = 24 * 3600
+RTT_GATE_SEED = 3                       # passed gates before the gate judges the link
+RTT_GATE_REBASE_CLOSED = 3              # closed gates in a row, with no pass in between ...
+RTT_GATE_REBASE_SPAN_S = 6 * 3600       # ... spread over more than this: the path itself changed
+
+
+class RttGateClosed(RuntimeError):
+    pass
+
+
+def _recent_gates(secondary_cfg: SSHSettings, section: str = "session_rtt") -> list[dict]:
+    cutoff = time.time() - RTT_GATE_HISTORY_MAX_AGE_S
+    # entries without a timestamp predate the age cut-off and are dropped with it
+    return [g for g in state_get(section, host_key(secondary_cfg), []) or []
+            if isinstance(g, dict) and g.get("ts", 0) >= cutoff]
+
+
+def rtt_gate_baseline(secondary_cfg: SSHSettings) -> tuple[float | None, str]:
+    """In-session ping baseline of the pair (median of recent passed gates); None while still seeding."""
+    hist = _recent_gates(secondary_cfg)
+    if len(hist) >= RTT_GATE_SEED:
+        return statistics.median(g["ms"] for g in hist), f"session, {len(hist)} gates"
+    return None, f"seeding, {len(hist)}/{RTT_GATE_SEED} gates"
+
+
+def rtt_gate_rebaseline(secondary_cfg: SSHSettings) -> None:
+    """Forget the pair's gate history: the next gates seed a new baseline."""
+    for section in ("session_rtt", "session_rtt_closed"):
+        state_put(section, host_key(secondary_cfg), [])
+
+
+def _record_gate(secondary_cfg: SSHSettings, passed: bool, ms: float) -> None:
+    key = host_key(secondary_cfg)
+    entry = {"ts": round(time.time(), 3), "ms": ms}
+    if passed:
+        hist = _recent_gates(secondary_cfg) + [entry]
+        state_put("session_rtt", key, hist[-RTT_GATE_HISTORY:])
+        state_put("session_rtt_closed", key, [])    # the closed ones were a passing congestion
+        return
+    closed = (_recent_gates(secondary_cfg, "session_rtt_closed") + [entry])[-RTT_GATE_HISTORY:]
+    if len(closed) >= RTT_GATE_REBASE_CLOSED and closed[-1]["ts"] - closed[0]["ts"] > RTT_GATE_REBASE_SPAN_S:
+        print(f"[RTT GATE] {len(closed)} closed gates over {(closed[-1]['ts'] - closed[0]['ts']) / 3600:.1f} h: "
+              f"path changed, baseline rebased to {statistics.median(g['ms'] for g in closed):.1f} ms")
+        state_put("session_rtt", key, closed)
+        closed = []
+    state_put("session_rtt_closed", key, closed)
+
+
+def session_pings(sess: SSHSession, n: int, timeout_s: float) -> list[tuple[float, float]]:
+    """n round trips over the open session: (send time in ms since the first ping, RTT ms)."""
+    out: list[tuple[float, float]] = []
+    t_first = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        sess.run(f"echo {i}", timeout=timeout_s)
+        out.append(((t0 - t_first) * 1000.0, (time.perf_counter() - t0) * 1000.0))
+    return out
+
+
+def live_rtt_gate(
+        sess: SSHSession,
+        secondary_cfg: SSHSettings,
+        factor: float = RTT_GATE_FACTOR,
+        wait_s: float = RTT_GATE_WAIT_S,
+        pings: int = RTT_GATE_PINGS,
+        rebaseline: bool = False,
+        verbose: bool = False,
+) -> dict:
+    """
+    Ping SECONDARY until the median RTT is within max(baseline * factor, baseline + slack) or wait_s
+    runs out. Returns the measurements; raises RttGateClosed (nothing changed yet) if the link stays slow.
+    While the baseline is still seeding, any answer passes and becomes part of it.
+    rebaseline: drop the recorded history first (the operator knows the path changed).
+    """
+    if rebaseline:
+        rtt_gate_rebaseline(secondary_cfg)
+    base, src = rtt_gate_baseline(secondary_cfg)
+    limit = None if base is None else max(base * factor, base + RTT_GATE_SLACK_MS)
+    t0 = time.perf_counter()
+    deadline = t0 + max(0.0, wait_s)
+    rounds: list[dict] = []
+    while True:
+        try:
+            samples = session_pings(sess, pings, max(0.05, deadline - time.perf_counter()))
+            med = statistics.median(rtt for _, rtt in samples)
+        except TimeoutError:
+            samples, med = [], None
+        rounds.append({"pings": [[round(ts, 2), round(rtt, 2)] for ts, rtt in samples],
+                       "median_ms": None if med is None else round(med, 2)})
+        passed = med is not None and (limit is None or med <= limit)
+        if verbose or not passed:
+            shown = "no answer" if med is None else f"median {med:.1f} ms"
+            print(f"[RTT GATE] round {len(rounds)}: {shown} vs "
+                  + (f"limit {limit:.1f} ms" if limit is not None else src)
+                  + ("" if passed else " — link degraded"))
+        if passed or time.perf_counter() + RTT_GATE_RETRY_S > deadline:
+            break
+        time.sleep(RTT_GATE_RETRY_S)
+    gate = {
+        "baseline_ms": None if base is None else round(base, 2),
+        "baseline_src": src,
+        "limit_ms": None if limit is None else round(limit, 2),
+        "rounds": rounds,
+        "held_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+        "verdict": (("seed" if base is None else "pass") if len(rounds) == 1 else "waited") if passed else "abort",
+    }
+    answered = [r["median_ms"] for r in rounds if r["median_ms"] is not None]
+    if answered:
+        # a closed gate counts by its best round: only a lasting slow path may move the baseline
+        _record_gate(secondary_cfg, passed, answered[-1] if passed else min(answered))
+    if passed:
+        if base is None:
+            print(f"[RTT GATE] {gate['verdict']}: median {med:.1f} ms recorded ({src}), held {gate['held_ms']:.0f} ms")
+        else:
+            print(f"[RTT GATE] {gate['verdict']}: median {med:.1f} ms (baseline {base:.1f} ms, {src}; "
+                  f"limit {limit:.1f} ms), held {gate['held_ms']:.0f} ms")
+        return gate
+    if limit is None:
+        raise RttGateClosed(
+            f"[RTT GATE] SECONDARY session did not answer for {gate['held_ms'] / 1000.0:.1f}s: "
+            f"swap not started, identities unchanged"
+        )
+    raise RttGateClosed(
+        f"[RTT GATE] SECONDARY link degraded for {gate['held_ms'] / 1000.0:.1f}s "
+        f"(baseline {base:.1f} ms, limit {limit:.1f} ms): swap not started, identities unchanged"
+    )
+
+
+# -------------------------------- Swap budget --------------------------------
+# One deadline for the whole swap instead of per-call magic numbers: every step gets
+# min(its usual timeout, time left). Running out before the trigger aborts with nothing changed;
+# after the trigger the ack wait is cut short and the normal confirmation/rollback logic decides.
+
+BUDGET_ACK_FLOOR_S = 1.0    # a fired SECONDARY always gets this long to confirm, budget or not
+BUDGET_MAIN_FLOOR_S = 3.0   # a started MAIN set-identity is never killed sooner: mid-unstake is worse than late
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+class SwapBudget:
+    def __init__(self, total_s: float | None):
+        self.total_s = total_s
+        self.t0 = time.monotonic()
+        self.steps: list[tuple[str, str, float, str]] = []     # (phase, step, ms, status)
+
+    def remaining(self) -> float:
+        if self.total_s is None:
+            return float("inf")
+        return max(0.0, self.total_s - (time.monotonic() - self.t0))
+
+    def cap(self, timeout_s: float, floor_s: float = 0.0, reserve_ms: float = 0.0) -> float:
+        """
+        Timeout for the next call: its usual value, cut to the time left minus reserve_ms (kept for
+        what must follow), not below floor_s (itself never above the usual value).
+        """
+        return max(min(floor_s, timeout_s), min(timeout_s, self.remaining() - reserve_ms / 1000.0))
+
+    def check(self, what: str, need_ms: float = 0.0) -> None:
+        left = self.remaining()
+        if left * 1000.0 <= need_ms or left == 0.0:
+            raise BudgetExceeded(f"[BUDGET] {self.total_s:g}s swap budget: {left * 1000:.0f} ms left before {what}, "
+                                 f"≈{need_ms:.0f} ms needed")
+
+    def timed(self, phase: str, step: str, fn: Callable[[], object]):
+        """Run fn and book its wall time (and outcome) against the budget."""
+        t0 = time.perf_counter()
+        status = "failed"
+        try:
+            res = fn()
+            status = "ok"
+            return res
+        except (TimeoutError, subprocess.TimeoutExpired):
+            status = "timeout"
+            raise
+        finally:
+            self.steps.append((phase, step, (time.perf_counter() - t0) * 1000, status))
+
+    def summary(self) -> dict:
+        used = (time.monotonic() - self.t0) * 1000.0
+        return {"budget_s": self.total_s, "used_ms": round(used, 1),
+                "steps": [{"phase": ph, "step": n, "ms": round(ms, 1), "status": stt} for ph, n, ms, stt in self.steps]}
+
+    def report(self) -> None:
+        sm = self.summary()
+        left = f", left {self.remaining() * 1000:.0f} ms" if self.total_s is not None else ""
+        print(f"[BUDGET] {self.total_s:g}s: used {sm['used_ms']:.0f} ms{left}")
+        for ph, n, ms, stt in self.steps:
+            print(f"[BUDGET]   {ph:<13} {n:<40} {ms:>8.1f} ms  {stt}")
+
+
+# ------------------------------- Swap planning -------------------------------
+
+PRE, CRITICAL, POST = "pre-trigger", "critical", "post-trigger"
+MAIN_SET_IDENTITY_EST_MS = 150.0    # used when there is no recorded history
+REMOTE_SET_IDENTITY_EST_MS = 150.0
+STEP_TAG = "__STEP__:"               # separates per-step output inside a fused exchange
+
+
+@dataclass
+class Step:
+    """One swap step. Adjacent SECONDARY shell steps of the same phase are fused into one SSH exchange."""
+    name: str
+    phase: str
+    target: str                                   # MAIN | SECONDARY
+    shell: str | None = None                      # remote snippet (fusable)
+    run: Callable[[dict], None] | None = None     # local action / non-fusable step
+    round_trip: bool = False                      # costs an SSH exchange of its own
+    est_ms: float = 0.0                           # contribution to the phase latency
+    note: str = ""
+    parts: tuple[str, ...] = ()
+
+
+def fuse_steps(steps: list[Step]) -> list[Step]:
+    """Merge adjacent SECONDARY shell steps of one phase into a single exchange (outputs are tagged per step)."""
+    out: list[Step] = []
+    for st in steps:
+        tagged = f'echo {STEP_TAG}{st.name}; {st.shell}' if st.shell else None
+        prev = out[-1] if out else None
+        if tagged and prev and prev.shell and prev.phase == st.phase and prev.target == st.target:
+            prev.name = f"{prev.name}+{st.name}"
+            prev.shell = f"{prev.shell}; {tagged}"
+            prev.parts = prev.parts + (st.name,)
+            prev.est_ms = max(prev.est_ms, st.est_ms)
+            continue
+        out.append(Step(
+            name=st.name, phase=st.phase, target=st.target, shell=tagged, run=st.run,
+            round_trip=st.round_trip or bool(st.shell), est_ms=st.est_ms, note=st.note, parts=(st.name,),
+        ))
+    return out
+
+
+def _split_step_output(out: str) -> dict[str, str]:
+    res: dict[str, list[str]] = {}
+    cur = None
+    for line in (out or "").splitlines():
+        if line.startswith(STEP_TAG):
+            cur = line[len(STEP_TAG):].strip()
+            res[cur] = []
+        elif cur is not None:
+            res[cur].append(line)
+    return {k: "\n".join(v).strip() for k, v in res.items()}
+
+
+def print_plan(steps: list[Step], path: str = "MAIN unstake -> SECONDARY voting") -> None:
+    """Step list per phase, SSH round trips and estimated critical-path latency."""
+    print("[PLAN] Steps:")
+    for phase in (PRE, CRITICAL, POST):
+        group = [st for st in steps if st.phase == phase]
+        if not group:
+            continue
+        rts = sum(1 for st in group if st.round_trip)
+        est = sum(st.est_ms for st in group)
+        print(f"       {phase}: {len(group)} step(s), {rts} SSH round trip(s), ≈{est:.0f} ms")
+        for st in group:
+            fused = f"  [fused: {', '.join(st.parts)}]" if len(st.parts) > 1 else ""
+            rt = "RT " if st.round_trip else "   "
+            note = f"  — {st.note}" if st.note else ""
+            print(f"         {rt}{st.target:<9} {st.name:<28} ≈{st.est_ms:>5.0f} ms{fused}{note}")
+    crit = sum(st.est_ms for st in steps if st.phase == CRITICAL)
+    print(f"       critical path ({path}) ≈{crit:.0f} ms")
+
+
+def _exec_steps(steps: list[Step], ctx: dict, verbose: bool) -> None:
+    budget: SwapBudget = ctx["budget"]
+
+    def _one(st: Step) -> None:
+        if st.shell:
+            sess = ctx.get("sess")
+            if sess is not None:
+                out, _ = sess.run(st.shell, timeout=budget.cap(30.0))
+            else:
+                res = run_remote(ctx["cfg"], st.shell, timeout=budget.cap(30.0), login_shell=False)
+                if res.returncode != 0:
+                    raise RuntimeError(f"[SECONDARY] {st.name} failed: {(res.stderr or res.stdout or '').strip()}")
+                out = res.stdout
+            ctx.setdefault("out", {}).update(_split_step_output(out))
+        if st.run is not None:
+            st.run(ctx)
+
+    for st in steps:
+        profile_phase(st.phase)
+        if st.phase == PRE:
+            budget.check(st.name)
+        try:
+            budget.timed(st.phase, st.name, lambda: _one(st))
+        except (TimeoutError, subprocess.TimeoutExpired) as e:
+            if st.phase == PRE and budget.remaining() == 0.0:
+                raise BudgetExceeded(f"[BUDGET] {budget.total_s:g}s swap budget exhausted in {st.name}: {e}") from e
+            raise
+        finally:
+            if verbose and budget.steps:
+                print(f"[VERBOSE] step {st.phase}/{st.name}: {budget.steps[-1][2]:.1f} ms")
+
+
 # ----------------------------------- SWAP -----------------------------------
 
 def perform_swap(
@@ -117,25 +1075,56 @@ def perform_swap(
         cleanup_remote_tower: bool = True,
         fd_trigger_delay_ms: int = 10,
         fd_mode: str = "sequential",
+        agave_mode: str = "sequential",
+        main_timeout_s: float | None = None,
+        main_early_pattern: str | None = None,
+        local_validator_key: Path | None = None,
+        remote_unstaked_identity: str | None = None,
+        auto_rollback: bool = True,
+        slot_lag: dict | None = None,
+        plan_only: bool = False,
+        low_jitter: bool = False,
+        low_jitter_cpu: int | None = None,
+        low_jitter_rt: bool = False,
+        low_jitter_report: bool = False,
+        vote_gap: bool = False,
+        vote_gap_wait_s: float = 10.0,
+        vote_account_check: bool = False,
+        vote_account_wait_s: float = 30.0,
+        metrics_out: Path | None = None,
+        prewarm: bool = True,
+        prewarm_exec: bool = False,
+        budget_s: float | None = None,
+        main_cfg: SSHSettings | None = None,
+        tower_trigger: bool = False,
+        tower_trigger_wait_s: float = TOWER_WAIT_DEFAULT_S,
+        rtt_gate: bool = False,
+        rtt_gate_factor: float = RTT_GATE_FACTOR,
+        rtt_gate_wait_s: float = RTT_GATE_WAIT_S,
+        rtt_gate_rebaseline: bool = False,
         assume_yes: bool = False,
         verbose: bool = False,
-) -> None:
-    _prewarm_secondary(secondary_cfg, remote_ledger)
-
-    copied_tower = False
-    try:
-        copied_tower = copy_tower_main_to_secondary(
-            pubkey=current_voting_pubkey,
-            main_ledger=main_ledger,
-            secondary_cfg=secondary_cfg,
-            remote_ledger=remote_ledger,
-        )
-        if copied_tower and verbose:
-            print(f"[VERBOSE] tower synced to SECONDARY: tower-1_9-{current_voting_pubkey}.bin")
-    except Exception as e:
-        if verbose:
-            print(f"[VERBOSE] tower sync skipped: {e}")
-
+) -> SwapLeg | None:
+    """
+    Build the swap as an explicit list of steps, fuse SECONDARY steps into as few SSH exchanges as
+    possible, run everything that does not depend on MAIN unstaking before the trigger, then run the
+    critical path: MAIN set-identity -> SECONDARY set-identity -> confirmation/rollback.
+    Trigger kinds: sequential (exec over an open session on MAIN's event), armed (pre-opened session
+    released with ENTER), bg (detached remote process + status-file ack).
+    budget_s: swap-wide deadline from ENTER; each step's timeout is cut to the time left.
+    main_cfg: MAIN as an SSH target (controller mode on a third host); MAIN paths are remote, its
+    set-identity is armed before the trigger like SECONDARY's, so both are released over open channels.
+    tower_trigger: hold the critical path until MAIN's next tower write (its vote), then fire with the
+    fresh tower carried inside the SECONDARY trigger.
+    rtt_gate: right before MAIN is touched, ping SECONDARY over the open session; hold or abort on a slow link.
+    rtt_gate_rebaseline: the path changed for good; drop the gate history and seed a new baseline.
+    low_jitter: entered right before the critical steps (CPU picked while planning); low_jitter_report
+    rehearses the trigger gate with and without it before the prompt.
+    remote_unstaked_identity: SECONDARY's way back off the validator key if MAIN's unstake fails after
+    SECONDARY already fired (early signal / timed trigger).
+    """
+    if is_local(main_cfg):
+        main_cfg = None
     remote_cmd = _build_remote_set_identity_cmd_no_shell(
         remote_client=remote_client,
         secondary_cfg=secondary_cfg,
@@ -143,172 +1132,718 @@ def perform_swap(
         new_key_path_str=remote_validator_key,
     )
 
+    rc_kind = (remote_client or "").upper()
+    mode = (fd_mode or "sequential").lower()
+    mode_reason = None
+    if rc_kind == "FD" and mode == "auto":
+        mode, fd_trigger_delay_ms, mode_reason = choose_fd_mode(secondary_cfg, main_client)
+    fd_trigger_delay_ms = int(min(FD_DELAY_MAX_MS, max(FD_DELAY_MIN_MS, fd_trigger_delay_ms)))
+    agave_mode = (agave_mode or "sequential").lower()
+    if rc_kind == "FD":
+        if mode not in ("sequential", "armed", "bg"):
+            raise RuntimeError(f"[FD] unknown fd_mode='{fd_mode}' (use sequential|armed|bg|auto)")
+        trigger = mode
+    else:
+        if agave_mode not in AGAVE_MODES:
+            raise RuntimeError(f"[AGAVE] unknown agave_mode='{agave_mode}' (use {'|'.join(AGAVE_MODES)})")
+        trigger = agave_mode
+    # FD armed/bg fire on a timer after MAIN spawn; everything else waits for MAIN's event
+    timed = rc_kind == "FD" and trigger in ("armed", "bg")
+    label = "FD" if rc_kind == "FD" else "AGAVE"
+    # SECONDARY may take the key before MAIN's set-identity has exited: if MAIN then fails, one of the
+    # two has to be moved off it again
+    demote_cmd = None
+    if timed or main_early_pattern:
+        demote_cmd = _build_remote_set_identity_cmd_no_shell(
+            remote_client=remote_client,
+            secondary_cfg=secondary_cfg,
+            remote_ledger=remote_ledger,
+            new_key_path_str=(remote_unstaked_identity or REMOTE_UNSTAKED_IDENTITY),
+        )
+
+    # ---- estimates (cached RTT / recorded MAIN timings; no extra probes unless nothing is known)
+    rtt = baseline_rtt_ms(secondary_cfg)
+    hist = [
+        float(h["main_ms"])
+        for h in (state_get("swap_timings", host_key(secondary_cfg), []) or [])
+        if h.get("main_client") == (main_client or "").upper() and h.get("main_ms") is not None
+    ]
+    main_est = statistics.median(hist) if hist else MAIN_SET_IDENTITY_EST_MS
+    main_timeout = main_timeout_s if main_timeout_s is not None else (10 if (main_client or "").upper() == "FD" else 6)
+
+    # ---- steps
+    cli_st = remote_stat(secondary_cfg, remote_set_identity_paths(remote_client)[0], max_age_s=60)
+    if not cli_st.executable:
+        raise RuntimeError(f"[SECONDARY] set-identity CLI not executable: {cli_st.realpath}; swap not started")
+    led_dir = remote_expand_path(secondary_cfg, str(remote_ledger))
+    led_q = shlex.quote(led_dir)
+    pk_q = shlex.quote(current_voting_pubkey)
+    tower_name = f"tower-1_9-{current_voting_pubkey}.bin"
+    local_tower = Path(main_ledger) / tower_name
+    if main_cfg is not None:
+        main_led = remote_expand_path(main_cfg, str(main_ledger))
+        tower_src = f"{main_led}/{tower_name}"
+        has_tower = remote_stat(main_cfg, tower_src).exists
+    else:
+        tower_src = str(local_tower)
+        has_tower = local_tower.exists()
+    clear_towers = f'rm -f {led_q}/tower*-{pk_q}.bin || true; echo OK'
+    remote_tower = f"{led_dir}/{tower_name}"
+    if tower_trigger and main_cfg is not None:
+        print("[CONTROLLER] tower-write trigger watches MAIN's ledger locally: skipped")
+        tower_trigger = False
+    if tower_trigger and not has_tower:
+        print(f"[TOWER] {local_tower} not found: tower-write trigger skipped")
+        tower_trigger = False
+    status_file = f"/tmp/updater_swap.{time.time_ns()}.status"
+    steps: list[Step] = []
+
+    def _open_session(ctx: dict) -> None:
+        ctx["sess"] = SSHSession(secondary_cfg, verbose=verbose)
+
+    def _scp_tower(ctx: dict) -> None:
+        try:
+            res = copy_file(main_cfg, tower_src, secondary_cfg, f"{led_dir}/{tower_name}",
+                            timeout=ctx["budget"].cap(10.0))
+            ctx["tower_scp_rc"] = res.returncode
+        except Exception as e:
+            ctx["tower_scp_rc"] = None
+            if verbose:
+                print(f"[VERBOSE] tower sync skipped: {e}")
+
+    def _stage_rollback(ctx: dict) -> None:
+        ctx["rollback"] = None
+        if auto_rollback and local_validator_key is not None:
+            ctx["rollback"] = MainRollback(main_client, main_ledger, local_validator_key, timeout_s=main_timeout_s,
+                                           main_cfg=main_cfg)
+
+    def _prefork_main(ctx: dict) -> None:
+        ctx["zygote"] = Zygote()
+
+    if main_cfg is not None:
+        main_cmd_sh = _build_remote_set_identity_cmd_no_shell(
+            main_client, main_cfg, main_ledger, str(local_unstaked_identity), role="MAIN")
+        main_cmd = shlex.split(main_cmd_sh)
+        main_warm = cmd_paths(main_cmd) + (
+            [remote_expand_path(main_cfg, str(local_validator_key))] if local_validator_key else [])
+        main_warm_sh = prewarm_remote_cmd(main_warm,
+                                          version_argv(main_client, main_cmd[0]) if prewarm_exec else None)
+    else:
+        main_cmd = build_local_set_identity_cmd(main_client, main_ledger, local_unstaked_identity)
+        main_warm = cmd_paths(main_cmd) + ([str(Path(local_validator_key).expanduser())] if local_validator_key else [])
+    remote_argv = shlex.split(remote_cmd)
+    remote_warm_sh = prewarm_remote_cmd(cmd_paths(remote_argv),
+                                        version_argv(rc_kind, remote_argv[0]) if prewarm_exec else None)
+
+    def _prewarm_main(ctx: dict) -> None:
+        if main_cfg is not None:
+            res = run_remote(main_cfg, main_warm_sh, timeout=ctx["budget"].cap(30.0), login_shell=False)
+            ctx["prewarm_main"] = parse_prewarm(res.stdout or "")
+            return
+        ctx["prewarm_main"] = prewarm_local(main_warm, version_argv(main_client, main_cmd[0]) if prewarm_exec else None)
+
+    def _rtt_gate(ctx: dict) -> None:
+        ctx["rtt_gate"] = live_rtt_gate(ctx["sess"], secondary_cfg, factor=rtt_gate_factor,
+                                        wait_s=ctx["budget"].cap(rtt_gate_wait_s, reserve_ms=crit_est),
+                                        rebaseline=rtt_gate_rebaseline, verbose=verbose)
+
+    def _tower_watch(ctx: dict) -> None:
+        ctx["tower_watch"] = TowerWatch(local_tower)
+
+    def _tower_gate(ctx: dict) -> None:
+        watch = ctx["tower_watch"]
+        wait_s = ctx["budget"].cap(tower_trigger_wait_s, reserve_ms=crit_est)
+        wait_ms = cassette_call("tower_wait", {"path": str(local_tower)}, lambda: watch.wait(wait_s))
+        if wait_ms is None:
+            raise RuntimeError(f"[TOWER] no tower write on MAIN within {wait_s:g}s (not voting?); swap not started")
+        ctx["tower_vote_t"] = time.perf_counter()
+        ctx["tower_wait_ms"] = wait_ms
+
+    def _tower_sync(ctx: dict) -> str:
+        """Fresh tower for the SECONDARY trigger ('' without --tower-trigger); stamps the fire time."""
+        if not tower_trigger:
+            return ""
+        payload = tower_payload(local_tower)
+        ctx["tower_fire_t"] = time.perf_counter()
+        ctx["tower_bytes"] = len(payload) * 3 // 4 - payload.count("=")
+        return payload
+
+    def _arm_main(ctx: dict) -> None:
+        ctx["main_arm"] = arm_remote_set_identity(main_cfg, main_cmd_sh, merge_output=True)
+
+    def _vote_account_before(ctx: dict) -> None:
+        try:
+            ctx["va_before"] = vote_account_snapshot(current_voting_pubkey)
+        except RuntimeError as e:
+            print(f"[VOTE ACCOUNT] snapshot failed, accounting skipped: {e}")
+            return
+        ctx["va_ref_done"] = threading.Event()
+
+    def _vote_account_ref(ctx: dict) -> None:
+        # MAIN's reader thread, right after its set-identity exited: votes past this slot are not MAIN's
+        try:
+            ctx["va_ref"] = {"slot": current_slot(), "ts": time.time()}
+        except RuntimeError as e:
+            print(f"[VOTE ACCOUNT] slot at MAIN's unstake unavailable, accounting skipped: {e}")
+        finally:
+            ctx["va_ref_done"].set()
+
+    def _arm(ctx: dict) -> None:
+        ctx["arm_proc"] = arm_remote_set_identity(secondary_cfg, remote_cmd, report_pid=True,
+                                                  tower_dest=(remote_tower if tower_trigger else None))
+
+    def _bg_trigger(ctx: dict) -> None:
+        _trigger_remote_bg(secondary_cfg, remote_cmd, status_file=status_file,
+                           timeout_s=ctx["budget"].cap(REMOTE_ACK_TIMEOUT_S),
+                           pre_sh=tower_write_sh(remote_tower, _tower_sync(ctx)))
+        print(f"SWAP ({label} bg): triggered")
+
+    def _stage_bg(ctx: dict) -> None:
+        ctx["bg_go"] = stage_remote_bg(secondary_cfg, remote_cmd, status_file,
+                                       timeout_s=ctx["budget"].cap(REMOTE_ACK_TIMEOUT_S),
+                                       tower_dest=(remote_tower if tower_trigger else None))
+        ctx["bg_release"] = f' >{shlex.quote(ctx["bg_go"])}'    # built up front, like exec_line
+
+    def _release_bg(ctx: dict) -> None:
+        ctx["fired"] = True
+        ctx["sess"].run("echo " + _tower_sync(ctx) + ctx["bg_release"], wait_output=False)
+        print(f"SWAP ({label} bg): triggered")
+
+    def _main_spawn(ctx: dict) -> None:
+        if rtt_gate or tower_trigger:
+            # the gates ran after the pre-trigger check: last point where MAIN is still untouched
+            ctx["budget"].check("MAIN set-identity", need_ms=crit_est)
+        on_exit = (lambda: _vote_account_ref(ctx)) if "va_ref_done" in ctx else None
+        main_timeout_s = ctx["budget"].cap(main_timeout, floor_s=BUDGET_MAIN_FLOOR_S)
+        if main_cfg is not None:
+            ctx["main_fired"] = True
+            ctx["main"] = MainSetIdentity(main_cmd, main_timeout_s,
+                                          early_pattern=(None if timed else main_early_pattern),
+                                          verbose=verbose, armed=ctx["main_arm"], on_exit=on_exit)
+        else:
+            ctx["main"] = _spawn_set_identity_main_async(
+                main_client, main_ledger, local_unstaked_identity,
+                timeout_s=main_timeout_s, early_pattern=(None if timed else main_early_pattern),
+                zygote=ctx.get("zygote"), verbose=verbose, on_exit=on_exit,
+            )
+        if timed:
+            if fd_trigger_delay_ms > 0:
+                time.sleep(fd_trigger_delay_ms / 1000.0)
+            return
+        try:
+            signal = ctx["main"].wait_ready()
+        except TimeoutError:
+            _abort_main_timeout(ctx["main"], ctx["rollback"], verbose)
+            raise
+        if verbose:
+            print(f"[VERBOSE] SECONDARY ({label}) fires on MAIN {signal} (+{ctx['main'].since_spawn_ms():.1f}ms)")
+
+    exec_line = f'exec {remote_cmd}'    # built up front: no formatting inside the critical section
+
+    def _exec_session(ctx: dict) -> None:
+        ctx["fired"] = True
+        ctx["sess"].run(tower_write_sh(remote_tower, _tower_sync(ctx)) + exec_line, wait_output=False)
+
+    def _fire(ctx: dict) -> None:
+        ctx["fired"] = True
+        _fire_armed(ctx["arm_proc"], _tower_sync(ctx))
+
+    def _ack(ctx: dict) -> None:
+        # out of budget: cut the wait short, an unconfirmed SECONDARY goes to the rollback logic
+        ack_s = ctx["budget"].cap(REMOTE_ACK_TIMEOUT_S, floor_s=BUDGET_ACK_FLOOR_S)
+        if trigger == "sequential":
+            # the session shell was replaced by set-identity: its exit status is the confirmation
+            ctx["remote"] = ctx["sess"].wait_exit(ack_s)
+        elif trigger == "armed":
+            ctx["remote"] = _armed_ack(ctx["arm_proc"], ack_s)
+        else:
+            ctx["remote"] = _remote_bg_ack(secondary_cfg, status_file, ack_s)
+
+    def _stop_remote(ctx: dict) -> str:
+        """No ack: kill SECONDARY's set-identity on SECONDARY, then drop our channel to it."""
+        timeout_s = REMOTE_ACK_TIMEOUT_S    # not cut by the budget: MAIN stays unstaked until this is known
+        try:
+            if trigger == "sequential":
+                return stop_remote_set_identity(secondary_cfg, ctx.get("out", {}).get("session_pid", ""),
+                                                timeout_s=timeout_s)
+            if trigger == "armed":
+                pid = next((line[len(PID_TAG):] for line in ctx["remote"][1].splitlines()
+                            if line.startswith(PID_TAG)), "")
+                return stop_remote_set_identity(secondary_cfg, pid, timeout_s=timeout_s)
+            return stop_remote_set_identity(secondary_cfg, pid_file=f"{status_file}.pid", timeout_s=timeout_s,
+                                            cleanup=tuple(status_file + ext for ext in ("", ".log", ".tmp", ".pid")))
+        finally:
+            for proc in (ctx["sess"].p if ctx.get("sess") is not None else None, ctx.get("arm_proc")):
+                if proc is not None and proc.poll() is None:
+                    proc.kill()
+
+    def _confirm(ctx: dict) -> None:
+        remote_rc, remote_out = ctx["remote"]
+        _confirm_secondary(label, remote_rc, remote_out, ctx["main"], ctx["rollback"], verbose,
+                           secondary_cfg=secondary_cfg, voting_pubkey=current_voting_pubkey,
+                           stop_remote=lambda: _stop_remote(ctx))
+        try:
+            main_ms = ctx["main"].finish(f"after SECONDARY ({label}) trigger")
+        except (TimeoutError, RuntimeError) as e:
+            if demote_cmd is None:
+                raise
+            # not cut by the budget: the swap is only over once a single node holds the key
+            _settle_main_after_fire(
+                label, e, ctx["main"], voting_pubkey=current_voting_pubkey, main_cfg=main_cfg,
+                retry_main=lambda: _run_main_set_identity(main_cmd, main_timeout, "on retry", verbose,
+                                                          main_cfg=main_cfg,
+                                                          remote_cmd=(main_cmd_sh if main_cfg else None)),
+                demote_secondary=lambda: run_remote(secondary_cfg, demote_cmd, timeout=REMOTE_ACK_TIMEOUT_S,
+                                                    login_shell=False),
+                verbose=verbose,
+            )
+            if "va_ref_done" in ctx:
+                ctx["va_ref_done"].set()    # no clean exit of MAIN's set-identity: no reference slot
+            return
+        record_swap_timing(secondary_cfg, main_client=main_client, remote_client=remote_client,
+                           mode=trigger, main_ms=main_ms)
+
+    # pre-trigger: nothing here changes who votes
+    steps.append(Step("stage_rollback", PRE, "MAIN", run=_stage_rollback, note="MAIN -> validator key on failure"))
+    # staged bg is released over the session instead of a fresh SSH exec
+    staged_bg = trigger == "bg" and not timed
+    if trigger == "sequential" or staged_bg or rtt_gate:
+        steps.append(Step("open_session", PRE, "SECONDARY", run=_open_session,
+                          note="pipelined with the first exchange" + ("; RTT gate" if rtt_gate else "")))
+    if trigger == "sequential":
+        # the session shell's PID survives the exec: an unacknowledged set-identity can be killed by it
+        steps.append(Step("session_pid", PRE, "SECONDARY", shell="echo $$", est_ms=rtt))
+    if prewarm:
+        # fused with the tower exchange below: no extra round trip
+        steps.append(Step("prewarm_secondary", PRE, "SECONDARY", shell=remote_warm_sh, est_ms=rtt,
+                          note="binary, libs, keys -> page cache"))
+    if has_tower:
+        steps.append(Step("tower_clear", PRE, "SECONDARY", shell=clear_towers, est_ms=rtt))
+        steps.append(Step("tower_copy", PRE, "SECONDARY", run=_scp_tower, round_trip=True, est_ms=2 * rtt,
+                          note=f"scp {tower_name}" + (" (MAIN -> SECONDARY)" if main_cfg is not None else "")))
+        steps.append(Step("tower_check", PRE, "SECONDARY",
+                          shell=remote_stat_cmd([f"{led_dir}/{tower_name}"]), est_ms=rtt))
+    elif cleanup_remote_tower:
+        steps.append(Step("tower_clear", PRE, "SECONDARY", shell=clear_towers, est_ms=rtt))
+    if prewarm:
+        steps.append(Step("prewarm_main", PRE, "MAIN", run=_prewarm_main, note="binary, libs, keys -> page cache"))
+    if main_cfg is not None:
+        steps.append(Step("arm_main", PRE, "MAIN", run=_arm_main, note="session waits for ENTER over SSH"))
+    elif spawn_default() == "zygote":
+        steps.append(Step("prefork_main", PRE, "MAIN", run=_prefork_main, note="set-identity execs from a ready shell"))
+    if trigger == "armed":
+        steps.append(Step("arm_secondary", PRE, "SECONDARY", run=_arm, note="async, overlaps MAIN spawn"))
+    elif staged_bg:
+        steps.append(Step("stage_secondary_bg", PRE, "SECONDARY", run=_stage_bg, round_trip=True, est_ms=rtt,
+                          note="detached set-identity waits on a FIFO"))
+    if tower_trigger:
+        steps.append(Step("tower_watch", PRE, "MAIN", run=_tower_watch, note=f"watch {tower_name}"))
+
+    if main_cfg is not None and vote_account_check:
+        # getVoteAccounts / getSlot go to MAIN's local RPC (vote-gap reads MAIN's log over SSH instead)
+        print("[CONTROLLER] vote-account check needs MAIN's local RPC: skipped")
+        vote_account_check = False
+    if vote_account_check:
+        steps.append(Step("vote_account_snapshot", PRE, "MAIN", run=_vote_account_before,
+                          note="lastVote/credits via getVoteAccounts"))
+
+    # critical path: MAIN unstakes, SECONDARY takes the identity
+    if rtt_gate:
+        steps.append(Step("rtt_gate", CRITICAL, "SECONDARY", run=_rtt_gate,
+                          note=f"{RTT_GATE_PINGS} pings over the open session, ≤{rtt_gate_factor:g}× baseline "
+                               f"(hold ≤{rtt_gate_wait_s:g}s), before MAIN is touched"))
+    if tower_trigger:
+        steps.append(Step("tower_gate", CRITICAL, "MAIN", run=_tower_gate,
+                          note=f"hold until MAIN's next vote (tower write, ≤{tower_trigger_wait_s:g}s)"))
+    if trigger == "bg" and timed:
+        steps.append(Step("secondary_bg_trigger", CRITICAL, "SECONDARY", run=_bg_trigger, round_trip=True,
+                          est_ms=rtt, note="fired before MAIN"))
+    main_note = f"then {fd_trigger_delay_ms} ms timer" if timed else (
+        f"gate: /{main_early_pattern}/ or exit" if main_early_pattern else "gate: successful exit")
+    if main_cfg is not None:
+        main_note = f"ENTER to armed session, {main_note}"
+    steps.append(Step("main_set_identity", CRITICAL, "MAIN", run=_main_spawn,
+                      est_ms=(fd_trigger_delay_ms if timed else main_est), note=main_note))
+    if trigger == "sequential":
+        steps.append(Step("secondary_exec", CRITICAL, "SECONDARY", run=_exec_session,
+                          est_ms=rtt / 2 + REMOTE_SET_IDENTITY_EST_MS, note="exec over open session"))
+    elif trigger == "armed":
+        steps.append(Step("secondary_fire", CRITICAL, "SECONDARY", run=_fire,
+                          est_ms=rtt / 2 + REMOTE_SET_IDENTITY_EST_MS, note="ENTER to armed session"))
+    elif staged_bg:
+        steps.append(Step("secondary_bg_release", CRITICAL, "SECONDARY", run=_release_bg,
+                          est_ms=rtt / 2 + REMOTE_SET_IDENTITY_EST_MS, note="line to the staged FIFO over open session"))
+
+    # post-trigger: confirmation and (if needed) rollback
+    steps.append(Step("secondary_ack", POST, "SECONDARY", run=_ack, round_trip=(trigger == "bg"),
+                      est_ms=(rtt if trigger == "bg" else 0.0)))
+    steps.append(Step("confirm_or_rollback", POST, "MAIN", run=_confirm))
+    steps = fuse_steps(steps)
+    crit_est = sum(st.est_ms for st in steps if st.phase == CRITICAL)
+
+    # /proc/stat sampling for the CPU pin happens here, not after ENTER
+    jitter_pick = pick_cpu(low_jitter_cpu) if low_jitter else None
+
     print("\n[PLAN] Swap will be executed with parameters:")
+    if main_cfg is not None:
+        print(f"       • Controller:                MAIN via {main_cfg.user}@{main_cfg.host}, "
+              f"SECONDARY via {secondary_cfg.user}@{secondary_cfg.host}")
     print(f"       • MAIN client:               {main_client}")
     print(f"       • SECONDARY client:          {remote_client}")
     print(f"       • Voting PUBKEY:             {current_voting_pubkey}")
     print(f"       • MAIN ledger:               {main_ledger}")
     print(f"       • SECONDARY ledger:          {remote_ledger}")
     print(f"       • MAIN -> set-identity:      {local_unstaked_identity}  (unstaked)")
-    print(f"       • SECONDARY -> set-identity: {remote_validator_key}  (validator)\n")
-    if verbose:
-        print("[VERBOSE] FD mode:", fd_mode)
+    print(f"       • SECONDARY -> set-identity: {remote_validator_key}  (validator)")
+    if slot_lag:
+        print(f"       • Slot lag (preflight):      {slot_lag['lag']}  "
+              f"(MAIN {slot_lag['main_slot']} / SECONDARY {slot_lag['remote_slot']})")
+    if rc_kind == "FD":
+        print(f"       • FD mode:                   {mode}" + (f"  (auto: {mode_reason})" if mode_reason else ""))
+        if mode != "sequential":
+            print(f"       • FD trigger delay:          {fd_trigger_delay_ms} ms")
+    else:
+        print(f"       • AGAVE mode:                {agave_mode}")
+    print("       • Rollback on failure:       "
+          + (f"MAIN -> set-identity {local_validator_key}" if auto_rollback and local_validator_key else "disabled"))
+    if demote_cmd is not None:
+        print(f"       • MAIN fails after trigger:  retry unstake, else SECONDARY -> set-identity "
+              f"{remote_unstaked_identity or REMOTE_UNSTAKED_IDENTITY}")
+    print(f"       • SSH RTT (baseline):        {rtt:.1f} ms")
+    if rtt_gate:
+        if rtt_gate_rebaseline:
+            gate_base, gate_src = None, "rebaseline: history dropped"
+        else:
+            gate_base, gate_src = rtt_gate_baseline(secondary_cfg)
+        print(f"       • RTT gate:                  ≤{rtt_gate_factor:g}× baseline "
+              + (f"({gate_base:.1f} ms)" if gate_base is not None else f"({gate_src}: this gate records only)")
+              + f" right before the trigger, hold ≤{rtt_gate_wait_s:g}s")
+    if tower_trigger:
+        print(f"       • Tower trigger:             next write of {tower_name} on MAIN, "
+              f"fresh tower shipped with the SECONDARY trigger")
+    if budget_s is not None:
+        print(f"       • Swap budget:               {budget_s:g} s (abort before trigger if the critical path "
+              f"≈{crit_est:.0f} ms no longer fits)")
+    if low_jitter:
+        pin = f"cpu {jitter_pick[0]}" if jitter_pick[0] is not None else f"no cpu pin ({jitter_pick[1]})"
+        print(f"       • Low-jitter:                gc off, {pin}, "
+              f"{'SCHED_FIFO' if low_jitter_rt else 'nice'}, mlock (best effort), from the critical steps on")
+    print_plan(steps)
+    print()
+    if low_jitter and low_jitter_report:
+        # a few hundred ms of rehearsal: before the prompt and the budget, never inside the swap
+        base = rehearse()
+        trial = enter_low_jitter(low_jitter_cpu, low_jitter_rt, cpu_pick=jitter_pick)
+        try:
+            tuned = rehearse()
+        finally:
+            exit_low_jitter(trial)
+        print(f"[JITTER] trigger gate wake-up, default:    {format_rehearsal(base)}")
+        print(f"[JITTER] trigger gate wake-up, low-jitter: {format_rehearsal(tuned)}")
+    if plan_only:
+        print("[PLAN] dry run: nothing executed.")
+        return None
     if not assume_yes:
         try:
             input("Press ENTER to continue. Ctrl+C to cancel… ")
         except KeyboardInterrupt:
             print("Cancelled by user.")
-            return
-
-    rc_kind = (remote_client or "").upper()
+            return None
 
-    if rc_kind == "FD":
-        mode = fd_mode.lower()
-
-        if mode == "bg":
-            if cleanup_remote_tower and not copied_tower:
-                dir_q = shlex.quote(str(remote_ledger))
-                pk_q = shlex.quote(current_voting_pubkey)
-                if verbose:
-                    print(f"[VERBOSE] SECONDARY (FD) tower cleanup: rm -f \"{dir_q}\"/tower*-\"{pk_q}\".bin")
-                run_remote(
-                    secondary_cfg,
-                    f'dir={dir_q}; pk={pk_q}; rm -f "$dir"/tower*-"$pk".bin || true; echo OK',
-                    login_shell=False
-                )
-            if verbose:
-                print(f"[VERBOSE] SECONDARY (FD) bg trigger: {remote_cmd}")
-            _trigger_remote_bg(secondary_cfg, remote_cmd)
-            p = _spawn_set_identity_main_async(main_client, main_ledger, local_unstaked_identity)
-            if verbose:
-                print(f"[VERBOSE] MAIN set-identity: {build_local_set_identity_cmd(main_client, main_ledger, local_unstaked_identity)}")
-            if fd_trigger_delay_ms > 0:
-                time.sleep(fd_trigger_delay_ms / 1000.0)
+    budget = SwapBudget(budget_s)
+    ctx: dict = {"cfg": secondary_cfg, "fired": False, "budget": budget}
+    jitter = None
+    try:
+        _exec_steps([st for st in steps if st.phase == PRE], ctx, verbose)
+        out = ctx.get("out", {})
+        if prewarm:
+            print(f"[PREWARM] MAIN:      {format_prewarm(ctx.get('prewarm_main'))}")
+            print(f"[PREWARM] SECONDARY: {format_prewarm(parse_prewarm(out.get('prewarm_secondary', '')))}")
+        if verbose:
+            if "tower_check" in out:
+                tst = parse_remote_stat(secondary_cfg, out["tower_check"])[f"{led_dir}/{tower_name}"]
+                print(f"[VERBOSE] tower synced to SECONDARY: {tower_name} "
+                      + (f"({tst.size} bytes)" if tst.exists else "(MISSING)"))
+            if "tower_clear" in out:
+                print(f"[VERBOSE] SECONDARY tower cleanup: {out['tower_clear']}")
+        if low_jitter:
+            jitter = enter_low_jitter(low_jitter_cpu, low_jitter_rt, cpu_pick=jitter_pick)
+            print(f"[JITTER] applied: {', '.join(jitter.applied) or '-'}"
+                  + (f"; not permitted/unsupported: {', '.join(jitter.skipped)}" if jitter.skipped else ""))
+        # last point where giving up changes nothing
+        budget.check("trigger", need_ms=crit_est)
+        swap_ts = time.time()
+        _exec_steps([st for st in steps if st.phase != PRE], ctx, verbose)
+        print(f"SWAP ({label} {trigger}): ok")
+    except BudgetExceeded:
+        print("[BUDGET] swap aborted before trigger: identities unchanged")
+        raise
+    finally:
+        if budget_s is not None:
+            budget.report()
+        if ctx.get("bg_go") and not ctx["fired"]:
+            # staged but never released: tell the waiter to exit (it would time out on its own anyway)
             try:
-                p.wait(timeout=10 if (main_client or "").upper() == "FD" else 6)
+                ctx["sess"].run(f'echo CANCEL >{shlex.quote(ctx["bg_go"])}', timeout=budget.cap(5.0, floor_s=1.0))
             except Exception:
                 pass
-            print("SWAP (FD bg): triggered")
-            return
-
-        sess = SSHSession(secondary_cfg)
-        try:
-            if cleanup_remote_tower and not copied_tower:
-                dir_q = shlex.quote(str(remote_ledger))
-                pk_q = shlex.quote(current_voting_pubkey)
-                if verbose:
-                    print(f"[VERBOSE] SECONDARY tower cleanup: rm -f \"{dir_q}\"/tower*-\"{pk_q}\".bin")
-                sess.run(f'dir={dir_q}; pk={pk_q}; rm -f "$dir"/tower*-"$pk".bin || true; echo "TOWER_OK"')
-
-            if mode == "sequential":
-                p = _spawn_set_identity_main_async(main_client, main_ledger, local_unstaked_identity)
-                if verbose:
-                    print(f"[VERBOSE] MAIN set-identity: {build_local_set_identity_cmd(main_client, main_ledger, local_unstaked_identity)}")
-                if (main_client or "").upper() == "FD":
-                    try:
-                        p.wait(timeout=10)
-                    except Exception:
-                        pass
-                if verbose:
-                    print(f"[VERBOSE] SECONDARY exec: {remote_cmd}")
-                sess.run(f'exec {remote_cmd}', wait_output=False)
-                if verbose:
-                    print("[VERBOSE] SECONDARY (FD) wait completion (<=1s)…")
-                wait_cmd = (
-                    "for i in $(seq 1 10); do "
-                    "pgrep -af 'fdctl.*set-identity' >/dev/null 2>&1 || { echo DONE; exit 0; }; "
-                    "sleep 0.1; "
-                    "done; echo TIMEOUT"
-                )
+        if ctx.get("sess") is not None:
+            ctx["sess"].close()
+        if ctx.get("zygote") is not None:
+            ctx["zygote"].close()
+        if ctx.get("tower_watch") is not None:
+            ctx["tower_watch"].close()
+        arm_proc = ctx.get("arm_proc")
+        # never fired (error before trigger): drop the armed sessions, EOF makes them a no-op
+        for proc, fired in ((arm_proc, ctx["fired"]), (ctx.get("main_arm"), ctx.get("main_fired"))):
+            if proc and not fired and proc.poll() is None:
                 try:
-                    res_wait = run_remote(secondary_cfg, wait_cmd)
-                    if verbose:
-                        print(f"[VERBOSE] SECONDARY (FD) wait status: {(res_wait.stdout or '').strip()}")
+                    proc.stdin.close()
                 except Exception:
                     pass
-                print("SWAP (FD sequential): ok")
-                return
-
-            if mode == "armed":
-                if cleanup_remote_tower:
-                    dir_q = shlex.quote(str(remote_ledger))
-                    pk_q = shlex.quote(current_voting_pubkey)
-                    if verbose:
-                        print(f"[VERBOSE] SECONDARY tower cleanup: rm -f \"{dir_q}\"/tower*-\"{pk_q}\".bin")
-                    run_remote(
-                        secondary_cfg,
-                        f'dir={dir_q}; pk={pk_q}; rm -f "$dir"/tower*-"$pk".bin || true; echo OK',
-                        login_shell=False
-                    )
-
-                arm_proc = arm_remote_set_identity(secondary_cfg, remote_cmd)
-                try:
-                    p = _spawn_set_identity_main_async(main_client, main_ledger, local_unstaked_identity)
-                    if verbose:
-                        print(f"[VERBOSE] MAIN set-identity: {build_local_set_identity_cmd(main_client, main_ledger, local_unstaked_identity)}")
-                    if fd_trigger_delay_ms > 0:
-                        time.sleep(fd_trigger_delay_ms / 1000.0)
-
-                    if arm_proc and arm_proc.poll() is None and arm_proc.stdin:
-                        try:
-                            arm_proc.stdin.write("\n")
-                            arm_proc.stdin.flush()
-                        except BrokenPipeError:
-                            pass
-
-                    try:
-                        p.wait(timeout=10 if (main_client or "").upper() == "FD" else 6)
-                    except Exception:
-                        pass
-                    print("SWAP (FD armed-bg): ok")
-                    return
-                finally:
-                    try:
-                        if arm_proc and arm_proc.stdin:
-                            try:
-                                arm_proc.stdin.close()
-                            except Exception:
-                                pass
-                    except Exception:
-                        pass
-
-            raise RuntimeError(f"[FD] unknown fd_mode='{fd_mode}' (use sequential|armed|bg)")
+                proc.terminate()
+        if jitter is not None:
+            exit_low_jitter(jitter)
 
-        finally:
-            sess.close()
+    profile_phase("post-swap")
+    if budget_s is not None:
+        annotate_swap_timing(secondary_cfg, budget=budget.summary())
+    if ctx.get("rtt_gate") is not None:
+        annotate_swap_timing(secondary_cfg, rtt_gate=ctx["rtt_gate"])
+    if ctx.get("tower_vote_t") is not None:
+        vote_t = ctx["tower_vote_t"]
+        tg = {
+            "method": ctx["tower_watch"].method,
+            "wait_ms": round(ctx["tower_wait_ms"], 1),
+            "main_after_vote_ms": round((ctx["main"].t0 - vote_t) * 1000.0, 2),
+            "secondary_after_vote_ms": (round((ctx["tower_fire_t"] - vote_t) * 1000.0, 2)
+                                        if "tower_fire_t" in ctx else None),
+            "tower_bytes": ctx.get("tower_bytes"),
+        }
+        print(f"[TOWER] MAIN voted {tg['wait_ms']:.0f} ms into the gate ({tg['method']}); "
+              f"MAIN set-identity +{tg['main_after_vote_ms']:.1f} ms, SECONDARY trigger "
+              + (f"+{tg['secondary_after_vote_ms']:.1f} ms" if tg["secondary_after_vote_ms"] is not None else "n/a")
+              + f" after the vote ({tg['tower_bytes']} tower bytes shipped with it)")
+        annotate_swap_timing(secondary_cfg, tower_trigger=tg)
+    if ctx.get("va_before") and ctx["va_ref_done"].wait(10.0) and ctx.get("va_ref"):
+        va = wait_votes_resumed(current_voting_pubkey, ctx["va_before"], ctx["va_ref"], wait_s=vote_account_wait_s,
+                                verbose=verbose)
+        if va is not None:
+            annotate_swap_timing(secondary_cfg, vote_account=va)
+    if vote_gap:
+        gap = measure_vote_gap(secondary_cfg, swap_ts, wait_s=vote_gap_wait_s, verbose=verbose, main_cfg=main_cfg)
+        if gap is not None:
+            annotate_swap_timing(secondary_cfg, vote_gap=gap)
+    if metrics_out:
+        export_swap_record(secondary_cfg, Path(metrics_out))
 
-    sess = SSHSession(secondary_cfg)
-    try:
-        if cleanup_remote_tower and not copied_tower:
-            dir_q = shlex.quote(str(remote_ledger))
-            pk_q = shlex.quote(current_voting_pubkey)
-            if verbose:
-                print(f"[VERBOSE] SECONDARY (AGAVE) tower cleanup: rm -f \"{dir_q}\"/tower*-\"{pk_q}\".bin")
-            out, _ = sess.run(f'dir={dir_q}; pk={pk_q}; rm -f "$dir"/tower*-"$pk".bin || true; echo "TOWER_OK"')
-            if verbose and out:
-                print(f"[VERBOSE] SECONDARY (AGAVE) tower result: {out.strip()}")
+    return SwapLeg(
+        main_client=main_client,
+        remote_client=remote_client,
+        voting_pubkey=current_voting_pubkey,
+        main_ledger=main_ledger,
+        remote_ledger=remote_ledger,
+        local_unstaked_identity=local_unstaked_identity,
+        local_validator_key=local_validator_key,
+        remote_validator_key=remote_validator_key,
+        secondary_cfg=secondary_cfg,
+    )
+
+
+# -------------------------------- SWAP BACK --------------------------------
+
+def perform_swap_back(
+        leg: SwapLeg,
+        *,
+        remote_unstaked_identity: str,
+        main_client: str | None = None,
+        main_timeout_s: float | None = None,
+        auto_rollback: bool = True,
+        budget_s: float | None = None,
+        prewarm: bool = True,
+        assume_yes: bool = False,
+        verbose: bool = False,
+) -> None:
+    """
+    Reverse a completed swap: SECONDARY -> unstaked identity, then MAIN -> validator key, on the same
+    planner as perform_swap (session, prewarm and MAIN pre-fork before the trigger, fused exchanges).
+    The trigger is always the exec over the open session: SECONDARY must be confirmed off the validator
+    key before MAIN may take it, so there is nothing for armed/bg to overlap.
+    The tower is pulled from SECONDARY after it stopped voting, so MAIN resumes from its latest state.
+    If the tower cannot be pulled or MAIN fails to take the identity (or the budget runs out),
+    SECONDARY is switched back to the validator key.
+    """
+    cfg = leg.secondary_cfg
+    main_client = main_client or leg.main_client
+    if leg.local_validator_key is None:
+        raise RuntimeError("[SWAP BACK] MAIN validator key unknown")
+
+    remote_unstake = _build_remote_set_identity_cmd_no_shell(
+        remote_client=leg.remote_client,
+        secondary_cfg=cfg,
+        remote_ledger=leg.remote_ledger,
+        new_key_path_str=remote_unstaked_identity,
+    )
+    remote_restore = _build_remote_set_identity_cmd_no_shell(
+        remote_client=leg.remote_client,
+        secondary_cfg=cfg,
+        remote_ledger=leg.remote_ledger,
+        new_key_path_str=leg.remote_validator_key,
+    )
+    main_cmd = build_local_set_identity_cmd(main_client, leg.main_ledger, leg.local_validator_key)
+    if main_timeout_s is None:
+        main_timeout_s = 10 if (main_client or "").upper() == "FD" else 6
+    rtt = baseline_rtt_ms(cfg)
+    hist = [
+        float(h["main_ms"])
+        for h in (state_get("swap_timings", host_key(cfg), []) or [])
+        if h.get("main_client") == (main_client or "").upper() and h.get("main_ms") is not None
+    ]
+    main_est = statistics.median(hist) if hist else MAIN_SET_IDENTITY_EST_MS
+    tower_name = f"tower-1_9-{leg.voting_pubkey}.bin"
+    remote_argv = shlex.split(remote_unstake)
+    remote_warm_sh = prewarm_remote_cmd(cmd_paths(remote_argv) + cmd_paths(remote_restore))
+    label = leg.remote_client
+    exec_line = f'exec {remote_unstake}'
+
+    def _restore_secondary(ctx: dict, why: str) -> None:
+        if not auto_rollback:
+            print(f"[SWAP BACK] {why}; rollback disabled: neither node runs the validator identity")
+            return
+        print(f"[ROLLBACK] {why}: restoring validator identity on SECONDARY…")
+        res = run_remote(cfg, remote_restore, timeout=REMOTE_ACK_TIMEOUT_S, login_shell=False)
+        print(f"[ROLLBACK] SECONDARY rc={res.returncode}; outage ≈ {(time.perf_counter() - ctx['t0']) * 1000:.0f} ms")
+
+    def _open_session(ctx: dict) -> None:
+        ctx["sess"] = SSHSession(cfg, verbose=verbose)
 
-        p = _spawn_set_identity_main_async(main_client, main_ledger, local_unstaked_identity)
+    def _prewarm_main(ctx: dict) -> None:
+        ctx["prewarm_main"] = prewarm_local(cmd_paths(main_cmd))
+
+    def _prefork_main(ctx: dict) -> None:
+        ctx["zygote"] = Zygote()
+
+    def _unstake(ctx: dict) -> None:
+        ctx["t0"] = time.perf_counter()
         if verbose:
-            print(f"[VERBOSE] MAIN set-identity: {build_local_set_identity_cmd(main_client, main_ledger, local_unstaked_identity)}")
-        try:
-            p.wait(timeout=6)
-        except Exception:
-            pass
+            print(f"[VERBOSE] SECONDARY exec: {remote_unstake}")
+        ctx["fired"] = True
+        ctx["sess"].run(exec_line, wait_output=False)
 
+    def _unstake_ack(ctx: dict) -> None:
+        remote_rc, remote_out = ctx["sess"].wait_exit(ctx["budget"].cap(REMOTE_ACK_TIMEOUT_S,
+                                                                        floor_s=BUDGET_ACK_FLOOR_S))
         if verbose:
-            print(f"[VERBOSE] SECONDARY (AGAVE) exec: {remote_cmd}")
-        res = run_remote(secondary_cfg, remote_cmd, login_shell=False)
+            print(f"[VERBOSE] SECONDARY ({label}) rc={remote_rc}")
+            if remote_out:
+                print(f"[VERBOSE] SECONDARY ({label}) output: {remote_out}")
+        if remote_rc == 0:
+            return
+        if remote_rc is not None:
+            # SECONDARY still votes: MAIN must not take the identity
+            raise RuntimeError(f"SECONDARY unstake failed (rc={remote_rc}); MAIN not touched")
+        # no acknowledgment: the unstake may still land — stop it and look at what SECONDARY runs
+        try:
+            stopped = stop_remote_set_identity(cfg, ctx["out"].get("session_pid", ""), timeout_s=REMOTE_ACK_TIMEOUT_S)
+            print(f"[SWAP BACK] SECONDARY unstake not acknowledged: stopping its set-identity… {stopped}")
+        except Exception as e:
+            print(f"[SWAP BACK] stopping SECONDARY set-identity failed: {e}")
+        try:
+            active = secondary_active_identity(cfg)
+        except Exception as e:
+            raise RuntimeError(f"[SWAP BACK] SECONDARY unstake not acknowledged and its state is unknown ({e}); "
+                               f"MAIN not touched — SECONDARY may no longer be voting, check it") from e
+        if active == leg.voting_pubkey:
+            raise RuntimeError("SECONDARY unstake not acknowledged; SECONDARY still on the validator key, MAIN not touched")
+        print(f"[SWAP BACK] SECONDARY runs {active or '?'} (unstake landed without an acknowledgment)")
+
+    def _tower_back(ctx: dict) -> None:
+        # SECONDARY is off the key: giving up here means rollback, so the copy gets at least the ack floor
+        copied = copy_tower_secondary_to_main(
+            pubkey=leg.voting_pubkey,
+            main_ledger=leg.main_ledger,
+            secondary_cfg=cfg,
+            remote_ledger=leg.remote_ledger,
+            timeout_s=ctx["budget"].cap(10.0, floor_s=BUDGET_ACK_FLOOR_S),
+        )
+        if not copied:
+            # MAIN must not vote from its pre-swap tower
+            _restore_secondary(ctx, f"tower {tower_name} not pulled from SECONDARY")
+            raise RuntimeError(f"[SWAP BACK] tower {tower_name} not copied to MAIN; MAIN not touched")
         if verbose:
-            so = (res.stdout or '').strip()
-            se = (res.stderr or '').strip()
-            print(f"[VERBOSE] SECONDARY (AGAVE) rc={res.returncode}")
-            if so:
-                print(f"[VERBOSE] SECONDARY (AGAVE) stdout: {so}")
-            if se:
-                print(f"[VERBOSE] SECONDARY (AGAVE) stderr: {se}")
-        if res.returncode != 0:
-            raise RuntimeError("SECONDARY (AGAVE) set-identity failed")
-        print("SWAP (AGAVE sequential): ok")
+            print(f"[VERBOSE] tower synced to MAIN: {tower_name}")
+
+    def _main(ctx: dict) -> None:
+        # MAIN gets at least its floor: SECONDARY is already unstaked, giving up here means rollback
+        ctx["main"] = MainSetIdentity(main_cmd, ctx["budget"].cap(main_timeout_s, floor_s=BUDGET_MAIN_FLOOR_S),
+                                      verbose=verbose, zygote=ctx.get("zygote"))
+        try:
+            ctx["main"].finish("during swap back")
+        except (RuntimeError, TimeoutError):
+            _restore_secondary(ctx, "MAIN did not take the identity")
+            raise
+
+    steps: list[Step] = [
+        Step("open_session", PRE, "SECONDARY", run=_open_session, note="pipelined with the first exchange"),
+        # the session shell's PID survives the exec: an unacknowledged unstake can be killed by it
+        Step("session_pid", PRE, "SECONDARY", shell="echo $$", est_ms=rtt),
+    ]
+    if prewarm:
+        steps.append(Step("prewarm_secondary", PRE, "SECONDARY", shell=remote_warm_sh, est_ms=rtt,
+                          note="binary, keys -> page cache"))
+        steps.append(Step("prewarm_main", PRE, "MAIN", run=_prewarm_main, note="binary, libs, keys -> page cache"))
+    if spawn_default() == "zygote":
+        steps.append(Step("prefork_main", PRE, "MAIN", run=_prefork_main, note="set-identity execs from a ready shell"))
+    steps += [
+        Step("secondary_unstake", CRITICAL, "SECONDARY", run=_unstake, est_ms=rtt / 2, note="exec over open session"),
+        Step("secondary_ack", CRITICAL, "SECONDARY", run=_unstake_ack, est_ms=REMOTE_SET_IDENTITY_EST_MS + rtt / 2,
+             note="MAIN waits until SECONDARY is off the key"),
+        Step("tower_copy", CRITICAL, "MAIN", run=_tower_back, round_trip=True, est_ms=2 * rtt,
+             note=f"scp {tower_name} (SECONDARY -> MAIN)"),
+        Step("main_set_identity", CRITICAL, "MAIN", run=_main, est_ms=main_est),
+    ]
+    steps = fuse_steps(steps)
+    crit_est = sum(st.est_ms for st in steps if st.phase == CRITICAL)
+
+    print("\n[PLAN] Swap back will be executed with parameters:")
+    print(f"       • SECONDARY client:          {leg.remote_client}")
+    print(f"       • MAIN client:               {main_client}")
+    print(f"       • Voting PUBKEY:             {leg.voting_pubkey}")
+    print(f"       • SECONDARY -> set-identity: {remote_unstaked_identity}  (unstaked)")
+    print(f"       • MAIN -> set-identity:      {leg.local_validator_key}  (validator)")
+    print("       • Rollback on failure:       "
+          + (f"SECONDARY -> set-identity {leg.remote_validator_key}" if auto_rollback else "disabled"))
+    if budget_s is not None:
+        print(f"       • Swap budget:               {budget_s:g} s")
+    print_plan(steps, path="SECONDARY unstake -> MAIN voting")
+    print()
+    if not assume_yes:
+        try:
+            input("Press ENTER to continue. Ctrl+C to cancel… ")
+        except KeyboardInterrupt:
+            print("Cancelled by user.")
+            return
+
+    budget = SwapBudget(budget_s)
+    ctx: dict = {"cfg": cfg, "fired": False, "budget": budget}
+    try:
+        _exec_steps([st for st in steps if st.phase == PRE], ctx, verbose)
+        if prewarm:
+            print(f"[PREWARM] MAIN:      {format_prewarm(ctx.get('prewarm_main'))}")
+            print(f"[PREWARM] SECONDARY: {format_prewarm(parse_prewarm(ctx.get('out', {}).get('prewarm_secondary', '')))}")
+        # last point where giving up changes nothing
+        budget.check("trigger", need_ms=crit_est)
+        _exec_steps([st for st in steps if st.phase == CRITICAL], ctx, verbose)
+    except BudgetExceeded:
+        if not ctx["fired"]:
+            print("[BUDGET] swap back aborted before trigger: identities unchanged")
+        raise
     finally:
-        sess.close()
+        if budget_s is not None:
+            budget.report()
+        if ctx.get("sess") is not None:
+            ctx["sess"].close()
+        if ctx.get("zygote") is not None:
+            ctx["zygote"].close()
+    print(f"[SWAP BACK] outage ≈ {(time.perf_counter() - ctx['t0']) * 1000:.0f} ms (SECONDARY unstake → MAIN confirmed)")
+    print("SWAP BACK: ok")
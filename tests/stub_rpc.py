@@ -0,0 +1,58 @@
+"""Shared stub JSON-RPC server for the tests: one ThreadingHTTPServer per instance on 127.0.0.1."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+class RpcError(Exception):
+    """Raised by a handler to answer with a JSON-RPC error object."""
+
+    def __init__(self, message: str, code: int = -32005):
+        super().__init__(message)
+        self.code = code
+
+
+class StubRpc:
+    """
+    handlers: method -> fn(params) returning the `result`, or raising RpcError for an `error` reply.
+    Handlers may be replaced or added after start (self.handlers is read per request).
+    """
+
+    def __init__(self, handlers: dict[str, Callable[[list], object]]):
+        self.handlers = dict(handlers)
+        self.calls: list[str] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.calls.append(req["method"])
+                fn = stub.handlers.get(req["method"])
+                try:
+                    if fn is None:
+                        raise RpcError("Method not found", -32601)
+                    resp = {"result": fn(req.get("params") or [])}
+                except RpcError as e:
+                    resp = {"error": {"code": e.code, "message": str(e)}}
+                body = json.dumps({"jsonrpc": "2.0", "id": req["id"], **resp}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,113 @@
+"""
+SwapBudget arithmetic, and perform_swap giving up before the trigger: fake set-identity CLIs,
+SECONDARY is this host via LOCAL_HOST; neither CLI may be called once the budget says no.
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import remote_config as rc  # noqa: E402
+import swap  # noqa: E402
+from swap import BudgetExceeded, SwapBudget  # noqa: E402
+from uttils import local_target  # noqa: E402
+
+PK = "Vote111111111111111111111111111111111111111"
+CLI = """#!/bin/bash
+echo "$0 $*" >> {d}/calls.log
+"""
+
+
+def spent(total_s: float | None, used_s: float) -> SwapBudget:
+    b = SwapBudget(total_s)
+    b.t0 -= used_s
+    return b
+
+
+class BudgetTest(unittest.TestCase):
+    def test_unlimited(self):
+        b = spent(None, 1000.0)
+        self.assertEqual(b.cap(30.0, reserve_ms=10 ** 6), 30.0)
+        b.check("trigger", need_ms=10 ** 6)
+
+    def test_cap_cuts_to_remaining(self):
+        b = spent(10.0, 8.0)
+        self.assertAlmostEqual(b.cap(30.0), 2.0, places=1)
+        self.assertEqual(b.cap(1.0), 1.0)
+
+    def test_cap_reserve(self):
+        b = spent(10.0, 8.0)
+        self.assertAlmostEqual(b.cap(30.0, reserve_ms=500), 1.5, places=1)
+        self.assertEqual(b.cap(30.0, reserve_ms=5000), 0.0)
+
+    def test_cap_floor(self):
+        b = spent(10.0, 20.0)
+        self.assertEqual(b.remaining(), 0.0)
+        self.assertEqual(b.cap(30.0, floor_s=swap.BUDGET_MAIN_FLOOR_S), swap.BUDGET_MAIN_FLOOR_S)
+        self.assertEqual(b.cap(0.5, floor_s=swap.BUDGET_MAIN_FLOOR_S), 0.5)    # floor never above the usual value
+        self.assertEqual(spent(10.0, 8.0).cap(30.0, floor_s=1.0, reserve_ms=5000), 1.0)
+
+    def test_check(self):
+        b = spent(10.0, 8.0)
+        b.check("step")
+        b.check("trigger", need_ms=1500)
+        with self.assertRaisesRegex(BudgetExceeded, r"before trigger, ≈2500 ms needed"):
+            b.check("trigger", need_ms=2500)
+        with self.assertRaises(BudgetExceeded):
+            spent(10.0, 20.0).check("step")
+
+
+class SwapAbortTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        d = self.d = Path(self._tmp.name)
+        for name in ("main-cli", "secondary-cli"):
+            (d / name).write_text(CLI.format(d=d))
+            (d / name).chmod(0o755)
+        for name in ("ledger", "rledger"):
+            (d / name).mkdir()
+        for name in ("validator.json", "unstaked.json"):
+            (d / name).write_text("[]")
+        for patch in (
+            mock.patch.object(swap, "AGAVE_CLI_LOCAL", d / "main-cli"),
+            mock.patch.object(rc, "REMOTE_AGAVE_CLI", str(d / "secondary-cli"), create=True),
+            mock.patch.object(rc, "STATE_CACHE_PATH", d / "state.json", create=True),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def swap(self, budget_s: float):
+        d = self.d
+        return swap.perform_swap(
+            main_client="AGAVE", remote_client="AGAVE", current_voting_pubkey=PK,
+            main_ledger=d / "ledger", local_unstaked_identity=d / "unstaked.json",
+            secondary_cfg=local_target(), remote_validator_key=str(d / "validator.json"),
+            remote_ledger=d / "rledger", local_validator_key=d / "validator.json",
+            prewarm=False, assume_yes=True, budget_s=budget_s,
+        )
+
+    def test_exhausted_in_pre(self):
+        with self.assertRaises(BudgetExceeded):
+            self.swap(0.001)
+        self.assertFalse((self.d / "calls.log").exists())
+
+    def test_critical_path_does_not_fit(self):
+        # pre-trigger steps run, then the estimate for the critical path is more than what is left
+        with mock.patch.object(swap, "REMOTE_SET_IDENTITY_EST_MS", 10 ** 7):
+            with self.assertRaisesRegex(BudgetExceeded, "before trigger"):
+                self.swap(60.0)
+        self.assertFalse((self.d / "calls.log").exists())
+
+    def test_fits(self):
+        self.assertIsNotNone(self.swap(60.0))
+        self.assertEqual(len((self.d / "calls.log").read_text().splitlines()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
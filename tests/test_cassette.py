@@ -0,0 +1,155 @@
+"""
+Record/replay: exceptions come back as their own type, and checked-in cassettes of a sequential swap and
+of a rollback replay with nothing executed. Re-record the cassettes with `python tests/test_cassette.py --record`
+(SECONDARY is this host via LOCAL_HOST; MAIN and SECONDARY CLIs are the scripts in cassettes/node/bin).
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cassette  # noqa: E402
+import remote_config as rc  # noqa: E402
+import swap  # noqa: E402
+import uttils  # noqa: E402
+from uttils import local_target, state_put  # noqa: E402
+
+CASSETTES = Path(__file__).resolve().parent / "cassettes"
+NODE = CASSETTES / "node"
+PK = "Vote111111111111111111111111111111111111111"
+SECONDARY = local_target("solana")    # fixed user: host keys in the cassettes do not depend on who runs them
+
+
+@contextmanager
+def node(mode: str, path: Path, **env):
+    """Swap environment rooted at cassettes/node with relative paths, a fresh state cache and cold caches."""
+    with ExitStack() as stack, tempfile.TemporaryDirectory() as tmp:
+        for target, name, value in (
+            (swap, "AGAVE_CLI_LOCAL", Path("bin/main-cli")),
+            (rc, "REMOTE_AGAVE_CLI", "bin/secondary-cli"),
+            (rc, "STATE_CACHE_PATH", Path(tmp) / "state.json"),
+            (rc, "REMOTE_ENV_TTL_SEC", 10 ** 10),    # the recorded env snapshot never goes stale
+        ):
+            stack.enter_context(mock.patch.object(target, name, value, create=True))
+        for cache in (uttils._REMOTE_ENV, uttils._REMOTE_EXPAND_CACHE, uttils._REMOTE_STAT_CACHE):
+            stack.enter_context(mock.patch.dict(cache, clear=True))
+        stack.enter_context(mock.patch.dict(os.environ, env))
+        cwd = os.getcwd()
+        os.chdir(NODE)
+        stack.callback(os.chdir, cwd)
+        if mode == "record":
+            state_put("remote_env", uttils.host_key(SECONDARY), {"ts": time.time(), "env": {"PATH": "/usr/bin:/bin"}})
+        cassette.set_cassette(mode, path)
+        try:
+            yield
+        finally:
+            if mode == "record":
+                cassette.save()
+            cassette.set_cassette("off", None)
+
+
+def run_swap():
+    return swap.perform_swap(
+        main_client="AGAVE", remote_client="AGAVE", current_voting_pubkey=PK,
+        main_ledger=Path("ledger"), local_unstaked_identity=Path("unstaked.json"),
+        secondary_cfg=SECONDARY, remote_validator_key="validator.json", remote_ledger=Path("rledger"),
+        local_validator_key=Path("validator.json"), prewarm=False, assume_yes=True,
+    )
+
+
+def record() -> None:
+    with node("record", CASSETTES / "swap_sequential.json"):
+        run_swap()
+    with node("record", CASSETTES / "swap_rollback.json", SECONDARY_RC="1"):
+        try:
+            run_swap()
+        except RuntimeError as e:
+            print(e)
+
+
+class ExceptionReplayTest(unittest.TestCase):
+    def roundtrip(self, exc: Exception) -> Exception:
+        def fail():
+            raise exc
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tape = Path(tmp) / "tape.json"
+            cassette.set_cassette("record", tape)
+            try:
+                with self.assertRaises(type(exc)):
+                    cassette.cassette_call("remote", {"cmd": "x"}, fail)
+                cassette.save()
+                cassette.set_cassette("replay", tape)
+                with self.assertRaises(type(exc)) as cm:
+                    cassette.cassette_call("remote", {"cmd": "x"}, lambda: self.fail("executed in replay"))
+            finally:
+                cassette.set_cassette("off", None)
+        self.assertIs(type(cm.exception), type(exc))
+        self.assertEqual(str(cm.exception), str(exc))
+        return cm.exception
+
+    def test_os_error(self):
+        e = self.roundtrip(FileNotFoundError(2, "No such file or directory", "/usr/bin/ssh"))
+        self.assertEqual((e.errno, e.filename), (2, "/usr/bin/ssh"))
+
+    def test_called_process_error(self):
+        e = self.roundtrip(subprocess.CalledProcessError(255, ["ssh", "h"], output="o", stderr="refused"))
+        self.assertEqual((e.returncode, e.cmd, e.stderr), (255, ["ssh", "h"], "refused"))
+
+    def test_timeout_expired(self):
+        self.assertEqual(self.roundtrip(subprocess.TimeoutExpired(["ssh"], 5)).timeout, 5)
+
+    def test_domain_errors(self):
+        self.roundtrip(swap.RttGateClosed("[RTT GATE] SECONDARY link degraded"))
+        self.roundtrip(swap.BudgetExceeded("[BUDGET] out"))
+        self.roundtrip(TimeoutError("[SECONDARY] command did not finish"))
+
+    def test_popen_spawn_error(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tape = Path(tmp) / "tape.json"
+            cassette.set_cassette("record", tape)
+            try:
+                with self.assertRaises(FileNotFoundError):
+                    cassette.cassette_popen("local_popen", {"cmd": ["/nonexistent"]},
+                                            lambda: subprocess.Popen(["/nonexistent"]))
+                cassette.save()
+                cassette.set_cassette("replay", tape)
+                with self.assertRaises(FileNotFoundError):
+                    cassette.cassette_popen("local_popen", {"cmd": ["/nonexistent"]}, lambda: None)
+            finally:
+                cassette.set_cassette("off", None)
+
+
+class SwapReplayTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.calls = Path(self._tmp.name) / "calls.log"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_sequential_swap(self):
+        with node("replay", CASSETTES / "swap_sequential.json", CALLS_LOG=str(self.calls)):
+            leg = run_swap()
+        self.assertEqual(leg.voting_pubkey, PK)
+        self.assertFalse(self.calls.exists())
+
+    def test_rollback(self):
+        with node("replay", CASSETTES / "swap_rollback.json", CALLS_LOG=str(self.calls)):
+            with self.assertRaisesRegex(RuntimeError, "rolled back to MAIN"):
+                run_swap()
+        self.assertFalse(self.calls.exists())
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--record"]:
+        record()
+    else:
+        unittest.main()
@@ -0,0 +1,54 @@
+"""fuse_steps: only adjacent shell steps for the same host in the same phase share an SSH exchange."""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from swap import CRITICAL, POST, PRE, STEP_TAG, Step, _split_step_output, fuse_steps  # noqa: E402
+
+
+def noop(ctx: dict) -> None:
+    pass
+
+
+class FuseStepsTest(unittest.TestCase):
+    def test_adjacent_merge(self):
+        out = fuse_steps([Step("a", PRE, "SECONDARY", shell="echo 1", est_ms=5),
+                          Step("b", PRE, "SECONDARY", shell="echo 2", est_ms=20),
+                          Step("c", PRE, "SECONDARY", shell="echo 3", est_ms=10)])
+        self.assertEqual(len(out), 1)
+        st = out[0]
+        self.assertEqual((st.name, st.parts, st.est_ms, st.round_trip), ("a+b+c", ("a", "b", "c"), 20, True))
+        self.assertEqual(st.shell, f"echo {STEP_TAG}a; echo 1; echo {STEP_TAG}b; echo 2; echo {STEP_TAG}c; echo 3")
+
+    def test_phase_target_and_run_break_fusion(self):
+        out = fuse_steps([Step("a", PRE, "SECONDARY", shell="echo 1"),
+                          Step("b", PRE, "MAIN", shell="echo 2"),
+                          Step("c", PRE, "SECONDARY", shell="echo 3"),
+                          Step("d", CRITICAL, "SECONDARY", shell="echo 4"),
+                          Step("e", CRITICAL, "SECONDARY", run=noop),
+                          Step("f", CRITICAL, "SECONDARY", shell="echo 6"),
+                          Step("g", POST, "SECONDARY", shell="echo 7")])
+        self.assertEqual([st.name for st in out], list("abcdefg"))
+        self.assertEqual([st.parts for st in out], [(n,) for n in "abcdefg"])
+        self.assertFalse(out[4].round_trip)
+        self.assertIsNone(out[4].shell)
+
+    def test_non_adjacent_same_target(self):
+        out = fuse_steps([Step("a", PRE, "SECONDARY", shell="echo 1"),
+                          Step("x", PRE, "MAIN", run=noop),
+                          Step("b", PRE, "SECONDARY", shell="echo 2"),
+                          Step("c", PRE, "SECONDARY", shell="echo 3")])
+        self.assertEqual([st.name for st in out], ["a", "x", "b+c"])
+
+    def test_split_output(self):
+        st = fuse_steps([Step("a", PRE, "SECONDARY", shell="echo 1"),
+                         Step("b", PRE, "SECONDARY", shell="echo 2")])[0]
+        out = f"{STEP_TAG}a\none\n{STEP_TAG}b\ntwo\nlines\n"
+        self.assertEqual(st.parts, ("a", "b"))
+        self.assertEqual(_split_step_output(out), {"a": "one", "b": "two\nlines"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""hedged_remote on this host (LOCAL_HOST): priority order wins over finishing order."""
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from uttils import PUBKEY_ERE, Attempt, hedged_remote, local_target  # noqa: E402
+
+PUBKEY = "7Np41oeYqPefeNQEHSv1UDhYrehxin3NStELsSKCT4K2"
+
+
+class HedgedRemoteTest(unittest.TestCase):
+    def setUp(self):
+        self.cfg = local_target()
+
+    def test_higher_priority_wins_over_faster(self):
+        attempts = [Attempt("path", "sleep 0.4; echo /usr/bin/agave-validator"),
+                    Attempt("install-dir", "echo /opt/agave/bin/agave-validator")]
+        self.assertEqual(hedged_remote(self.cfg, attempts), ("path", "/usr/bin/agave-validator"))
+
+    def test_invalid_answer_falls_through(self):
+        attempts = [Attempt("login-shell", "echo 'bash: no job control'", valid=PUBKEY_ERE),
+                    Attempt("keygen", "sleep 0.2; echo " + PUBKEY, valid=PUBKEY_ERE),
+                    Attempt("never", "echo " + PUBKEY, valid=PUBKEY_ERE)]
+        self.assertEqual(hedged_remote(self.cfg, attempts), ("keygen", PUBKEY))
+
+    def test_failed_attempt_falls_through(self):
+        attempts = [Attempt("missing", "exit 1"), Attempt("empty", "true"), Attempt("found", "echo FD")]
+        self.assertEqual(hedged_remote(self.cfg, attempts), ("found", "FD"))
+
+    def test_slower_attempts_killed(self):
+        t0 = time.monotonic()
+        attempts = [Attempt("fast", "echo AGAVE"), Attempt("slow", "sleep 10; echo FD")]
+        self.assertEqual(hedged_remote(self.cfg, attempts), ("fast", "AGAVE"))
+        self.assertLess(time.monotonic() - t0, 5.0)
+
+    def test_none_valid_returns_diagnostics(self):
+        attempts = [Attempt("a", "echo nope", valid="^[0-9]+$"), Attempt("b", "exit 3")]
+        self.assertEqual(hedged_remote(self.cfg, attempts, diag="echo diag: nothing found"),
+                         (None, "diag: nothing found"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+MAIN's unstake fails after SECONDARY already fired on the early signal: perform_swap against fake
+set-identity CLIs, SECONDARY is this host via LOCAL_HOST, MAIN's getIdentity comes from a stub RPC.
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import remote_config as rc  # noqa: E402
+import swap  # noqa: E402
+from stub_rpc import StubRpc  # noqa: E402
+from uttils import local_target  # noqa: E402
+
+PK = "Vote111111111111111111111111111111111111111"
+
+# MAIN: prints the early signal, then exits with the next code from rcs (one per call; the last one repeats)
+MAIN_CLI = """#!/bin/bash
+echo "MAIN $*" >> {d}/calls.log
+n=$(cat {d}/main.count 2>/dev/null | wc -l); echo x >> {d}/main.count
+rcs=($(cat {d}/main.rcs)); i=$(( n < ${{#rcs[@]}} ? n : ${{#rcs[@]}} - 1 ))
+echo "identity switch requested"
+sleep 0.2
+exit ${{rcs[$i]}}
+"""
+SECONDARY_CLI = """#!/bin/bash
+echo "SECONDARY $*" >> {d}/calls.log
+case "$*" in *unstaked*) exit $(cat {d}/demote.rc) ;; esac
+exit 0
+"""
+
+
+class MainFailsAfterEarlySignal(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        d = self.d = Path(self._tmp.name)
+        for name, body in (("main-cli", MAIN_CLI), ("secondary-cli", SECONDARY_CLI)):
+            (d / name).write_text(body.format(d=d))
+            (d / name).chmod(0o755)
+        for name in ("ledger", "rledger"):
+            (d / name).mkdir()
+        for name in ("validator.json", "unstaked.json", "r-unstaked.json"):
+            (d / name).write_text("[]")
+        self.main_rcs("1")
+        (d / "demote.rc").write_text("0")
+        self.main_identity = PK
+        self.rpc = StubRpc({"getIdentity": lambda params: {"identity": self.main_identity}})
+        for patch in (
+            mock.patch.object(swap, "AGAVE_CLI_LOCAL", d / "main-cli"),
+            mock.patch.object(swap, "LOCAL_RPC_URL", self.rpc.url),
+            mock.patch.object(rc, "REMOTE_AGAVE_CLI", str(d / "secondary-cli"), create=True),
+            mock.patch.object(rc, "STATE_CACHE_PATH", d / "state.json", create=True),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.rpc.close()
+        self._tmp.cleanup()
+
+    def main_rcs(self, rcs: str):
+        (self.d / "main.rcs").write_text(rcs)
+
+    def calls(self) -> list[str]:
+        return (self.d / "calls.log").read_text().splitlines()
+
+    def swap(self):
+        d = self.d
+        return swap.perform_swap(
+            main_client="AGAVE", remote_client="AGAVE", current_voting_pubkey=PK,
+            main_ledger=d / "ledger", local_unstaked_identity=d / "unstaked.json",
+            secondary_cfg=local_target(), remote_validator_key=str(d / "validator.json"),
+            remote_ledger=d / "rledger", remote_unstaked_identity=str(d / "r-unstaked.json"),
+            local_validator_key=d / "validator.json", main_early_pattern="switch requested",
+            main_timeout_s=5, prewarm=False, assume_yes=True,
+        )
+
+    def test_retry_unstakes_main(self):
+        self.main_rcs("1 0")
+        self.assertIsNotNone(self.swap())
+        calls = self.calls()
+        self.assertEqual(sum(c.startswith("MAIN") and "unstaked.json" in c for c in calls), 2)
+        self.assertFalse(any("r-unstaked" in c for c in calls))
+
+    def test_main_already_off_the_key(self):
+        self.main_identity = "Unstaked11111111111111111111111111111111111"
+        self.assertIsNotNone(self.swap())
+        self.assertEqual(sum(c.startswith("MAIN") for c in self.calls()), 1)
+
+    def test_retry_fails_secondary_demoted(self):
+        with self.assertRaisesRegex(RuntimeError, "SECONDARY set back to its unstaked identity"):
+            self.swap()
+        calls = self.calls()
+        self.assertEqual(sum(c.startswith("MAIN") for c in calls), 2)
+        self.assertTrue(calls[-1].startswith("SECONDARY") and "r-unstaked.json" in calls[-1])
+
+    def test_main_timeout_secondary_demoted(self):
+        self.main_rcs("0")
+        with mock.patch.object(swap.MainSetIdentity, "finish", side_effect=TimeoutError("MAIN timed out")):
+            with self.assertRaisesRegex(RuntimeError, "MAIN keeps the validator identity"):
+                self.swap()
+        self.assertIn("r-unstaked.json", self.calls()[-1])
+
+    def test_both_fail(self):
+        (self.d / "demote.rc").write_text("3")
+        with self.assertRaisesRegex(RuntimeError, "both nodes may hold the validator identity"):
+            self.swap()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""remote_stat_many / remote_expand_path on this host (LOCAL_HOST): awkward names, missing paths, the cache."""
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import uttils  # noqa: E402
+from uttils import local_target, remote_expand_path, remote_stat_many  # noqa: E402
+
+
+class RemoteStatTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.d = Path(self._tmp.name)
+        self.cfg = local_target()
+        for cache in (uttils._REMOTE_EXPAND_CACHE, uttils._REMOTE_STAT_CACHE):
+            patch = mock.patch.dict(cache, clear=True)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_spaces_quotes_and_missing(self):
+        names = ["with space.json", "it's \"quoted\".json", "$(touch pwned)", "dir with space"]
+        for n in names[:3]:
+            (self.d / n).write_text("key")
+        (self.d / names[3]).mkdir()
+        (self.d / "tool").write_text("#!/bin/sh\n")
+        (self.d / "tool").chmod(0o755)
+        paths = [str(self.d / n) for n in names] + [str(self.d / "tool"), str(self.d / "missing"), "/nonexistent/x y"]
+        res = remote_stat_many(self.cfg, paths)
+        self.assertEqual(list(res), paths)
+        for p in paths[:3]:
+            self.assertTrue(res[p].exists and res[p].readable, p)
+            self.assertEqual((res[p].type, res[p].size), ("file", 3))
+        self.assertEqual(res[paths[3]].type, "dir")
+        self.assertTrue(res[str(self.d / "tool")].executable)
+        self.assertFalse(res[paths[0]].executable)
+        for p in paths[-2:]:
+            self.assertFalse(res[p].exists or res[p].readable or res[p].executable)
+            self.assertIsNone(res[p].type)
+        self.assertFalse((self.d / "pwned").exists())
+        self.assertFalse(Path("pwned").exists())
+
+    def test_expansion(self):
+        (self.d / "k.json").write_text("{}")
+        with mock.patch.dict(os.environ, {"KEYDIR": str(self.d)}):
+            st = remote_stat_many(self.cfg, ["$KEYDIR/k.json"])["$KEYDIR/k.json"]
+        self.assertTrue(st.exists)
+        self.assertEqual(st.realpath, os.path.realpath(self.d / "k.json"))
+        # the stat above filled the expansion cache: no second round trip
+        with mock.patch.object(uttils, "run_remote", side_effect=AssertionError("round trip")):
+            self.assertEqual(remote_expand_path(self.cfg, "$KEYDIR/k.json"), st.realpath)
+
+    def test_cache_max_age(self):
+        p = self.d / "k.json"
+        p.write_text("{}")
+        self.assertTrue(remote_stat_many(self.cfg, [str(p)])[str(p)].exists)
+        p.unlink()
+        self.assertTrue(remote_stat_many(self.cfg, [str(p)], max_age_s=60)[str(p)].exists)
+        self.assertFalse(remote_stat_many(self.cfg, [str(p)])[str(p)].exists)
+
+    def test_duplicates_one_entry(self):
+        p = str(self.d / "missing")
+        self.assertEqual(list(remote_stat_many(self.cfg, [p, p, p])), [p])
+
+
+if __name__ == "__main__":
+    unittest.main()
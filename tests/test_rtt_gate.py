@@ -0,0 +1,92 @@
+"""live_rtt_gate over a real session to this host (LOCAL_HOST); a path change is a constant +40 ms on every ping."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import remote_config as rc  # noqa: E402
+import swap  # noqa: E402
+from uttils import host_key, local_target, state_get, state_put  # noqa: E402
+
+EXTRA_MS = 40.0
+
+
+class RttGateTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        patch = mock.patch.object(rc, "STATE_CACHE_PATH", Path(self._tmp.name) / "state.json", create=True)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.cfg = local_target()
+        self.sess = swap.SSHSession(self.cfg)
+        self.extra = 0.0
+        pings = swap.session_pings
+        patch = mock.patch.object(swap, "session_pings", lambda sess, n, t: [
+            (ts, rtt + self.extra) for ts, rtt in pings(sess, n, t)])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.sess.close()
+        self._tmp.cleanup()
+
+    def gate(self, **kw):
+        return swap.live_rtt_gate(self.sess, self.cfg, wait_s=0.3, **kw)
+
+    def age_closed(self, hours: float):
+        """Pretend the recorded closed gates are spread over the last `hours`."""
+        key = host_key(self.cfg)
+        closed = state_get("session_rtt_closed", key, [])
+        for i, g in enumerate(closed):
+            g["ts"] -= hours * 3600 * (len(closed) - 1 - i) / max(1, len(closed) - 1)
+        state_put("session_rtt_closed", key, closed)
+
+    def test_seeds_from_session_pings(self):
+        self.extra = EXTRA_MS    # nothing to compare with yet: recorded, not judged
+        for _ in range(swap.RTT_GATE_SEED):
+            self.assertEqual(self.gate()["verdict"], "seed")
+        base, _ = swap.rtt_gate_baseline(self.cfg)
+        self.assertGreaterEqual(base, EXTRA_MS)
+        self.assertEqual(self.gate()["verdict"], "pass")
+
+    def test_congestion_does_not_move_the_baseline(self):
+        for _ in range(swap.RTT_GATE_SEED):
+            self.gate()
+        base, _ = swap.rtt_gate_baseline(self.cfg)
+        self.extra = EXTRA_MS
+        for _ in range(swap.RTT_GATE_REBASE_CLOSED + 1):
+            with self.assertRaises(swap.RttGateClosed):
+                self.gate()
+        self.assertEqual(swap.rtt_gate_baseline(self.cfg)[0], base)
+        self.extra = 0.0
+        self.assertEqual(self.gate()["verdict"], "pass")
+        self.assertEqual(state_get("session_rtt_closed", host_key(self.cfg), []), [])
+
+    def test_lasting_change_rebases(self):
+        for _ in range(swap.RTT_GATE_SEED):
+            self.gate()
+        self.extra = EXTRA_MS
+        for _ in range(swap.RTT_GATE_REBASE_CLOSED - 1):
+            with self.assertRaises(swap.RttGateClosed):
+                self.gate()
+        self.age_closed(swap.RTT_GATE_REBASE_SPAN_S / 3600 + 1)
+        with self.assertRaises(swap.RttGateClosed):
+            self.gate()    # the one that completes the run still closes; the next compares with the new path
+        self.assertGreaterEqual(swap.rtt_gate_baseline(self.cfg)[0], EXTRA_MS)
+        self.assertEqual(self.gate()["verdict"], "pass")
+
+    def test_explicit_rebaseline(self):
+        for _ in range(swap.RTT_GATE_SEED):
+            self.gate()
+        self.extra = EXTRA_MS
+        with self.assertRaises(swap.RttGateClosed):
+            self.gate()
+        self.assertEqual(self.gate(rebaseline=True)["verdict"], "seed")
+        self.assertEqual(swap.rtt_gate_baseline(self.cfg)[0], None)
+
+
+if __name__ == "__main__":
+    unittest.main()
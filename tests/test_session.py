@@ -0,0 +1,63 @@
+"""SSHSession against a shell on this host (LOCAL_HOST): completion markers, deadlines, exit after exec."""
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from swap import MARKER_PREFIX, SSHSession  # noqa: E402
+from uttils import local_target  # noqa: E402
+
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        self.sess = SSHSession(local_target(), init_script=["/bin/bash", "-s"])
+
+    def tearDown(self):
+        self.sess.close()
+
+    def test_output_and_stderr(self):
+        out, err = self.sess.run("echo one; echo two >&2")
+        self.assertEqual(out, "one\n")
+        self.assertEqual(err.strip(), "two")
+
+    def test_marker_like_output(self):
+        # only this command's own marker (a fresh uuid) ends it, not a line that merely looks like one
+        fake = f"{MARKER_PREFIX}0123456789abcdef0123456789abcdef__:1"
+        out, _ = self.sess.run(f"echo {fake}; echo {MARKER_PREFIX}__:; echo after")
+        self.assertEqual(out.splitlines(), [fake, f"{MARKER_PREFIX}__:", "after"])
+        self.assertEqual(self.sess.run("echo next")[0], "next\n")
+
+    def test_output_without_newline(self):
+        self.assertEqual(self.sess.run("printf abc")[0], "abc")
+
+    def test_nonzero_rc(self):
+        with self.assertRaisesRegex(RuntimeError, "remote rc=3"):
+            self.sess.run("echo partial; (exit 3)")
+        self.assertEqual(self.sess.run("echo still-usable")[0], "still-usable\n")
+
+    def test_deadline(self):
+        t0 = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            self.sess.run("sleep 5", timeout=0.3)
+        self.assertLess(time.monotonic() - t0, 2.0)
+
+    def test_session_closed(self):
+        with self.assertRaisesRegex(RuntimeError, "session closed during command"):
+            self.sess.run("exit 7")
+
+    def test_wait_exit_after_exec(self):
+        self.sess.run("exec bash -c 'echo replaced; exit 4'", wait_output=False)
+        rc, out = self.sess.wait_exit(5.0)
+        self.assertEqual((rc, out), (4, "replaced"))
+
+    def test_wait_exit_deadline(self):
+        self.sess.run("exec sleep 5", wait_output=False)
+        t0 = time.monotonic()
+        self.assertEqual(self.sess.wait_exit(0.3), (None, ""))
+        self.assertLess(time.monotonic() - t0, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
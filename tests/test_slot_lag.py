@@ -0,0 +1,95 @@
+"""slot_lag_snapshot / wait_slot_lag against stub JSON-RPC servers (SECONDARY is this host via LOCAL_HOST)."""
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_rpc import RpcError, StubRpc  # noqa: E402
+from uttils import local_target, slot_lag_snapshot  # noqa: E402
+from verify_identity import wait_slot_lag  # noqa: E402
+
+
+class Node:
+    """getSlot / getHealth of one node, driven by .slot and .health ("ok" or the unhealthy message)."""
+
+    def __init__(self, slot: int, health: str = "ok"):
+        self.slot, self.health = slot, health
+        self.rpc = StubRpc({"getSlot": lambda params: self.slot, "getHealth": self._health})
+        self.url = self.rpc.url
+
+    def _health(self, params):
+        if self.health != "ok":
+            raise RpcError(self.health)
+        return "ok"
+
+    def close(self):
+        self.rpc.close()
+
+
+class SlotLagTest(unittest.TestCase):
+    def setUp(self):
+        self.main = Node(1000)
+        self.secondary = Node(995)
+        self.cfg = local_target()
+
+    def tearDown(self):
+        self.main.close()
+        self.secondary.close()
+
+    def test_snapshot(self):
+        snap = slot_lag_snapshot(self.main.url, self.cfg, self.secondary.url)
+        self.assertEqual(snap["main_slot"], 1000)
+        self.assertEqual(snap["remote_slot"], 995)
+        self.assertEqual(snap["lag"], 5)
+        self.assertEqual(snap["main_health"], "ok")
+        self.assertEqual(snap["remote_health"], "ok")
+
+    def test_snapshot_unhealthy_secondary(self):
+        self.secondary.health = "Node is behind by 42 slots"
+        snap = slot_lag_snapshot(self.main.url, self.cfg, self.secondary.url)
+        self.assertIn("behind by 42 slots", snap["remote_health"])
+
+    def test_within_lag(self):
+        ok, snap, reason = wait_slot_lag(self.cfg, 10, 0.0, self.main.url, self.secondary.url)
+        self.assertTrue(ok)
+        self.assertEqual(snap["lag"], 5)
+        self.assertIn("lag 5 slots", reason)
+
+    def test_too_far_behind(self):
+        ok, snap, reason = wait_slot_lag(self.cfg, 2, 0.0, self.main.url, self.secondary.url)
+        self.assertFalse(ok)
+        self.assertEqual(snap["lag"], 5)
+
+    def test_unhealthy_blocks_within_lag(self):
+        self.secondary.health = "Node is unhealthy"
+        ok, snap, reason = wait_slot_lag(self.cfg, 10, 0.0, self.main.url, self.secondary.url)
+        self.assertFalse(ok)
+        self.assertIn("Node is unhealthy", reason)
+
+    def test_waits_until_caught_up(self):
+        self.secondary.slot, self.secondary.health = 900, "Node is behind by 100 slots"
+
+        def catch_up():
+            self.secondary.slot, self.secondary.health = 998, "ok"
+
+        timer = threading.Timer(0.3, catch_up)
+        timer.start()
+        try:
+            ok, snap, _ = wait_slot_lag(self.cfg, 10, 10.0, self.main.url, self.secondary.url, poll_s=0.1)
+        finally:
+            timer.cancel()
+        self.assertTrue(ok)
+        self.assertEqual(snap["remote_slot"], 998)
+
+    def test_secondary_rpc_down(self):
+        self.secondary.close()
+        ok, snap, reason = wait_slot_lag(self.cfg, 10, 0.0, self.main.url, self.secondary.url)
+        self.assertFalse(ok)
+        self.assertIsNone(snap)
+        self.assertIn("SECONDARY", reason)
+
+
+if __name__ == "__main__":
+    unittest.main()
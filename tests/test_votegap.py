@@ -0,0 +1,183 @@
+"""
+Log scanning over small synthetic Agave / Firedancer logs in a temp dir, and vote_account_snapshot /
+wait_votes_resumed against a stub getVoteAccounts / getSlot JSON-RPC server.
+"""
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_rpc import StubRpc  # noqa: E402
+from votegap import (  # noqa: E402
+    _first_secondary_vote,
+    _last_main_vote,
+    _scan_ns,
+    classify,
+    scan_local,
+    vote_account_snapshot,
+    wait_votes_resumed,
+)
+
+NODE, VOTE = "Node1111111111111111111111111111111111111111", "Vote1111111111111111111111111111111111111111"
+
+
+T0 = 1_790_000_000.0    # Agave timestamps are UTC; FD ones local time without a year
+
+
+def agave_line(ts: float, msg: str) -> str:
+    return f"[{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts))}.{round(ts % 1 * 1e6):06d}Z INFO  solana_core] {msg}\n"
+
+
+def fd_line(ts: float, msg: str) -> str:
+    return f"NOTICE  {time.strftime('%m-%d %H:%M:%S', time.localtime(ts))}.{round(ts % 1 * 1e6):06d} 4711 f0 0 {msg}\n"
+
+
+class LogScanTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "validator.log"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, lines: list[str]) -> Path:
+        self.path.write_text("".join(lines))
+        return self.path
+
+    def test_agave_interleaved_and_untimestamped(self):
+        lines = []
+        for i in range(10):
+            ts = T0 + i
+            lines.append(agave_line(ts, f"voting: {100 + i} 99.1%"))
+            lines.append(agave_line(ts + 0.1, "datapoint: replay-slot-stats slot=1"))
+            # a multi-line message: the continuation has no timestamp and must not count as a vote
+            lines.append(f"    at voting: {900 + i} (backtrace)\n")
+            if i == 5:
+                lines.append(agave_line(ts + 0.5, "Identity set to Unstaked1111"))
+        events = list(classify(scan_local(self.write(lines), T0 - 5, T0 + 60)))
+        self.assertEqual([slot for _, kind, slot in events if kind == "vote"], list(range(100, 110)))
+        self.assertEqual(_last_main_vote(events), (T0 + 5, 105))
+
+    def test_secondary_first_vote_after_switch(self):
+        lines = [agave_line(T0 + i, f"voting: {90 + i} 99.1%") for i in range(3)]    # an old identity's votes
+        lines.append(agave_line(T0 + 4.0, "Identity set to Vote1111"))
+        lines += [agave_line(T0 + 4.2, "voting: 105 99.1%"), agave_line(T0 + 4.6, "voting: 106 99.1%")]
+        events = list(classify(scan_local(self.write(lines), T0 - 5, T0 + 60)))
+        self.assertEqual(_first_secondary_vote(events, after_slot=105, after_ts=T0 + 3.9), (T0 + 4.6, 106))
+
+    def test_target_before_first_timestamp(self):
+        lines = [agave_line(T0 + i * 0.01, f"voting: {i} 99.1%") for i in range(3000)]
+        self.assertGreater(len("".join(lines)), 65536)
+        got = list(scan_local(self.write(["untimestamped header\n"] + lines), T0 - 3600, T0 + 3600))
+        self.assertEqual(len(got), 3000)
+        self.assertEqual(got[0][0], T0)
+
+    def test_seek_into_large_file(self):
+        lines, votes = [], []
+        for i in range(6000):
+            votes.append((T0 + i * 0.05, agave_line(T0 + i * 0.05, f"voting: {i} 99.1%")))
+            lines.append(votes[-1][1])
+            if i % 7 == 0:
+                lines.append("  stack frame without a timestamp, voting: 1\n")
+        path = self.write(lines)
+        self.assertGreater(path.stat().st_size, 4 * 65536)
+        start, end = T0 + 150.025, T0 + 160.025    # the middle of the file, between two lines
+        got = [(round(ts, 3), line) for ts, line in scan_local(path, start, end)]
+        self.assertEqual(got, [(round(ts, 3), line.rstrip()) for ts, line in votes if start <= ts <= end])
+        self.assertEqual(len(got), 200)
+
+    def test_fd_timestamps(self):
+        ts_of = _scan_ns["ts_of"]
+        now = time.time()
+        self.assertAlmostEqual(ts_of(fd_line(now, "x").encode()), now, places=5)
+
+    def test_fd_across_new_year(self):
+        # read on Jan 1 shortly after midnight: the December lines belong to the previous year
+        new_year = time.mktime((2027, 1, 1, 0, 0, 0, 0, 0, -1))
+        lines = [fd_line(new_year + k, f"vote for slot {1000 + k}") for k in range(-20, 20, 2)]
+        with mock.patch("time.time", return_value=new_year + 30):
+            got = [ts for ts, _ in scan_local(self.write(lines), new_year - 10, new_year + 10)]
+        self.assertEqual([round(ts - new_year) for ts in got], list(range(-10, 11, 2)))
+
+
+class VoteNode:
+    """getSlot returns .slot; getVoteAccounts reports .last_vote for NODE (credits follow the vote)."""
+
+    def __init__(self, slot: int, last_vote: int, delinquent: bool = False):
+        self.slot, self.last_vote, self.delinquent = slot, last_vote, delinquent
+        self.rpc = StubRpc({"getSlot": lambda params: self.slot, "getVoteAccounts": self._vote_accounts})
+        self.url = self.rpc.url
+
+    def _vote_accounts(self, params):
+        acc = {"nodePubkey": NODE, "votePubkey": VOTE, "lastVote": self.last_vote,
+               "rootSlot": self.last_vote - 31, "epochCredits": [[700, 5000 + self.last_vote, 4000]]}
+        other = {"nodePubkey": "Other", "votePubkey": "OtherVote", "lastVote": 1, "rootSlot": 0, "epochCredits": []}
+        return {"current": [other] + ([] if self.delinquent else [acc]), "delinquent": [acc] if self.delinquent else []}
+
+    def close(self):
+        self.rpc.close()
+
+
+class VoteAccountTest(unittest.TestCase):
+    def setUp(self):
+        self.rpc = VoteNode(slot=1000, last_vote=999)
+
+    def tearDown(self):
+        self.rpc.close()
+
+    def test_snapshot(self):
+        snap = vote_account_snapshot(NODE, self.rpc.url)
+        self.assertEqual(snap["vote_pubkey"], VOTE)
+        self.assertEqual(snap["last_vote"], 999)
+        self.assertEqual(snap["root_slot"], 968)
+        self.assertEqual(snap["credits"], 5999)
+        self.assertEqual(snap["epoch"], 700)
+        self.assertEqual(snap["slot"], 1000)
+
+    def test_snapshot_delinquent(self):
+        self.rpc.delinquent = True
+        self.assertEqual(vote_account_snapshot(NODE, self.rpc.url)["vote_pubkey"], VOTE)
+
+    def test_snapshot_unknown_node(self):
+        with self.assertRaises(RuntimeError):
+            vote_account_snapshot("Unknown", self.rpc.url)
+
+    def test_votes_before_unstake_are_mains(self):
+        # MAIN kept voting between the pre-trigger snapshot and its unstake (slot 1004): those votes,
+        # though past the snapshot slot, are MAIN's; only a vote past 1004 counts as SECONDARY's
+        before = vote_account_snapshot(NODE, self.rpc.url)
+        ref = {"slot": 1004, "ts": time.time()}
+        self.rpc.last_vote = 1003
+
+        def secondary_votes():
+            self.rpc.last_vote = 1007
+
+        timer = threading.Timer(0.3, secondary_votes)
+        timer.start()
+        try:
+            res = wait_votes_resumed(NODE, before, ref, rpc_url=self.rpc.url, wait_s=5.0, poll_s=0.05)
+        finally:
+            timer.cancel()
+        self.assertIsNotNone(res)
+        self.assertEqual(res["slot_at_trigger"], 1000)
+        self.assertEqual(res["slot_at_unstake"], 1004)
+        self.assertEqual(res["main_last_vote"], 1003)
+        self.assertEqual(res["secondary_first_vote"], 1007)
+        self.assertEqual(res["slots_without_vote"], 3)
+        self.assertEqual(res["credits_earned"], 8)
+
+    def test_no_vote_after_unstake(self):
+        before = vote_account_snapshot(NODE, self.rpc.url)
+        self.rpc.last_vote = 1004
+        res = wait_votes_resumed(NODE, before, {"slot": 1004, "ts": time.time()}, rpc_url=self.rpc.url,
+                                 wait_s=0.3, poll_s=0.05)
+        self.assertIsNone(res)
+
+
+if __name__ == "__main__":
+    unittest.main()
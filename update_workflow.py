@@ -0,0 +1,141 @@
+# update_workflow.py
+import subprocess
+import time
+from pathlib import Path
+
+from cassette import cassette_popen
+from profiling import profile_phase
+from remote_config import LOCAL_RPC_URL, REMOTE_UNSTAKED_IDENTITY
+from uttils import (
+    SSHSettings,
+    run_remote,
+    detect_client_local,
+    get_local_pubkey_from_keyfile,
+    local_rpc_health,
+    rpc_call,
+)
+from verify_identity import verify_and_swap
+from swap import perform_swap_back
+
+KEEPALIVE_SEC = 30  # < ControlPersist=60s, keeps the SSH master (and remote caches) warm
+
+
+def _keep_warm(cfg: SSHSettings, last: float) -> float:
+    if time.monotonic() - last < KEEPALIVE_SEC:
+        return last
+    try:
+        run_remote(cfg, "true", timeout=10, login_shell=False)
+    except Exception:
+        pass
+    return time.monotonic()
+
+
+def _run_update_hook(cmd: str, cfg: SSHSettings, verbose: bool) -> int:
+    """Run the MAIN update/restart hook (shell command) while keeping the SECONDARY channel warm."""
+    print(f"[UPDATE] running hook: {cmd}")
+    p = cassette_popen("hook", {"cmd": cmd}, lambda: subprocess.Popen(cmd, shell=True))
+    last = time.monotonic()
+    while p.poll() is None:
+        last = _keep_warm(cfg, last)
+        time.sleep(0.5)
+    if verbose:
+        print(f"[VERBOSE] hook rc={p.returncode}")
+    return p.returncode
+
+
+def wait_main_caught_up(
+        rpc_url: str,
+        cfg: SSHSettings,
+        timeout_s: float,
+        poll_s: float = 2.0,
+        verbose: bool = False,
+) -> bool:
+    """Poll MAIN's local RPC (getHealth) until it reports 'ok'. Returns False on timeout."""
+    deadline = time.monotonic() + timeout_s
+    last = time.monotonic()
+    prev = None
+    while time.monotonic() < deadline:
+        ok, detail = local_rpc_health(rpc_url)
+        if ok:
+            return True
+        if verbose and detail != prev:
+            print(f"[VERBOSE] MAIN health: {detail}")
+            prev = detail
+        last = _keep_warm(cfg, last)
+        time.sleep(poll_s)
+    return False
+
+
+def run_update(
+    main_ledger: Path,
+    main_key: Path,
+    *,
+    update_hook: str | None = None,
+    catchup_timeout: float = 3600.0,
+    rpc_url: str | None = None,
+    remote_unstaked_identity: str | None = None,
+    **verify_kwargs,
+) -> int:
+    """
+    Round trip around a MAIN update: swap MAIN -> SECONDARY, run/await the update hook on MAIN,
+    wait until MAIN's RPC is healthy (caught up), then swap back over the same warm SSH/env state.
+    """
+    rpc_url = rpc_url or LOCAL_RPC_URL
+    verbose = bool(verify_kwargs.get("verbose"))
+    assume_yes = bool(verify_kwargs.get("assume_yes"))
+
+    code, leg = verify_and_swap(main_ledger, main_key, remote_unstaked_identity=remote_unstaked_identity,
+                                **verify_kwargs)
+    if code != 0 or leg is None:
+        return code
+    t_out = time.perf_counter()
+    cfg = leg.secondary_cfg
+
+    # 1) update/restart MAIN
+    profile_phase("update")
+    if update_hook:
+        rc = _run_update_hook(update_hook, cfg, verbose)
+        if rc != 0:
+            print(f"[UPDATE] hook failed (rc={rc}); identity stays on SECONDARY")
+            return 4
+    elif not assume_yes:
+        try:
+            input("[UPDATE] Update/restart MAIN now, then press ENTER… ")
+        except KeyboardInterrupt:
+            print("Cancelled by user; identity stays on SECONDARY.")
+            return 130
+
+    # 2) catch-up on MAIN
+    profile_phase("catch-up")
+    print(f"[UPDATE] waiting for MAIN to catch up ({rpc_url}, timeout {catchup_timeout:g}s)…")
+    if not wait_main_caught_up(rpc_url, cfg, catchup_timeout, verbose=verbose):
+        print("[UPDATE] MAIN did not catch up in time; identity stays on SECONDARY")
+        return 5
+
+    # 3) MAIN must be running the unstaked identity before it gets the validator key back
+    unstaked_pub = get_local_pubkey_from_keyfile(leg.local_unstaked_identity)
+    try:
+        main_identity = (rpc_call(rpc_url, "getIdentity") or {}).get("identity")
+    except RuntimeError as e:
+        print(f"[UPDATE] cannot read MAIN identity: {e}")
+        return 5
+    if main_identity != unstaked_pub:
+        print(f"[UPDATE] MAIN identity is {main_identity}, expected unstaked {unstaked_pub}; not swapping back")
+        return 5
+
+    # 4) swap back (client may have changed with the update)
+    profile_phase("swap-back")
+    main_client = verify_kwargs.get("force_main_client") or detect_client_local(main_ledger)
+    perform_swap_back(
+        leg,
+        remote_unstaked_identity=(remote_unstaked_identity or REMOTE_UNSTAKED_IDENTITY),
+        main_client=main_client,
+        main_timeout_s=verify_kwargs.get("main_timeout"),
+        auto_rollback=verify_kwargs.get("auto_rollback", True),
+        budget_s=verify_kwargs.get("budget"),
+        prewarm=verify_kwargs.get("prewarm", True),
+        assume_yes=assume_yes,
+        verbose=verbose,
+    )
+    print(f"[UPDATE] identity ran on SECONDARY for {time.perf_counter() - t_out:.1f}s")
+    return 0
@@ -1,3 +1,4 @@
+import json
 import os
 import shlex
 import shutil
@@ -7,6 +8,8 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, Sequence, Tuple
 import remote_config as rc
+from cassette import cassette_call, cassette_mode, cassette_popen
+from spawner import child_preexec, spawn_run
 
 FD_NAMES = {"fdctl", "firedancer"}
 AGAVE_NAMES = {"agave-validator", "solana-validator"}
@@ -27,7 +30,7 @@ class SSHSettings:
     extra_ssh_opts: Tuple[str, ...] = ()
 
 
-def _ssh_build_args(cfg: SSHSettings, *, for_scp: bool = False) -> list[str]:
+def _ssh_build_args(cfg: SSHSettings, *, for_scp: bool = False, multiplex: bool = True) -> list[str]:
     args: list[str] = []
     # Port flag differs between ssh and scp
     if for_scp:
@@ -46,11 +49,17 @@ def _ssh_build_args(cfg: SSHSettings, *, for_scp: bool = False) -> list[str]:
         "-o", f"ServerAliveInterval={cfg.server_alive_interval}",
         "-o", f"ServerAliveCountMax={cfg.server_alive_count_max}",
         "-o", "IdentitiesOnly=yes",
-        # Speed up repeated ssh calls via master connection
-        "-o", "ControlMaster=auto",
-        "-o", "ControlPath=~/.ssh/cm-%r@%h:%p",
-        "-o", "ControlPersist=60s",
     ]
+    if multiplex:
+        # Speed up repeated ssh calls via master connection
+        args += [
+            "-o", "ControlMaster=auto",
+            "-o", "ControlPath=~/.ssh/cm-%r@%h:%p",
+            "-o", "ControlPersist=60s",
+        ]
+    else:
+        # own TCP connection (bulk transfers: parallel streams must not share one channel window)
+        args += ["-o", "ControlMaster=no", "-o", "ControlPath=none"]
     # Extra user-provided options
     if cfg.extra_ssh_opts:
         for opt in cfg.extra_ssh_opts:
@@ -58,12 +67,20 @@ def _ssh_build_args(cfg: SSHSettings, *, for_scp: bool = False) -> list[str]:
     return args
 
 
-def _base_ssh_cmd(cfg: SSHSettings) -> list[str]:
-    return ["ssh", *_ssh_build_args(cfg, for_scp=False), f"{cfg.user}@{cfg.host}"]
+def _base_ssh_cmd(cfg: SSHSettings, multiplex: bool = True) -> list[str]:
+    return ["ssh", *_ssh_build_args(cfg, for_scp=False, multiplex=multiplex), f"{cfg.user}@{cfg.host}"]
 
 
-def build_ssh_command(cfg: SSHSettings, remote_command: Sequence[str] | str | None) -> list[str]:
-    cmd = _base_ssh_cmd(cfg)
+def build_ssh_command(cfg: SSHSettings, remote_command: Sequence[str] | str | None,
+                      multiplex: bool = True) -> list[str]:
+    if is_local(cfg):
+        # same shell semantics as sshd: the command string goes to the shell, no command = shell on stdin
+        if remote_command is None:
+            return ["/bin/bash"]
+        if not isinstance(remote_command, str):
+            remote_command = " ".join(shlex.quote(t) for t in remote_command)
+        return ["/bin/bash", "-c", remote_command]
+    cmd = _base_ssh_cmd(cfg, multiplex)
     if remote_command is None:
         return cmd
     if isinstance(remote_command, str):
@@ -72,33 +89,230 @@ def build_ssh_command(cfg: SSHSettings, remote_command: Sequence[str] | str | No
     return [*cmd, quoted]
 
 
+# ============================== Execution targets ==============================
+# MAIN and SECONDARY are both "targets": SSHSettings reached over SSH, or the LOCAL target (host
+# "local") when the orchestrator runs on that node. Everything built on build_ssh_command —
+# run_remote, SSHSession, armed sessions, remote_stat, detection, keygen, set-identity builders —
+# then works unchanged against either, which is what the third-host controller mode relies on.
+
+LOCAL_HOST = "local"
+
+
+def local_target(user: str | None = None) -> SSHSettings:
+    return SSHSettings(host=LOCAL_HOST, user=user or os.environ.get("USER", ""), port=0, identity_file=None)
+
+
+def is_local(cfg: SSHSettings | None) -> bool:
+    return cfg is None or cfg.host == LOCAL_HOST
+
+
+def _file_ref(cfg: SSHSettings | None, path: str) -> list[str]:
+    return [path] if is_local(cfg) else [f"{cfg.user}@{cfg.host}:{path}"]
+
+
+def copy_file(src_cfg: SSHSettings | None, src: str, dst_cfg: SSHSettings | None, dst: str,
+              timeout: Optional[float] = 10) -> subprocess.CompletedProcess:
+    """
+    Copy one file between targets (None / LOCAL = this host): cp, scp, or — when both ends are
+    remote (controller mode) — `ssh src cat | ssh dst 'cat >'` streamed through this host, written to
+    <dst>.new and renamed over dst only once the announced size arrived (a reader never sees a torn file).
+    """
+    if is_local(src_cfg) and is_local(dst_cfg):
+        return run_local(["cp", src, dst], timeout=timeout)
+    if is_local(src_cfg) or is_local(dst_cfg):
+        remote = dst_cfg if is_local(src_cfg) else src_cfg
+        return run_scp(["scp", *_ssh_build_args(remote, for_scp=True),
+                        *_file_ref(src_cfg, src), *_file_ref(dst_cfg, dst)], timeout=timeout)
+    # size header from the same open file, so a pull cut short cannot be renamed into place
+    pull = " ".join(shlex.quote(t) for t in build_ssh_command(
+        src_cfg, f"exec 3<{shlex.quote(src)} && stat -L -c %s /dev/fd/3 && cat <&3"))
+    tmp = shlex.quote(dst + ".new")
+    push = " ".join(shlex.quote(t) for t in build_ssh_command(
+        dst_cfg, f'IFS= read -r n && head -c "$n" > {tmp} && [ "$(stat -c %s {tmp})" = "$n" ] '
+                 f'&& mv -f {tmp} {shlex.quote(dst)} || {{ rm -f {tmp}; exit 1; }}'))
+    return run_local(["/bin/bash", "-c", f"set -o pipefail; {pull} | {push}"], timeout=timeout)
+
+
 def run_remote(
         cfg: SSHSettings,
         remote_command: Sequence[str] | str,
-        timeout: Optional[int] = None,
-        login_shell: bool = True,
+        timeout: Optional[float] = None,
+        login_shell: bool | None = None,
 ) -> subprocess.CompletedProcess:
+    """
+    Run a command on the remote host.
+    login_shell:
+      None  -> default: run with the captured remote login environment (see capture_remote_env),
+               falling back to `bash -lc` if no snapshot is available or --login-shell was requested.
+      True  -> always wrap in `bash -lc` (sources /etc/profile, ~/.profile, ...).
+      False -> run as-is (sshd default environment).
+    """
     if isinstance(remote_command, (list, tuple)):
         rc_str = " ".join(shlex.quote(t) for t in remote_command)
     else:
         rc_str = remote_command
+    if login_shell is None:
+        prefix = None if _LOGIN_SHELL_DEFAULT else remote_env_prefix(cfg)
+        if prefix is None:
+            login_shell = True
+        else:
+            rc_str = prefix + rc_str
     if login_shell:
         rc_str = f"bash -lc {shlex.quote(rc_str)}"
     cmd = build_ssh_command(cfg, rc_str)
-    return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    return cassette_call("remote", {"host": host_key(cfg), "cmd": remote_command, "login_shell": login_shell},
+                         lambda: subprocess.run(cmd, capture_output=True, text=True, timeout=timeout,
+                                                preexec_fn=child_preexec()))
 
 
 def run_local(cmd: Sequence[str] | str, timeout: Optional[int] = None) -> subprocess.CompletedProcess:
-    return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    return cassette_call("local", {"cmd": cmd}, lambda: spawn_run(cmd, timeout=timeout))
+
+
+def run_scp(scp_args: Sequence[str], timeout: Optional[float] = 10) -> subprocess.CompletedProcess:
+    return cassette_call("scp", {"cmd": list(scp_args)},
+                         lambda: subprocess.run(list(scp_args), capture_output=True, text=True, timeout=timeout,
+                                                preexec_fn=child_preexec()))
+
+
+def measure_rtt_ms(cfg: SSHSettings, samples: int = 3, timeout: int = 5) -> list[float]:
+    """Exec round trip over the (ControlMaster) SSH channel, in ms. Failed probes are skipped."""
+    out: list[float] = []
+    for _ in range(max(1, samples)):
+        t0 = time.perf_counter()
+        try:
+            res = run_remote(cfg, "true", timeout=timeout, login_shell=False)
+        except subprocess.TimeoutExpired:
+            continue
+        if res.returncode == 0:
+            out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def baseline_rtt_ms(cfg: SSHSettings, refresh: bool = False, max_age_s: float = 7 * 86400) -> float:
+    """Pair baseline SSH exec RTT (min of probes), cached in the state file; probes only when missing/stale."""
+    key = host_key(cfg)
+    cached = state_get("rtt", key)
+    if not refresh and cached and time.time() - cached.get("ts", 0) < max_age_s:
+        return float(cached["ms"])
+    samples = measure_rtt_ms(cfg, samples=3)
+    if not samples:
+        return float(cached["ms"]) if cached else 0.0
+    ms = min(samples)
+    state_put("rtt", key, {"ts": time.time(), "ms": round(ms, 2)})
+    return ms
 
 
 def check_connection(cfg: SSHSettings) -> Tuple[bool, str]:
     cmd = build_ssh_command(cfg, ["echo", "__PING__"])
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    proc = cassette_call("remote", {"host": host_key(cfg), "cmd": "echo __PING__", "login_shell": False},
+                         lambda: subprocess.run(cmd, capture_output=True, text=True, preexec_fn=child_preexec()))
     ok = (proc.returncode == 0) and ("__PING__" in (proc.stdout or ""))
     return ok, proc.stderr.strip()
 
 
+# ============================ Persistent state cache ==========================
+
+def _state_path() -> Path:
+    return Path(getattr(rc, "STATE_CACHE_PATH", Path.home() / ".cache/updater_swap/state.json")).expanduser()
+
+
+def state_load() -> dict:
+    try:
+        data = json.loads(_state_path().read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def state_get(section: str, key: str, default=None):
+    # recorded like a command: a replay sees the cache exactly as the recorded run did
+    return cassette_call("state", {"section": section, "key": key},
+                         lambda: state_load().get(section, {}).get(key, default))
+
+
+def state_put(section: str, key: str, value) -> None:
+    """Store value under section/key. Best effort: the cache is an optimization only."""
+    if cassette_mode() == "replay":
+        return
+    path = _state_path()
+    data = state_load()
+    data.setdefault(section, {})[key] = value
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+    except Exception:
+        pass
+
+
+def host_key(cfg: SSHSettings) -> str:
+    return f"{cfg.user}@{cfg.host}:{cfg.port}"
+
+
+# ======================= Remote login environment snapshot ====================
+
+REMOTE_ENV_KEYS = {"PATH", "HOME", "USER", "LOGNAME", "SHELL", "LANG", "LC_ALL", "LD_LIBRARY_PATH"}
+REMOTE_ENV_PREFIXES = ("SOLANA_", "AGAVE_", "FD_", "RUST_")
+
+_REMOTE_ENV: dict = {}
+_LOGIN_SHELL_DEFAULT = False
+
+
+def set_login_shell_default(enabled: bool) -> None:
+    """Force `bash -lc` for every default run_remote call (opt-in fallback)."""
+    global _LOGIN_SHELL_DEFAULT
+    _LOGIN_SHELL_DEFAULT = bool(enabled)
+
+
+def _parse_env_dump(text: str) -> dict:
+    env: dict = {}
+    for item in (text or "").split("\x00"):
+        k, sep, v = item.strip("\n").partition("=")
+        if not sep or not k:
+            continue
+        if k in REMOTE_ENV_KEYS or k.startswith(REMOTE_ENV_PREFIXES):
+            env[k] = v
+    return env
+
+
+def capture_remote_env(cfg: SSHSettings, refresh: bool = False) -> dict | None:
+    """
+    Capture the remote login environment (PATH and relevant variables) once per run.
+    Order: in-process cache -> persistent cache (REMOTE_ENV_TTL_SEC) -> one `bash -lc` on the host.
+    Returns None if the snapshot could not be taken (callers fall back to login shell).
+    """
+    key = host_key(cfg)
+    if not refresh and key in _REMOTE_ENV:
+        return _REMOTE_ENV[key]
+
+    ttl = int(getattr(rc, "REMOTE_ENV_TTL_SEC", 86400))
+    if not refresh:
+        cached = state_get("remote_env", key)
+        if cached and cached.get("env", {}).get("PATH") and time.time() - cached.get("ts", 0) < ttl:
+            _REMOTE_ENV[key] = cached["env"]
+            return _REMOTE_ENV[key]
+
+    # ~/.bashrc is sourced as well: that is where solana-install usually puts its PATH entry
+    res = run_remote(cfg, "[ -f ~/.bashrc ] && . ~/.bashrc >/dev/null 2>&1; env -0", login_shell=True)
+    env = _parse_env_dump(res.stdout) if res.returncode == 0 else {}
+    if not env.get("PATH"):
+        _REMOTE_ENV[key] = None
+        return None
+    _REMOTE_ENV[key] = env
+    state_put("remote_env", key, {"ts": time.time(), "env": env})
+    return env
+
+
+def remote_env_prefix(cfg: SSHSettings) -> str | None:
+    """Shell prefix exporting the captured login environment, or None if unavailable."""
+    env = capture_remote_env(cfg)
+    if not env:
+        return None
+    return "export " + " ".join(f"{k}={shlex.quote(v)}" for k, v in sorted(env.items())) + "; "
+
+
 # ========================= .env → SSHSettings helper ==========================
 
 def _load_env_file(path: Path) -> dict:
@@ -136,17 +350,22 @@ def _expand_path(s: str | None) -> Path | None:
     return None if not s else Path(os.path.expandvars(os.path.expanduser(s)))
 
 
-def build_server_from_env(env_file: Path) -> SSHSettings:
+def build_server_from_env(env_file: Path, prefix: str = "SSH_", optional: bool = False) -> SSHSettings | None:
+    """SSHSettings from <prefix>HOST, <prefix>USER, ... (env vars override .env); optional -> None if no HOST."""
     env = _load_env_file(env_file)
-    host = _get(env, "SSH_HOST")
-    user = _get(env, "SSH_USER")
-    port = _get_int(env, "SSH_PORT", 22)
-
-    identity_file = _expand_path(_get(env, "SSH_IDENTITY_FILE", str(Path.home() / ".ssh/id_ed25519")))
-    strict = _get(env, "SSH_STRICT_HOST_KEY_CHECKING", "accept-new")
-    connect_timeout = _get_int(env, "SSH_CONNECT_TIMEOUT", 10)
-    alive_interval = _get_int(env, "SSH_SERVER_ALIVE_INTERVAL", 30)
-    alive_count_max = _get_int(env, "SSH_SERVER_ALIVE_COUNT_MAX", 3)
+    if optional and f"{prefix}HOST" not in os.environ and f"{prefix}HOST" not in env:
+        return None
+    host = _get(env, f"{prefix}HOST")
+    if host == LOCAL_HOST:
+        return local_target(_get(env, f"{prefix}USER", ""))
+    user = _get(env, f"{prefix}USER")
+    port = _get_int(env, f"{prefix}PORT", 22)
+
+    identity_file = _expand_path(_get(env, f"{prefix}IDENTITY_FILE", str(Path.home() / ".ssh/id_ed25519")))
+    strict = _get(env, f"{prefix}STRICT_HOST_KEY_CHECKING", "accept-new")
+    connect_timeout = _get_int(env, f"{prefix}CONNECT_TIMEOUT", 10)
+    alive_interval = _get_int(env, f"{prefix}SERVER_ALIVE_INTERVAL", 30)
+    alive_count_max = _get_int(env, f"{prefix}SERVER_ALIVE_COUNT_MAX", 3)
 
     return SSHSettings(
         host=host,
@@ -162,33 +381,96 @@ def build_server_from_env(env_file: Path) -> SSHSettings:
 
 # ============================ Remote path helpers =============================
 
-def remote_expand_path(cfg: SSHSettings, path_str: str) -> str:
-    """Expand ~ and $VARS on the remote host and normalize the path."""
-    # Simple memoization to avoid repeated remote calls for the same path/user/host
-    global _REMOTE_EXPAND_CACHE
+@dataclass(frozen=True)
+class RemoteStat:
+    path: str                 # as given (may contain ~ / $VARS)
+    realpath: str
+    exists: bool
+    type: str | None          # file | dir | other (after following symlinks)
+    mode: int | None
+    size: int | None
+    mtime: float | None
+    readable: bool
+    executable: bool
+
+
+# one-liner (no heredoc) so it can be fused into a multi-step remote script
+_STAT_PY = (
+    "import json,os,stat,sys\n"
+    "res={}\n"
+    "for p in json.loads(sys.argv[1]):\n"
+    " r=os.path.realpath(os.path.expanduser(os.path.expandvars(p)))\n"
+    " d=dict(realpath=r,exists=False,type=None,mode=None,size=None,mtime=None,readable=False,executable=False)\n"
+    " try:\n"
+    "  st=os.stat(r)\n"
+    "  t='dir' if stat.S_ISDIR(st.st_mode) else 'file' if stat.S_ISREG(st.st_mode) else 'other'\n"
+    "  d.update(exists=True,type=t,mode=stat.S_IMODE(st.st_mode),size=st.st_size,mtime=st.st_mtime,"
+    "readable=os.access(r,os.R_OK),executable=os.access(r,os.X_OK))\n"
+    " except OSError:\n"
+    "  pass\n"
+    " res[p]=d\n"
+    "print(json.dumps(res))\n"
+)
+
+_REMOTE_EXPAND_CACHE: dict[tuple[str, str, str], str] = {}
+_REMOTE_STAT_CACHE: dict[tuple[str, str, str], tuple[float, RemoteStat]] = {}
+
+
+def remote_stat_cmd(paths: Sequence[str]) -> str:
+    """Remote shell command printing a JSON stat map for paths (see parse_remote_stat)."""
+    return f"python3 -c {shlex.quote(_STAT_PY)} {shlex.quote(json.dumps(list(paths)))}"
+
+
+def parse_remote_stat(cfg: SSHSettings, out: str) -> dict[str, RemoteStat]:
+    """Parse remote_stat_cmd output; fills the expand/stat caches."""
+    line = next((x for x in reversed((out or "").strip().splitlines()) if x.startswith("{")), "")
     try:
-        cache_key = (cfg.host, cfg.user, path_str)
-        if _REMOTE_EXPAND_CACHE.get(cache_key):
-            return _REMOTE_EXPAND_CACHE[cache_key]
-    except NameError:
-        _REMOTE_EXPAND_CACHE = {}
-
-    cmd = (
-        "python3 - <<'PY'\n"
-        "import os\n"
-        f"p = {path_str!r}\n"
-        "p = os.path.expanduser(os.path.expandvars(p))\n"
-        "print(os.path.realpath(p))\n"
-        "PY"
-    )
-    res = run_remote(cfg, cmd, login_shell=False)
-    out = (res.stdout or "").strip()
-    if res.returncode != 0 or not out:
-        raise RuntimeError(
-            "Failed to expand path on remote host: " + path_str + "\n" + (res.stderr or res.stdout or "").strip()
-        )
-    _REMOTE_EXPAND_CACHE[cache_key] = out
-    return out
+        raw = json.loads(line)
+    except ValueError:
+        raise RuntimeError(f"Failed to stat paths on remote host: {(out or '').strip()[:200]}")
+    now = time.monotonic()
+    res: dict[str, RemoteStat] = {}
+    for p, d in raw.items():
+        st = RemoteStat(path=p, **d)
+        res[p] = st
+        _REMOTE_EXPAND_CACHE[(cfg.host, cfg.user, p)] = st.realpath
+        _REMOTE_STAT_CACHE[(cfg.host, cfg.user, p)] = (now, st)
+    return res
+
+
+def remote_stat_many(cfg: SSHSettings, paths: Sequence[str], max_age_s: float = 0.0) -> dict[str, RemoteStat]:
+    """
+    realpath/exists/type/mode/size/mtime/readable/executable for many SECONDARY paths in one round trip.
+    Entries stat'ed within max_age_s are served from the cache.
+    """
+    paths = list(dict.fromkeys(str(p) for p in paths))
+    now = time.monotonic()
+    res: dict[str, RemoteStat] = {}
+    todo: list[str] = []
+    for p in paths:
+        hit = _REMOTE_STAT_CACHE.get((cfg.host, cfg.user, p))
+        if hit and max_age_s > 0 and now - hit[0] <= max_age_s:
+            res[p] = hit[1]
+        else:
+            todo.append(p)
+    if todo:
+        r = run_remote(cfg, remote_stat_cmd(todo), login_shell=False)
+        if r.returncode != 0:
+            raise RuntimeError("Failed to stat paths on remote host: " + (r.stderr or r.stdout or "").strip())
+        res.update(parse_remote_stat(cfg, r.stdout))
+    return res
+
+
+def remote_stat(cfg: SSHSettings, path_str: str, max_age_s: float = 0.0) -> RemoteStat:
+    return remote_stat_many(cfg, [path_str], max_age_s=max_age_s)[str(path_str)]
+
+
+def remote_expand_path(cfg: SSHSettings, path_str: str) -> str:
+    """Expand ~ and $VARS on the remote host and normalize the path (cached; see remote_stat_many)."""
+    cache_key = (cfg.host, cfg.user, path_str)
+    if cache_key not in _REMOTE_EXPAND_CACHE:
+        remote_stat_many(cfg, [path_str])
+    return _REMOTE_EXPAND_CACHE[cache_key]
 
 
 def _sh_q(s: str) -> str:
@@ -267,6 +549,10 @@ def _proc_uses_path(pid: str, needle: str) -> bool:
 
 
 def detect_client_local(ledger_dir: str | Path | None = None) -> str:
+    return cassette_call("local_detect", {"ledger": str(ledger_dir or "")}, lambda: _detect_client_local(ledger_dir))
+
+
+def _detect_client_local(ledger_dir: str | Path | None = None) -> str:
     ledger_dir = str(ledger_dir) if ledger_dir else ""
     found: list[tuple[str, str]] = []
 
@@ -287,41 +573,87 @@ def detect_client_local(ledger_dir: str | Path | None = None) -> str:
         return found[0][1]
 
     if ledger_dir:
-        return detect_client_local(None)
+        return _detect_client_local(None)
     return "unknown"
 
 
+# ============================ Hedged remote discovery ===========================
+# Discovery strategies (PATH, login shell, install dirs, /proc, ...) are launched at once in ONE remote
+# script, each in its own background job. Results are taken in priority order: the script waits for
+# strategy 1, accepts it if its output matches `valid`, otherwise moves on to strategy 2 (usually already
+# finished), and so on; the remaining jobs are killed. Worst case: one round trip instead of N.
+
+HEDGE_TAG = "__HEDGE__:"
+PUBKEY_ERE = "^[1-9A-HJ-NP-Za-km-z]{32,44}$"
+
+
+@dataclass(frozen=True)
+class Attempt:
+    name: str
+    shell: str
+    valid: str = "."       # ERE the first output line must match to be accepted
+
+
+def hedged_remote_cmd(attempts: Sequence[Attempt], diag: str | None = None) -> str:
+    # job control puts every attempt in its own process group (killable as a whole); its job
+    # notices go to the silenced stderr, restored for the diagnostics
+    lines = ['d="$(mktemp -d)" || exit 1', "exec 3>&2 2>/dev/null", "set -m"]
+    for i, a in enumerate(attempts):
+        lines.append(f"( {a.shell} ) >\"$d/{i}\" 2>/dev/null </dev/null & p{i}=$!")
+    lines.append("set +m")
+    for i, a in enumerate(attempts):
+        rest = " ".join(f"-$p{j}" for j in range(i + 1, len(attempts)))
+        lines.append(
+            f'wait $p{i}; if head -n1 "$d/{i}" | grep -Eq {shlex.quote(a.valid)}; then '
+            f'echo {HEDGE_TAG}{i}; head -n1 "$d/{i}"; '
+            + (f"kill -- {rest} 2>/dev/null; " if rest else "")
+            + 'rm -rf "$d"; exit 0; fi'
+        )
+    lines.append('rm -rf "$d"; exec 2>&3')
+    lines.append(f"echo {HEDGE_TAG}none")
+    if diag:
+        lines.append(diag)
+    return "\n".join(lines)
+
+
+def hedged_remote(cfg: SSHSettings, attempts: Sequence[Attempt], diag: str | None = None,
+                  timeout: int = 30) -> tuple[str | None, str]:
+    """(name of the accepted attempt, its first output line) or (None, diagnostics output)."""
+    res = run_remote(cfg, hedged_remote_cmd(attempts, diag), timeout=timeout)
+    out = res.stdout or ""
+    head, _, rest = out.partition("\n")
+    while head and not head.startswith(HEDGE_TAG) and rest:
+        head, _, rest = rest.partition("\n")
+    tag = head[len(HEDGE_TAG):].strip() if head.startswith(HEDGE_TAG) else "none"
+    if tag.isdigit() and int(tag) < len(attempts):
+        return attempts[int(tag)].name, rest.split("\n", 1)[0].strip()
+    return None, (rest.strip() + ("\n" + res.stderr.strip() if (res.stderr or "").strip() else "")).strip()
+
+
 def detect_client_remote_type(cfg: SSHSettings, ledger_dir: str | Path | None = None) -> str:
+    return detect_client_remote(cfg, ledger_dir)[0]
+
+
+def detect_client_remote(cfg: SSHSettings, ledger_dir: str | Path | None = None,
+                         cli_fallback: bool = False) -> tuple[str, str]:
     """
-    Hybrid client detection on SECONDARY:
+    Hybrid client detection on SECONDARY, all strategies hedged in one round trip:
       1) Quick shell: pgrep + patterns 'run|run1|run-agave' for FD.
-      2) If no FD — search for agave/solana-validator.
-      3) If still none — python /proc parser (login_shell=True) with ledger_dir filter for Agave.
-      Priority: FD > AGAVE > unknown.
+      2) Quick shell: agave/solana-validator process.
+      3) python /proc parser with ledger_dir filter for Agave.
+      4) (cli_fallback) CLI presence in PATH: agave/solana-validator, then fdctl.
+      Priority: in that order; returns (client, strategy name) or ('unknown', '').
     """
-    # 1) quick FD
     fd_quick = (
-        "bash -lc '"
-        "pgrep -a fdctl 2>/dev/null | egrep -q \"(^| )run( |$)| run1 | run-agave\" && echo FD && exit 0; "
-        "pgrep -a firedancer 2>/dev/null | egrep -q \"(^| )run( |$)| run1 | run-agave\" && echo FD && exit 0; "
-        "exit 1'"
+        "pgrep -a fdctl 2>/dev/null | egrep -q '(^| )run( |$)| run1 | run-agave' && echo FD && exit 0; "
+        "pgrep -a firedancer 2>/dev/null | egrep -q '(^| )run( |$)| run1 | run-agave' && echo FD && exit 0; "
+        "exit 1"
     )
-    r = run_remote(cfg, fd_quick)
-    if (r.stdout or "").strip().upper() == "FD":
-        return "FD"
-
-    # 2) quick agave
     agave_quick = (
-        "bash -lc '"
         "pgrep -ax agave-validator >/dev/null 2>&1 && echo AGAVE && exit 0; "
         "pgrep -ax solana-validator >/dev/null 2>&1 && echo AGAVE && exit 0; "
-        "exit 1'"
+        "exit 1"
     )
-    r = run_remote(cfg, agave_quick)
-    if (r.stdout or "").strip().upper() == "AGAVE":
-        return "AGAVE"
-
-    # 3) precise /proc
     ldir = str(ledger_dir) if ledger_dir else ""
     remote_py = rf"""
 import os, re
@@ -406,15 +738,24 @@ for pid in os.listdir("/proc"):
 
 print('FD' if seen_fd else ('AGAVE' if seen_agave else 'unknown'))
 """
-    r = run_remote(cfg, "python3 - <<'PY'\n" + remote_py + "\nPY")
-    out = (r.stdout or "").strip().upper()
-    return out if out in ("FD", "AGAVE", "UNKNOWN") else "unknown"
+    attempts = [
+        Attempt("fd_process", fd_quick, "^FD$"),
+        Attempt("agave_process", agave_quick, "^AGAVE$"),
+        Attempt("proc_scan", f"python3 -c {shlex.quote(remote_py)}", "^(FD|AGAVE)$"),
+    ]
+    if cli_fallback:
+        attempts += [
+            Attempt("cli_agave", "command -v agave-validator >/dev/null || command -v solana-validator >/dev/null "
+                                 "&& echo AGAVE", "^AGAVE$"),
+            Attempt("cli_fd", "command -v fdctl >/dev/null && echo FD", "^FD$"),
+        ]
+    name, out = hedged_remote(cfg, attempts)
+    return (out.upper(), name) if name else ("unknown", "")
 
 
 # ==================== Remote CLI discovery & command build ====================
 def _remote_find_keygen(cfg: SSHSettings) -> str:
-    cmd = ["/bin/bash", "-lc", "command -v solana-keygen || command -v agave-keygen || echo"]
-    res = run_remote(cfg, cmd, login_shell=False)
+    res = run_remote(cfg, "command -v solana-keygen || command -v agave-keygen || echo")
     path = (res.stdout or "").strip()
     if not path:
         raise RuntimeError("solana-keygen/agave-keygen not found in PATH on SECONDARY.")
@@ -424,69 +765,47 @@ def _remote_find_keygen(cfg: SSHSettings) -> str:
 def _remote_find_agave_cli(cfg: SSHSettings) -> str:
     """
     Return absolute path to agave-validator or solana-validator on SECONDARY.
-    Order:
-      1) PATH (login-shell).
-      2) Source profiles ~/.profile, ~/.bash_profile, ~/.bashrc and re-check PATH.
-      3) Fallback to standard Solana install paths in $HOME/.local/share/solana/install/...
-      4) Otherwise, print diagnostics and error.
+    Strategies (hedged, one round trip; priority in this order):
+      1) PATH from the captured login environment (see capture_remote_env).
+      2) Explicit login shell (e.g. stale persistent cache).
+      3) Standard Solana install paths in $HOME/.local/share/solana/install/...
+      Otherwise the same round trip returns diagnostics for the error.
     """
-    # 1) via PATH as-is
-    r1 = run_remote(cfg, "command -v agave-validator || command -v solana-validator || echo")
-    p1 = (r1.stdout or "").strip()
-    if p1:
-        return remote_expand_path(cfg, p1)
-
-    # 2) source profiles and retry
-    r2 = run_remote(
-        cfg,
-        "set -a; "
-        "[ -f ~/.profile ] && . ~/.profile; "
-        "[ -f ~/.bash_profile ] && . ~/.bash_profile; "
-        "[ -f ~/.bashrc ] && . ~/.bashrc; "
-        "command -v agave-validator || command -v solana-validator || echo"
-    )
-    p2 = (r2.stdout or "").strip()
-    if p2:
-        return remote_expand_path(cfg, p2)
-
-    # 3) fallback to typical Solana install paths
+    lookup = "command -v agave-validator || command -v solana-validator"
     probe = r'''
-set -e
-# active_release
 cand1="$HOME/.local/share/solana/install/active_release/bin/agave-validator"
 cand2="$HOME/.local/share/solana/install/active_release/bin/solana-validator"
 if [ -x "$cand1" ]; then echo "$cand1"; exit 0; fi
 if [ -x "$cand2" ]; then echo "$cand2"; exit 0; fi
-# latest release under releases/*
 c3="$(ls -1dt "$HOME"/.local/share/solana/install/releases/*/bin/agave-validator 2>/dev/null | head -n1 || true)"
 c4="$(ls -1dt "$HOME"/.local/share/solana/install/releases/*/bin/solana-validator 2>/dev/null | head -n1 || true)"
 if [ -n "$c3" ] && [ -x "$c3" ]; then echo "$c3"; exit 0; fi
 if [ -n "$c4" ] && [ -x "$c4" ]; then echo "$c4"; exit 0; fi
 exit 3
 '''.strip()
-    r3 = run_remote(cfg, probe)
-    p3 = (r3.stdout or "").strip()
-    if p3:
-        return remote_expand_path(cfg, p3)
-
-    # 4) extended diagnostics to understand SECONDARY environment
-    diag = run_remote(
-        cfg,
+    diag = (
         'echo "USER=$(id -un) HOME=$HOME PATH=$PATH"; '
         'ls -ld "$HOME/.local/share/solana/install" || true; '
         'ls -ld "$HOME/.local/share/solana/install/active_release/bin" || true; '
         'ls -l "$HOME/.local/share/solana/install/active_release/bin" | egrep -i "agave|solana-vali" || true; '
         'echo DONE'
     )
+    name, out = hedged_remote(cfg, [
+        Attempt("path", lookup, "^/"),
+        Attempt("login_shell", "bash -lc " + shlex.quote("[ -f ~/.bashrc ] && . ~/.bashrc >/dev/null 2>&1; " + lookup),
+                "^/"),
+        Attempt("install_dirs", probe, "^/"),
+    ], diag=diag)
+    if name:
+        return remote_expand_path(cfg, out)
     raise RuntimeError(
         "agave-validator/solana-validator not found on SECONDARY in PATH or standard locations.\n"
-        f"--- STDOUT ---\n{(diag.stdout or '').strip()}\n--- STDERR ---\n{(diag.stderr or '').strip()}"
+        f"--- DIAGNOSTICS ---\n{out}"
     )
 
 
 def _remote_find_fdctl(cfg: SSHSettings) -> str:
-    cmd = ["/bin/bash", "-lc", "command -v fdctl || echo"]
-    res = run_remote(cfg, cmd, login_shell=False)
+    res = run_remote(cfg, "command -v fdctl || echo")
     path = (res.stdout or "").strip()
     if not path:
         raise RuntimeError("fdctl not found in PATH on SECONDARY.")
@@ -515,11 +834,12 @@ for p in cands:
 
 def arm_remote_set_identity(secondary_cfg: SSHSettings, cmd_no_shell: str) -> subprocess.Popen:
     """Open SSH session: remote waits for ENTER, then exec <cmd>. No login-shell here."""
-    remote_sh = f'read -r _; exec {cmd_no_shell}'
+    remote_sh = f'read -r _ && exec {cmd_no_shell}'
     ssh_cmd = build_ssh_command(secondary_cfg, remote_sh)
-    return subprocess.Popen(
-        ssh_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-    )
+    return cassette_popen("armed", {"host": host_key(secondary_cfg), "cmd": cmd_no_shell}, lambda: subprocess.Popen(
+        ssh_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        preexec_fn=child_preexec()
+    ))
 
 
 # =============================== Tower sync ==================================
@@ -544,22 +864,39 @@ def copy_tower_main_to_secondary(
     except Exception:
         pass
 
-    scp_args = [
-        "scp",
-        *(_ssh_build_args(secondary_cfg, for_scp=True)),
-        str(src),
-        f"{secondary_cfg.user}@{secondary_cfg.host}:{dest}",
-    ]
     try:
-        res = subprocess.run(scp_args, capture_output=True, text=True, timeout=10)
+        res = copy_file(None, str(src), secondary_cfg, dest)
         if res.returncode != 0:
             return False
     except Exception:
         return False
 
     # verify existence on remote
-    verify = run_remote(secondary_cfg, f"test -f {shlex.quote(dest)} && echo OK || echo NO")
-    return (verify.stdout or "").strip() == "OK"
+    st = remote_stat(secondary_cfg, dest)
+    return st.exists and st.type == "file"
+
+
+def copy_tower_secondary_to_main(
+        *,
+        pubkey: str,
+        main_ledger: Path,
+        secondary_cfg: SSHSettings,
+        remote_ledger: Path,
+        timeout_s: float = 10.0,
+) -> bool:
+    """Reverse of copy_tower_main_to_secondary (used when swapping back to MAIN)."""
+    fname = f"tower-1_9-{pubkey}.bin"
+    src_dir = remote_expand_path(secondary_cfg, str(remote_ledger))
+    dest = Path(main_ledger) / fname
+    tmp = dest.with_suffix(".bin.tmp")
+    try:
+        res = copy_file(secondary_cfg, f"{src_dir}/{fname}", None, str(tmp), timeout=timeout_s)
+        if res.returncode != 0:
+            return False
+        os.replace(tmp, dest)
+    except Exception:
+        return False
+    return dest.exists()
 
 
 def _build_remote_set_identity_cmd_no_shell(
@@ -567,22 +904,39 @@ def _build_remote_set_identity_cmd_no_shell(
         secondary_cfg: SSHSettings,
         remote_ledger: Path,
         new_key_path_str: str,
+        role: str = "SECONDARY",
 ) -> str:
-    """Build a FULL command for SECONDARY (no login-shell), absolute paths only."""
+    """Build a FULL set-identity command for a target (no login-shell), absolute paths only."""
     kind = remote_client.upper()
+    tools = remote_set_identity_paths(remote_client, role)
+    # one batched stat for everything not yet expanded
+    remote_stat_many(secondary_cfg, [p for p in [str(remote_ledger), str(new_key_path_str), *tools]
+                                     if (secondary_cfg.host, secondary_cfg.user, p) not in _REMOTE_EXPAND_CACHE])
     LEDGER = remote_expand_path(secondary_cfg, str(remote_ledger))
     KEY = remote_expand_path(secondary_cfg, str(new_key_path_str))
 
     if kind == "AGAVE":
-        cli = remote_expand_path(secondary_cfg, getattr(rc, "REMOTE_AGAVE_CLI",
-                                                        "$HOME/.local/share/solana/install/active_release/bin/agave-validator"))
+        cli = remote_expand_path(secondary_cfg, tools[0])
         return f'{shlex.quote(cli)} --ledger {shlex.quote(LEDGER)} set-identity {shlex.quote(KEY)}'
-    elif kind == "FD":
-        fd = remote_expand_path(secondary_cfg, getattr(rc, "REMOTE_FDCTL", "$HOME/firedancer/bin/fdctl"))
-        cfg = remote_expand_path(secondary_cfg, getattr(rc, "REMOTE_FD_CONFIG_PATH", "/home/solana/config.toml"))
-        return f'{shlex.quote(fd)} set-identity --config {shlex.quote(cfg)} {shlex.quote(KEY)} --force'
     else:
-        raise RuntimeError(f"[SECONDARY] unknown client '{remote_client}'")
+        fd = remote_expand_path(secondary_cfg, tools[0])
+        cfg = remote_expand_path(secondary_cfg, tools[1])
+        return f'{shlex.quote(fd)} set-identity --config {shlex.quote(cfg)} {shlex.quote(KEY)} --force'
+
+
+def remote_set_identity_paths(remote_client: str, role: str = "SECONDARY") -> list[str]:
+    """
+    Configured tool paths used by set-identity on a target reached via run_remote: [cli] for AGAVE,
+    [fdctl, config] for FD. role MAIN (controller mode) reads the MAIN_* settings.
+    """
+    kind = (remote_client or "").upper()
+    pre = "MAIN" if role == "MAIN" else "REMOTE"
+    if kind == "AGAVE":
+        return [getattr(rc, f"{pre}_AGAVE_CLI", "$HOME/.local/share/solana/install/active_release/bin/agave-validator")]
+    if kind == "FD":
+        return [getattr(rc, f"{pre}_FDCTL", "$HOME/firedancer/bin/fdctl"),
+                getattr(rc, f"{pre}_FD_CONFIG_PATH", "/home/solana/config.toml")]
+    raise RuntimeError(f"[{role}] unknown client '{remote_client}'")
 
 
 # =============================== Tower helpers ================================
@@ -654,61 +1008,144 @@ def get_remote_pubkey_from_keyfile_via_keygen(cfg: SSHSettings, key_path_str: st
     SECONDARY: return pubkey from keypair.json.
     Order:
       1) Check readability (after expanding $HOME/~/).
-      2) Try via PATH: solana-keygen/agave-keygen.
-      3) Fallback: solana address -k.
-      4) Reserve: explicit keygen paths under $HOME/.local/share/solana/install/...
-    IMPORTANT: run_remote uses login-shell by default, so pass a single command string.
+      2) Hedged in one round trip, first valid pubkey by priority: solana-keygen, agave-keygen
+         (PATH), solana address -k, explicit keygen paths under $HOME/.local/share/solana/install/...
+    IMPORTANT: run_remote wraps the command in a shell (env snapshot or login-shell), so pass a single command string.
     """
-    key_path = remote_expand_path(cfg, key_path_str)
-
-    res_chk = run_remote(cfg, f'[ -r {shlex.quote(key_path)} ] && echo OK || echo NO_KEY')
-    if (res_chk.stdout or "").strip() != "OK":
+    st = remote_stat(cfg, key_path_str, max_age_s=60)
+    key_path = st.realpath
+    if not (st.exists and st.readable):
         raise RuntimeError(f"Remote key not found/not readable: {key_path}")
 
-    cmd_kgen = (
-        f'(command -v solana-keygen >/dev/null 2>&1 && solana-keygen pubkey {shlex.quote(key_path)}) || '
-        f'(command -v agave-keygen  >/dev/null 2>&1 && agave-keygen  pubkey {shlex.quote(key_path)}) || '
-        f'echo'
-    )
-    r1 = run_remote(cfg, cmd_kgen)
-    out1 = (r1.stdout or "").strip()
-    if out1:
-        return out1
-
-    cmd_sol = f'command -v solana >/dev/null 2>&1 && solana address -k {shlex.quote(key_path)} || echo'
-    r2 = run_remote(cfg, cmd_sol)
-    out2 = (r2.stdout or "").strip()
-    if out2:
-        return out2
-
+    kq = shlex.quote(key_path)
     probe = rf'''
-set -e
 K1="$HOME/.local/share/solana/install/active_release/bin/solana-keygen"
-if [ -x "$K1" ]; then "$K1" pubkey {shlex.quote(key_path)} && exit 0; fi
+if [ -x "$K1" ]; then "$K1" pubkey {kq} && exit 0; fi
 K2="$(ls -1dt "$HOME"/.local/share/solana/install/releases/*/bin/solana-keygen 2>/dev/null | head -n1 || true)"
-if [ -n "$K2" ] && [ -x "$K2" ]; then "$K2" pubkey {shlex.quote(key_path)} && exit 0; fi
+if [ -n "$K2" ] && [ -x "$K2" ]; then "$K2" pubkey {kq} && exit 0; fi
 exit 3
 '''.strip()
-    r3 = run_remote(cfg, probe)
-    out3 = (r3.stdout or "").strip()
-    if out3:
-        return out3
-
-    # Diagnostics — show environment on SECONDARY
-    diag = run_remote(cfg,
-                      f'echo "USER=$(id -un) HOME=$HOME SHELL=$SHELL"; '
-                      f'echo "PATH=$PATH"; '
-                      f'echo "KEY={shlex.quote(key_path)}"; '
-                      f'(ls -l {shlex.quote(key_path)} || true); '
-                      f'(command -v solana-keygen || true); '
-                      f'(command -v agave-keygen || true); '
-                      f'(command -v solana || true); '
-                      f'echo DONE'
-                      )
+    diag = (f'echo "USER=$(id -un) HOME=$HOME SHELL=$SHELL"; '
+            f'echo "PATH=$PATH"; '
+            f'echo "KEY={kq}"; '
+            f'(ls -l {kq} || true); '
+            f'(command -v solana-keygen || true); '
+            f'(command -v agave-keygen || true); '
+            f'(command -v solana || true); '
+            f'echo DONE')
+    name, out = hedged_remote(cfg, [
+        Attempt("solana_keygen", f"solana-keygen pubkey {kq}", PUBKEY_ERE),
+        Attempt("agave_keygen", f"agave-keygen pubkey {kq}", PUBKEY_ERE),
+        Attempt("solana_address", f"solana address -k {kq}", PUBKEY_ERE),
+        Attempt("install_dirs", probe, PUBKEY_ERE),
+    ], diag=diag)
+    if name:
+        return out
     raise RuntimeError(
         "solana-keygen/agave-keygen not found on SECONDARY and fallback `solana address -k` failed.\n"
-        f"--- STDOUT ---\n{(diag.stdout or '').strip()}\n--- STDERR ---\n{(diag.stderr or '').strip()}"
+        f"--- DIAGNOSTICS ---\n{out}"
+    )
+
+
+# ============================== Local JSON-RPC ================================
+
+def rpc_call(url: str, method: str, params: list | None = None, timeout: float = 5.0):
+    """Minimal JSON-RPC 2.0 call. Returns `result`; raises RuntimeError with the RPC error otherwise."""
+    import urllib.error
+    import urllib.request    # ~20 ms of imports (http, email, ssl): only paid when an RPC is made
+    body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params or []}).encode()
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+
+    def fetch():
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return json.loads(resp.read().decode())
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise RuntimeError(f"RPC {method} @ {url}: {e}")
+
+    data = cassette_call("rpc", {"url": url, "method": method, "params": params or []}, fetch)
+    if "error" in data:
+        err = data["error"] or {}
+        raise RuntimeError(f"RPC {method} @ {url}: {err.get('message', err)} {err.get('data') or ''}".rstrip())
+    return data.get("result")
+
+
+def local_rpc_health(url: str, timeout: float = 2.0) -> tuple[bool, str]:
+    """(healthy, detail) from getHealth; detail carries 'behind by N slots' style messages."""
+    try:
+        res = rpc_call(url, "getHealth", timeout=timeout)
+        return res == "ok", str(res)
+    except RuntimeError as e:
+        return False, str(e)
+
+
+def remote_rpc_call(cfg: SSHSettings, url: str, method: str, params: list | None = None, timeout: float = 5.0,
+                    node: str = "SECONDARY"):
+    """JSON-RPC call to an RPC reachable from the remote host (e.g. SECONDARY's 127.0.0.1), via SSH."""
+    body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params or []})
+    remote_py = (
+        "import sys, urllib.request\n"
+        f"req = urllib.request.Request({url!r}, data={body!r}.encode(), headers={{'Content-Type': 'application/json'}})\n"
+        "try:\n"
+        f"    print(urllib.request.urlopen(req, timeout={timeout!r}).read().decode())\n"
+        "except Exception as e:\n"
+        "    print(e, file=sys.stderr); sys.exit(1)\n"
     )
+    try:
+        res = run_remote(cfg, "python3 - <<'PY'\n" + remote_py + "PY", timeout=int(timeout) + 5, login_shell=False)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"RPC {method} @ {node} {url}: ssh timeout")
+    if res.returncode != 0:
+        raise RuntimeError(f"RPC {method} @ {node} {url}: {(res.stderr or res.stdout or '').strip()}")
+    try:
+        data = json.loads(res.stdout)
+    except ValueError:
+        raise RuntimeError(f"RPC {method} @ {node} {url}: bad response {res.stdout!r}")
+    if "error" in data:
+        err = data["error"] or {}
+        raise RuntimeError(f"RPC {method} @ {node} {url}: {err.get('message', err)}")
+    return data.get("result")
+
+
+def slot_lag_snapshot(main_url: str, cfg: SSHSettings, remote_url: str, timeout: float = 5.0,
+                      main_cfg: SSHSettings | None = None) -> dict:
+    """
+    Query slot (processed) and health on MAIN and SECONDARY concurrently.
+    Returns {main_slot, remote_slot, lag, main_health, remote_health}; lag > 0 means SECONDARY is behind.
+    main_cfg (controller mode): MAIN's RPC is queried over SSH like SECONDARY's.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _main():
+        if main_cfg is not None:
+            slot = remote_rpc_call(main_cfg, main_url, "getSlot", [{"commitment": "processed"}], timeout=timeout,
+                                   node="MAIN")
+            try:
+                health = remote_rpc_call(main_cfg, main_url, "getHealth", timeout=timeout, node="MAIN")
+            except RuntimeError as e:
+                health = str(e)
+            return slot, str(health)
+        slot = rpc_call(main_url, "getSlot", [{"commitment": "processed"}], timeout=timeout)
+        return slot, local_rpc_health(main_url, timeout=timeout)[1]
+
+    def _remote():
+        slot = remote_rpc_call(cfg, remote_url, "getSlot", [{"commitment": "processed"}], timeout=timeout)
+        try:
+            health = remote_rpc_call(cfg, remote_url, "getHealth", timeout=timeout)
+        except RuntimeError as e:
+            health = str(e)
+        return slot, str(health)
+
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fm, fr = ex.submit(_main), ex.submit(_remote)
+        (main_slot, main_health), (remote_slot, remote_health) = fm.result(), fr.result()
+    return {
+        "main_slot": int(main_slot),
+        "remote_slot": int(remote_slot),
+        "lag": int(main_slot) - int(remote_slot),
+        "main_health": main_health,
+        "remote_health": remote_health,
+    }
 
 
 # =============================== Tower helpers ================================
@@ -734,13 +1171,15 @@ def get_local_identity_from_monitor(ledger_path: Path, agave_bin: str = "agave-v
     Run `agave-validator --ledger <path> monitor`, read lines until "Identity:",
     then gracefully terminate the process.
     """
-    proc = subprocess.Popen(
-        [agave_bin, "--ledger", str(ledger_path), "monitor"],
+    argv = [agave_bin, "--ledger", str(ledger_path), "monitor"]
+    proc = cassette_popen("local_popen", {"cmd": argv}, lambda: subprocess.Popen(
+        argv,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         text=True,
         bufsize=1,
-    )
+        preexec_fn=child_preexec(),
+    ))
     identity: Optional[str] = None
     start = time.time()
     try:
@@ -766,3 +1205,15 @@ def get_local_identity_from_monitor(ledger_path: Path, agave_bin: str = "agave-v
     if not identity:
         raise RuntimeError("Failed to extract Identity from 'agave-validator monitor' output")
     return identity
+
+
+def get_identity_from_monitor_remote(cfg: SSHSettings, ledger_path: str, agave_bin: str = "agave-validator",
+                                     wait_sec: float = 3.0, node: str = "MAIN") -> str:
+    """`agave-validator --ledger <path> monitor` on a target, first "Identity:" line (controller mode)."""
+    cmd = (f"timeout {wait_sec:g} {agave_bin} --ledger {shlex.quote(str(ledger_path))} monitor 2>&1 "
+           f"| grep -m1 '^ *Identity:'")
+    res = run_remote(cfg, cmd, timeout=wait_sec + 10)
+    line = (res.stdout or "").strip()
+    if not line.startswith("Identity:"):
+        raise RuntimeError(f"[{node}] Failed to extract Identity from 'agave-validator monitor' output")
+    return line.split(":", 1)[1].strip()
@@ -1,25 +1,41 @@
 # verify_identity.py
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from pathlib import Path as _P
+from typing import TYPE_CHECKING
 
+import remote_config as rc  # SECONDARY / MAIN_SSH are read lazily (built from .env on first access)
 from remote_config import (
     LEDGER_PATH_DEFAULT,
     LOCAL_VALIDATOR_KEY,
     LOCAL_UNSTAKED_IDENTITY,
+    MAIN_UNSTAKED_IDENTITY,
     REMOTE_VALIDATOR_KEY,
-    SECONDARY,  # single server from .env
     REMOTE_LEDGER_PATH,
+    LOCAL_RPC_URL,
+    REMOTE_RPC_URL,
 )
 from uttils import (
     SSHSettings,
-    run_remote,
     check_connection,
+    capture_remote_env,
+    set_login_shell_default,
     detect_client_local,
-    detect_client_remote_type, get_local_identity_from_monitor, get_local_pubkey_from_keyfile,
+    detect_client_remote, get_local_identity_from_monitor, get_local_pubkey_from_keyfile,
+    get_identity_from_monitor_remote,
     get_remote_pubkey_from_keyfile_via_keygen,
+    remote_expand_path,
+    remote_set_identity_paths,
+    remote_stat_many,
+    slot_lag_snapshot,
 )
 
-from swap import perform_swap
-from pathlib import Path as _P
+from cassette import set_cassette
+from spawner import set_spawn_default
+
+if TYPE_CHECKING:
+    from swap import SwapLeg
 
 # helpers expected:
 # get_local_identity_from_monitor(main_ledger) -> str
@@ -27,103 +43,228 @@ from pathlib import Path as _P
 # get_remote_pubkey_from_keyfile_via_keygen(cfg, key_path_str) -> str
 
 
-def verify(
+def wait_slot_lag(
+    secondary_cfg: SSHSettings,
+    max_lag: int,
+    wait_s: float,
+    main_rpc: str,
+    remote_rpc: str,
+    poll_s: float = 2.0,
+    verbose: bool = False,
+    main_cfg: SSHSettings | None = None,
+) -> tuple[bool, dict | None, str]:
+    """
+    Poll both nodes until SECONDARY is within max_lag slots of MAIN and its getHealth is "ok".
+    Returns (ok, last snapshot, reason); the snapshot is None when the last poll got no answer from an RPC.
+    """
+    deadline = time.monotonic() + max(0.0, wait_s)
+    snap, reason = None, ""
+    while True:
+        try:
+            snap = slot_lag_snapshot(main_rpc, secondary_cfg, remote_rpc, main_cfg=main_cfg)
+            reason = (f"lag {snap['lag']} slots (MAIN {snap['main_slot']} / SECONDARY {snap['remote_slot']}), "
+                      f"SECONDARY health: {snap['remote_health']}")
+            if snap["lag"] <= max_lag and snap["remote_health"] == "ok":
+                return True, snap, reason
+        except RuntimeError as e:
+            snap, reason = None, str(e)
+        if time.monotonic() + poll_s > deadline:
+            return False, snap, reason
+        if verbose:
+            print(f"[VERBOSE] [SLOTS] waiting: {reason}")
+        time.sleep(poll_s)
+
+
+def verify(main_ledger: Path, main_key: Path, **kwargs) -> int:
+    return verify_and_swap(main_ledger, main_key, **kwargs)[0]
+
+
+def verify_and_swap(
     main_ledger: Path,
     main_key: Path,
     *,
     local_unstaked_identity: Path | None = None,
     remote_validator_key: str | None = None,
+    remote_unstaked_identity: str | None = None,
     remote_ledger: Path | None = None,
     assume_yes: bool | None = None,
     fast: bool | None = None,
     force_main_client: str | None = None,
     force_remote_client: str | None = None,
     verbose: bool | None = None,
-) -> int:
-    secondary_cfg: SSHSettings = SECONDARY
+    login_shell: bool | None = None,
+    refresh_env: bool | None = None,
+    fd_mode: str = "sequential",
+    fd_trigger_delay_ms: int = 10,
+    agave_mode: str = "sequential",
+    main_timeout: float | None = None,
+    main_early_signal: str | None = None,
+    auto_rollback: bool = True,
+    max_slot_lag: int | None = 10,
+    slot_lag_wait: float = 60.0,
+    plan_only: bool = False,
+    spawn_method: str | None = None,
+    low_jitter: bool = False,
+    low_jitter_cpu: int | None = None,
+    low_jitter_rt: bool = False,
+    low_jitter_report: bool = False,
+    vote_gap: bool = False,
+    vote_gap_wait: float = 10.0,
+    vote_account_check: bool = False,
+    vote_account_wait: float = 30.0,
+    metrics_out: Path | None = None,
+    prewarm: bool = True,
+    prewarm_exec: bool = False,
+    budget: float | None = None,
+    controller: bool = False,
+    tower_trigger: bool = False,
+    tower_trigger_wait: float = 5.0,
+    rtt_gate: bool = False,
+    rtt_gate_factor: float = 2.0,
+    rtt_gate_wait: float = 5.0,
+    rtt_gate_rebaseline: bool = False,
+    record: Path | None = None,
+    replay: Path | None = None,
+    replay_realtime: bool = False,
+) -> "tuple[int, SwapLeg | None]":
+    secondary_cfg: SSHSettings = rc.SECONDARY
+    # controller mode: this host is neither node, MAIN is driven over SSH exactly like SECONDARY
+    main_cfg: SSHSettings | None = None
+    if controller:
+        if rc.MAIN_SSH is None:
+            print("[CONTROLLER] MAIN_SSH_HOST is not set in .env: cannot reach MAIN")
+            return 3, None
+        main_cfg = rc.MAIN_SSH
+    set_login_shell_default(bool(login_shell))
+    if spawn_method:
+        set_spawn_default(spawn_method)
+    if replay:
+        set_cassette("replay", replay, realtime=replay_realtime)
+        print(f"[CASSETTE] replaying {replay}{' (recorded timing)' if replay_realtime else ''}: nothing is executed")
+    elif record:
+        set_cassette("record", record)
+        print(f"[CASSETTE] recording to {record}")
 
     print(f"[MAIN] Ledger: {main_ledger}")
     print(f"[MAIN] Key:    {main_key}")
 
+    targets = [("SECONDARY", secondary_cfg)] + ([("MAIN", main_cfg)] if main_cfg is not None else [])
+    for node, cfg in targets:
+        ok, err = check_connection(cfg)
+        if not ok:
+            print(f"[SSH] Connection to {node} failed.")
+            if err:
+                print("stderr:", err)
+            print("Hint: eval $(ssh-agent) && ssh-add ~/.ssh/<YOUR_KEY>")
+            return 3, None
+
+    # capture login env once per target (or take it from the persistent cache)
+    if not login_shell:
+        for node, cfg in targets:
+            env = capture_remote_env(cfg, refresh=bool(refresh_env))
+            if verbose:
+                if env:
+                    print(f"[VERBOSE] {node} env snapshot: PATH={env.get('PATH', '')}")
+                else:
+                    print(f"[VERBOSE] {node} env snapshot unavailable, using login shell")
+
     # client autodetect (overridable)
-    main_client = (force_main_client or detect_client_local(main_ledger))
+    if force_main_client:
+        main_client = force_main_client
+    elif main_cfg is not None:
+        main_client, _ = detect_client_remote(main_cfg, main_ledger, cli_fallback=True)
+    else:
+        main_client = detect_client_local(main_ledger)
     print(f"[MAIN] Client: {main_client}")
 
-    ok, err = check_connection(secondary_cfg)
-    if not ok:
-        print("[SSH] Connection to SECONDARY failed.")
-        if err:
-            print("stderr:", err)
-        print("Hint: eval $(ssh-agent) && ssh-add ~/.ssh/<YOUR_KEY>")
-        return 3
-
     # choose SECONDARY ledger: --remote-ledger > REMOTE_LEDGER_PATH > main_ledger
     remote_ledger_effective = (remote_ledger or (Path(REMOTE_LEDGER_PATH) if REMOTE_LEDGER_PATH else main_ledger))
-    remote_client = (force_remote_client or detect_client_remote_type(secondary_cfg, remote_ledger_effective))
-    print(f"[SECONDARY] Client: {remote_client}")
-
-    # fallback: if process detection failed on SECONDARY, guess by CLI presence
-    if (remote_client or '').upper() == 'UNKNOWN' and not force_remote_client:
-        r_ag = run_remote(secondary_cfg, "command -v agave-validator || command -v solana-validator || echo")
-        ag = (r_ag.stdout or '').strip()
-        r_fd = run_remote(secondary_cfg, "command -v fdctl || echo")
-        fd = (r_fd.stdout or '').strip()
-        if ag:
-            remote_client = 'AGAVE'
-        elif fd:
-            remote_client = 'FD'
-        print(f"[SECONDARY] Client (by CLI presence): {remote_client}")
+    # process detection and the CLI-presence fallback are hedged in one SSH round trip
+    if force_remote_client:
+        remote_client = force_remote_client
+        print(f"[SECONDARY] Client: {remote_client}")
+    else:
+        remote_client, source = detect_client_remote(secondary_cfg, remote_ledger_effective, cli_fallback=True)
+        if source.startswith("cli_"):
+            print(f"[SECONDARY] Client (by CLI presence): {remote_client}")
+        else:
+            print(f"[SECONDARY] Client: {remote_client}")
 
     # Sanity checks: paths on MAIN and SECONDARY
     problems: list[str] = []
     # MAIN paths
-    if not _P(main_ledger).exists():
-        problems.append(f"MAIN ledger not found: {main_ledger}")
-    if not _P(main_key).exists():
-        problems.append(f"MAIN validator key not found: {main_key}")
-    unst = (local_unstaked_identity or LOCAL_UNSTAKED_IDENTITY)
-    if not _P(unst).exists():
-        problems.append(f"MAIN unstaked identity not found: {unst}")
-
-    # SECONDARY paths (expand remotely)
-    r_key = remote_validator_key or str(REMOTE_VALIDATOR_KEY)
-    try:
-        rk_exp = run_remote(secondary_cfg, f'[ -r {r_key} ] && echo OK || echo NO')
-        if (rk_exp.stdout or '').strip() != 'OK':
-            problems.append(f"SECONDARY validator key not readable: {r_key}")
-    except Exception as e:
-        problems.append(f"SECONDARY key check failed: {e}")
+    unst = (local_unstaked_identity or (MAIN_UNSTAKED_IDENTITY if main_cfg is not None else LOCAL_UNSTAKED_IDENTITY))
+    if main_cfg is not None:
+        try:
+            m_tools = remote_set_identity_paths(main_client, "MAIN") if (main_client or '').upper() in ("AGAVE", "FD") else []
+            mst = remote_stat_many(main_cfg, [str(main_ledger), str(main_key), str(unst), *m_tools])
+            if mst[str(main_ledger)].type != "dir":
+                problems.append(f"MAIN ledger not found: {main_ledger}")
+            if not mst[str(main_key)].readable:
+                problems.append(f"MAIN validator key not found: {main_key}")
+            if not mst[str(unst)].readable:
+                problems.append(f"MAIN unstaked identity not found: {unst}")
+            if m_tools and not mst[m_tools[0]].executable:
+                problems.append(f"MAIN set-identity CLI not executable: {mst[m_tools[0]].realpath}")
+        except Exception as e:
+            problems.append(f"MAIN path check failed: {e}")
+    else:
+        if not _P(main_ledger).exists():
+            problems.append(f"MAIN ledger not found: {main_ledger}")
+        if not _P(main_key).exists():
+            problems.append(f"MAIN validator key not found: {main_key}")
+        if not _P(unst).exists():
+            problems.append(f"MAIN unstaked identity not found: {unst}")
 
+    # SECONDARY paths: key, ledger and set-identity tools stat'ed in one round trip (also warms the path cache)
+    r_key = remote_validator_key or str(REMOTE_VALIDATOR_KEY)
     remote_ledger_effective = (remote_ledger or (Path(REMOTE_LEDGER_PATH) if REMOTE_LEDGER_PATH else main_ledger))
     try:
-        led_path = run_remote(secondary_cfg, f'[ -d {remote_ledger_effective} ] && echo OK || echo NO')
-        if (led_path.stdout or '').strip() != 'OK':
+        tools = remote_set_identity_paths(remote_client) if (remote_client or '').upper() in ("AGAVE", "FD") else []
+        st = remote_stat_many(secondary_cfg, [r_key, str(remote_ledger_effective), *tools])
+        if not (st[r_key].exists and st[r_key].readable):
+            problems.append(f"SECONDARY validator key not readable: {r_key}")
+        if st[str(remote_ledger_effective)].type != "dir":
             problems.append(f"SECONDARY ledger directory not found: {remote_ledger_effective}")
+        if tools and not st[tools[0]].executable:
+            problems.append(f"SECONDARY set-identity CLI not executable: {st[tools[0]].realpath}")
     except Exception as e:
-        problems.append(f"SECONDARY ledger check failed: {e}")
+        problems.append(f"SECONDARY path check failed: {e}")
 
     if problems:
         print("Pre-flight checks failed:")
         for p in problems:
             print(" -", p)
-        return 2
+        return 2, None
+
+    def main_pub() -> str:
+        if main_cfg is not None:
+            return get_remote_pubkey_from_keyfile_via_keygen(main_cfg, str(main_key))
+        return get_local_pubkey_from_keyfile(main_key)
+
+    def main_mon() -> str:
+        if main_cfg is not None:
+            return get_identity_from_monitor_remote(main_cfg, remote_expand_path(main_cfg, str(main_ledger)))
+        return get_local_identity_from_monitor(main_ledger)
+
+    # key lookups on both nodes run concurrently
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        f_main_pub = pool.submit(main_pub)
+        f_sec_pub = pool.submit(get_remote_pubkey_from_keyfile_via_keygen, secondary_cfg, r_key)
+        f_main_mon = None if fast else pool.submit(main_mon)
+        main_key_pub = f_main_pub.result()
+        secondary_key_pub = f_sec_pub.result()
+        main_identity = f_main_mon.result() if f_main_mon else None
 
     # fast mode: skip monitor, compare keys only
     if fast:
-        main_key_pub = get_local_pubkey_from_keyfile(main_key)
-        secondary_key_pub = get_remote_pubkey_from_keyfile_via_keygen(secondary_cfg, r_key)
         print(f"[FAST] MAIN pubkey: {main_key_pub}")
         print(f"[FAST] SECONDARY pubkey: {secondary_key_pub}")
         current_voting = main_key_pub
     else:
         # full verification via monitor
-        main_identity = get_local_identity_from_monitor(main_ledger)
         print(f"[MAIN] Identity (monitor): {main_identity}")
-
-        main_key_pub = get_local_pubkey_from_keyfile(main_key)
         print(f"[MAIN] Pubkey from keyfile: {main_key_pub}")
-
-        secondary_key_pub = get_remote_pubkey_from_keyfile_via_keygen(secondary_cfg, r_key)
         print(f"[SECONDARY] Pubkey from remote validator key: {secondary_key_pub}")
 
         ok_main = (main_identity == main_key_pub)
@@ -134,29 +275,75 @@ def verify(
         print(f"  SECONDARY: Identity(monitor) == SECONDARY key ? {'OK' if ok_remote else 'MISMATCH'}")
 
         if not (ok_main and ok_remote):
-            return 1
+            return 1, None
         current_voting = main_identity
 
-    # confirmation before SWAP (unless --yes)
-    if not assume_yes:
+    # SECONDARY must be caught up with MAIN (both local RPCs, queried concurrently)
+    slot_lag = None
+    if max_slot_lag is not None:
+        ok_lag, slot_lag, lag_reason = wait_slot_lag(
+            secondary_cfg, max_slot_lag, (0.0 if plan_only else slot_lag_wait),
+            LOCAL_RPC_URL, REMOTE_RPC_URL, verbose=bool(verbose), main_cfg=main_cfg
+        )
+        print(f"[SLOTS] {lag_reason}")
+        why = ("RPC unreachable, slot lag unknown" if slot_lag is None
+               else f"SECONDARY not within {max_slot_lag} slots of MAIN or not healthy")
+        if not ok_lag and plan_only:
+            print(f"[SLOTS] {why}; a real swap would be blocked.")
+        elif not ok_lag:
+            print(f"[SLOTS] {why} after {slot_lag_wait:g}s; swap blocked (--skip-slot-check to swap without it).")
+            return 6, None
+
+    # confirmation before SWAP (unless --yes or dry run)
+    if not assume_yes and not plan_only:
         try:
             input("Press ENTER to start SWAP (Ctrl+C to cancel)… ")
         except KeyboardInterrupt:
             print("Cancelled by user.")
-            return 130
+            return 130, None
 
-    # SWAP
-    perform_swap(
+    # SWAP (the swap machinery is only imported once a swap is actually going to be planned)
+    from swap import perform_swap
+    leg = perform_swap(
         main_client=main_client,
         remote_client=remote_client,
         current_voting_pubkey=current_voting,
         main_ledger=main_ledger,
-        local_unstaked_identity=(local_unstaked_identity or LOCAL_UNSTAKED_IDENTITY),
+        local_unstaked_identity=unst,
         secondary_cfg=secondary_cfg,
         remote_validator_key=r_key,
         remote_ledger=remote_ledger_effective,
         cleanup_remote_tower=True,
+        fd_trigger_delay_ms=fd_trigger_delay_ms,
+        fd_mode=fd_mode,
+        agave_mode=agave_mode,
+        main_timeout_s=main_timeout,
+        main_early_pattern=main_early_signal,
+        local_validator_key=main_key,
+        remote_unstaked_identity=remote_unstaked_identity,
+        auto_rollback=auto_rollback,
+        slot_lag=slot_lag,
+        plan_only=plan_only,
+        low_jitter=low_jitter,
+        low_jitter_cpu=low_jitter_cpu,
+        low_jitter_rt=low_jitter_rt,
+        low_jitter_report=low_jitter_report,
+        vote_gap=vote_gap,
+        vote_gap_wait_s=vote_gap_wait,
+        vote_account_check=vote_account_check,
+        vote_account_wait_s=vote_account_wait,
+        metrics_out=metrics_out,
+        prewarm=prewarm,
+        prewarm_exec=prewarm_exec,
+        budget_s=budget,
+        main_cfg=main_cfg,
+        tower_trigger=tower_trigger,
+        tower_trigger_wait_s=tower_trigger_wait,
+        rtt_gate=rtt_gate,
+        rtt_gate_factor=rtt_gate_factor,
+        rtt_gate_wait_s=rtt_gate_wait,
+        rtt_gate_rebaseline=rtt_gate_rebaseline,
         assume_yes=(assume_yes or False),
         verbose=(verbose or False),
     )
-    return 0
+    return 0, leg
@@ -0,0 +1,305 @@
+# votegap.py
+import re
+import shlex
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import remote_config as rc
+from uttils import SSHSettings, rpc_call, run_remote
+
+# ================================ Vote-gap analyzer ================================
+# The dark window that matters is "last vote from MAIN" -> "first vote from SECONDARY".
+# Both validator logs are scanned from shortly before the swap: the scanner binary-searches the
+# file by timestamp (multi-GB logs are never read from the start), filters identity/vote lines
+# and hands them to a generator pipeline. The same scanner source runs locally and (via python3)
+# on SECONDARY, so only matching lines cross the wire.
+
+LOG_LOOKBACK_S = 30.0
+# Agave: "voting: <slot> <stake%>" (replay stage), "Identity set to <pubkey>" (admin RPC set-identity).
+# Firedancer: vote / identity lines differ between releases; override in remote_config if needed.
+VOTE_PATTERN = r"(?:voting: |vote[^0-9\n]{0,40}slot\W{0,3})(\d+)"
+IDENTITY_PATTERN = r"(?i:identity (?:set|changed|switched) to|set.identity)"
+
+
+def _patterns() -> tuple[str, str]:
+    return (getattr(rc, "VOTE_LOG_PATTERN", None) or VOTE_PATTERN,
+            getattr(rc, "IDENTITY_LOG_PATTERN", None) or IDENTITY_PATTERN)
+
+
+_SCAN_PY = r'''
+import calendar, os, re, sys, time
+_AG = re.compile(rb"^\[(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d+))?Z")
+_FD = re.compile(rb"^[A-Z]+\s+(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d+)")
+def ts_of(line):
+    m = _AG.match(line)
+    if m:
+        y, mo, d, h, mi, s = (int(x) for x in m.groups()[:6])
+        return calendar.timegm((y, mo, d, h, mi, s)) + (float(b"0." + m.group(7)) if m.group(7) else 0.0)
+    m = _FD.match(line)
+    if m:
+        # no year in FD lines: the current one, unless that puts the line in the future (December read in January)
+        mo, d, h, mi, s = (int(x) for x in m.groups()[:5])
+        now = time.time()
+        y = time.localtime(now).tm_year
+        t = time.mktime((y, mo, d, h, mi, s, 0, 0, -1))
+        if t > now + 86400:
+            t = time.mktime((y - 1, mo, d, h, mi, s, 0, 0, -1))
+        return t + float(b"0." + m.group(6))
+    return None
+def first_ts(f, limit=200):
+    for _ in range(limit):
+        line = f.readline()
+        if not line:
+            return None
+        t = ts_of(line)
+        if t is not None:
+            return t
+    return None
+def seek(f, target, size):
+    lo, hi = 0, size
+    while hi - lo > 65536:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()
+        t = first_ts(f)
+        if t is None or t >= target:
+            hi = mid
+        else:
+            lo = mid
+    f.seek(lo)
+    if lo:
+        f.readline()
+def scan(path, start, end, pattern):
+    rx = re.compile(pattern.encode())
+    with open(path, "rb") as f:
+        seek(f, start, os.fstat(f.fileno()).st_size)
+        for raw in f:
+            if not rx.search(raw):
+                continue
+            t = ts_of(raw)
+            if t is None or t < start:
+                continue
+            if t > end:
+                break
+            yield t, raw.decode(errors="replace").rstrip()
+'''
+_SCAN_MAIN = r'''
+if __name__ == "__main__":
+    for t, line in scan(os.path.expanduser(os.path.expandvars(sys.argv[1])), float(sys.argv[2]), float(sys.argv[3]), sys.argv[4]):
+        print("%.6f\t%s" % (t, line))
+'''
+_scan_ns: dict = {}
+exec(compile(_SCAN_PY, "<votegap-scan>", "exec"), _scan_ns)
+
+
+def _filter_pattern() -> str:
+    vote, ident = _patterns()
+    return f"(?:{vote})|(?:{ident})"
+
+
+def scan_local(path: Path, start: float, end: float) -> Iterator[tuple[float, str]]:
+    yield from _scan_ns["scan"](str(Path(path).expanduser()), start, end, _filter_pattern())
+
+
+def scan_remote(cfg: SSHSettings, path: str, start: float, end: float, timeout: int = 30,
+                node: str = "SECONDARY") -> Iterator[tuple[float, str]]:
+    cmd = (f"python3 -c {shlex.quote(_SCAN_PY + _SCAN_MAIN)} {shlex.quote(path)} "
+           f"{start:.6f} {end:.6f} {shlex.quote(_filter_pattern())}")
+    res = run_remote(cfg, cmd, timeout=timeout, login_shell=False)
+    if res.returncode != 0:
+        raise RuntimeError(f"[{node}] log scan failed: {(res.stderr or res.stdout or '').strip()[:200]}")
+    for row in (res.stdout or "").splitlines():
+        ts, _, line = row.partition("\t")
+        yield float(ts), line
+
+
+def classify(lines: Iterable[tuple[float, str]]) -> Iterator[tuple[float, str, int | None]]:
+    """(ts, raw line) -> (ts, 'vote'|'identity', slot)."""
+    vote_pat, ident_pat = _patterns()
+    vote_re, ident_re = re.compile(vote_pat), re.compile(ident_pat)
+    for ts, line in lines:
+        if ident_re.search(line):
+            yield ts, "identity", None
+            continue
+        m = vote_re.search(line)
+        if m:
+            yield ts, "vote", int(m.group(1))
+
+
+def _last_main_vote(events: Iterable[tuple[float, str, int | None]]):
+    cutoff, last = None, None
+    for ts, kind, slot in events:
+        if kind == "identity" and cutoff is None:
+            cutoff = ts
+        elif kind == "vote" and (cutoff is None or ts <= cutoff):
+            last = (ts, slot)
+    return last
+
+
+def _first_secondary_vote(events: Iterable[tuple[float, str, int | None]], after_slot: int, after_ts: float):
+    switched = None
+    for ts, kind, slot in events:
+        if kind == "identity" and switched is None and ts >= after_ts - LOG_LOOKBACK_S:
+            switched = ts
+        elif kind == "vote" and slot > after_slot and (switched is not None or ts >= after_ts):
+            return ts, slot
+    return None
+
+
+def _fmt_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%H:%M:%S.%f")[:-3]
+
+
+def measure_vote_gap(
+        cfg: SSHSettings,
+        swap_ts: float,
+        *,
+        main_log: Path | str | None = None,
+        remote_log: str | None = None,
+        wait_s: float = 10.0,
+        poll_s: float = 1.0,
+        verbose: bool = False,
+        main_cfg: SSHSettings | None = None,
+) -> dict | None:
+    """
+    Vote gap around a swap that started at wall-clock swap_ts. Waits up to wait_s for SECONDARY's
+    first vote to show up in its log. Returns None (with a note) if either side cannot be found.
+    Millisecond gap assumes both hosts' clocks are NTP-synced; the slot gap does not.
+    main_cfg (controller mode): MAIN's log (MAIN_VALIDATOR_LOG) is scanned over SSH like SECONDARY's.
+    """
+    remote_log = remote_log or getattr(rc, "REMOTE_VALIDATOR_LOG", "$HOME/solana/validator.log")
+    start = swap_ts - LOG_LOOKBACK_S
+    if main_cfg is not None:
+        main_log = main_log or getattr(rc, "MAIN_VALIDATOR_LOG", "$HOME/solana/validator.log")
+        try:
+            main_vote = _last_main_vote(classify(scan_remote(main_cfg, str(main_log), start, time.time(),
+                                                             node="MAIN")))
+        except RuntimeError as e:
+            print(f"[VOTES] {e}")
+            return None
+    else:
+        main_log = Path(main_log or getattr(rc, "LOCAL_VALIDATOR_LOG", Path.home() / "solana/validator.log"))
+        try:
+            main_vote = _last_main_vote(classify(scan_local(main_log, start, time.time())))
+        except OSError as e:
+            print(f"[VOTES] MAIN log unavailable ({main_log}): {e.strerror}")
+            return None
+    if main_vote is None:
+        print(f"[VOTES] no MAIN vote lines in {main_log} since {_fmt_ts(start)}")
+        return None
+
+    deadline = time.monotonic() + wait_s
+    sec_vote = None
+    while True:
+        try:
+            sec_vote = _first_secondary_vote(
+                classify(scan_remote(cfg, remote_log, start, time.time() + 1)), main_vote[1], main_vote[0]
+            )
+        except RuntimeError as e:
+            print(f"[VOTES] {e}")
+            return None
+        if sec_vote is not None or time.monotonic() + poll_s > deadline:
+            break
+        if verbose:
+            print("[VERBOSE] [VOTES] waiting for SECONDARY's first vote…")
+        time.sleep(poll_s)
+    if sec_vote is None:
+        print(f"[VOTES] SECONDARY has not voted within {wait_s:g}s (log: {remote_log})")
+        return None
+
+    res = {
+        "main_last_vote_slot": main_vote[1],
+        "main_last_vote_ts": round(main_vote[0], 3),
+        "secondary_first_vote_slot": sec_vote[1],
+        "secondary_first_vote_ts": round(sec_vote[0], 3),
+        "gap_ms": round((sec_vote[0] - main_vote[0]) * 1000.0, 1),
+        "gap_slots": max(0, sec_vote[1] - main_vote[1] - 1),
+    }
+    print(f"[VOTES] MAIN last vote: slot {res['main_last_vote_slot']} @ {_fmt_ts(main_vote[0])}; "
+          f"SECONDARY first vote: slot {res['secondary_first_vote_slot']} @ {_fmt_ts(sec_vote[0])}")
+    print(f"[VOTES] vote gap ≈ {res['gap_ms']:.0f} ms, {res['gap_slots']} slot(s) without a vote")
+    return res
+
+
+# ============================== Vote-account accounting ==============================
+# Independent of logs: the vote account itself (getVoteAccounts on MAIN's local RPC) is snapshotted
+# before the trigger, MAIN's processed slot is read again the moment its set-identity has exited, and the
+# account is polled afterwards until a vote for a slot past that reference lands.
+
+def current_slot(rpc_url: str | None = None, timeout: float = 5.0) -> int:
+    return int(rpc_call(rpc_url or rc.LOCAL_RPC_URL, "getSlot", [{"commitment": "processed"}], timeout=timeout))
+
+
+def vote_account_snapshot(node_pubkey: str, rpc_url: str | None = None, timeout: float = 5.0) -> dict:
+    """lastVote / root / cumulative credits of the vote account whose node is node_pubkey, plus current slot."""
+    url = rpc_url or rc.LOCAL_RPC_URL
+    res = rpc_call(url, "getVoteAccounts", [{"commitment": "processed", "keepUnstakedDelinquents": True}],
+                   timeout=timeout)
+    acc = next((a for grp in ("current", "delinquent") for a in (res or {}).get(grp, [])
+                if a.get("nodePubkey") == node_pubkey), None)
+    if acc is None:
+        raise RuntimeError(f"RPC getVoteAccounts @ {url}: no vote account for node {node_pubkey}")
+    ec = acc.get("epochCredits") or []
+    return {
+        "vote_pubkey": acc.get("votePubkey"),
+        "last_vote": int(acc.get("lastVote") or 0),
+        "root_slot": int(acc.get("rootSlot") or 0),
+        "credits": int(ec[-1][1]) if ec else 0,
+        "epoch": int(ec[-1][0]) if ec else None,
+        "slot": current_slot(url, timeout=timeout),
+        "ts": time.time(),
+    }
+
+
+def wait_votes_resumed(
+        node_pubkey: str,
+        before: dict,
+        ref: dict,
+        *,
+        rpc_url: str | None = None,
+        wait_s: float = 30.0,
+        poll_s: float = 0.2,
+        verbose: bool = False,
+) -> dict | None:
+    """
+    Poll until the vote account lands a vote for a slot after ref["slot"], MAIN's processed slot read right
+    after its set-identity exited ({"slot", "ts"}). MAIN cannot vote past what it had processed when it gave
+    up the identity, so such a vote is the new holder's. Later-landing MAIN votes (<= ref slot) move the
+    "last MAIN vote" forward. `before` is the pre-trigger snapshot (credits baseline).
+    Returns {main_last_vote, secondary_first_vote, slots_without_vote, credits_*, resume_ms} or None.
+    """
+    deadline = time.monotonic() + wait_s
+    main_last = before["last_vote"]
+    while True:
+        try:
+            snap = vote_account_snapshot(node_pubkey, rpc_url)
+        except RuntimeError as e:
+            snap = None
+            if verbose:
+                print(f"[VERBOSE] [VOTE ACCOUNT] {e}")
+        if snap is not None:
+            if snap["last_vote"] > ref["slot"]:
+                res = {
+                    "vote_pubkey": before["vote_pubkey"],
+                    "slot_at_trigger": before["slot"],
+                    "slot_at_unstake": ref["slot"],
+                    "main_last_vote": main_last,
+                    "secondary_first_vote": snap["last_vote"],
+                    "slots_without_vote": max(0, snap["last_vote"] - main_last - 1),
+                    "credits_before": before["credits"],
+                    "credits_after": snap["credits"],
+                    "credits_earned": snap["credits"] - before["credits"],
+                    "resume_ms": round((snap["ts"] - ref["ts"]) * 1000.0, 1),
+                }
+                print(f"[VOTE ACCOUNT] votes resumed: last MAIN vote {main_last}, first SECONDARY vote "
+                      f"{res['secondary_first_vote']} -> {res['slots_without_vote']} slot(s) without a landed vote; "
+                      f"credits +{res['credits_earned']} (resume {res['resume_ms']:.0f} ms after MAIN's unstake)")
+                return res
+            main_last = max(main_last, snap["last_vote"])
+        if time.monotonic() + poll_s > deadline:
+            print(f"[VOTE ACCOUNT] no vote after slot {ref['slot']} landed within {wait_s:g}s "
+                  f"(last vote {main_last})")
+            return None
+        time.sleep(poll_s)
@@ -0,0 +1,608 @@
+# wanlab.py
+import argparse
+import csv
+import json
+import os
+import queue
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+# ================================ WAN rehearsal lab ================================
+# Runs verify + swap in every trigger mode against a SECONDARY that sits behind a userspace TCP proxy
+# injecting latency, jitter and loss — no root, no tc/netem. SECONDARY is either an SSH stand-in (an exec
+# server plus `ssh`/`scp` shims put first in PATH) or a real sshd. Both nodes are sandboxed under one
+# temp dir with fake validator CLIs that log when they switch identity, so the dark window (MAIN switched
+# -> SECONDARY switched) is measured from the same clock. Output: CSV + SVG of dark window and total
+# duration against RTT.
+#
+#   python wanlab.py                                   # default profile matrix, all modes
+#   python wanlab.py --profiles lan,continent,180:20:0.01 --modes FD:armed,AGAVE:sequential --repeat 3
+#   python wanlab.py --sshd 127.0.0.1:22               # real sshd (see README for the requirements)
+
+
+@dataclass(frozen=True)
+class NetProfile:
+    name: str
+    rtt_ms: float
+    jitter_ms: float = 0.0
+    loss: float = 0.0               # per-segment loss probability
+
+
+PROFILES = {
+    "lan": NetProfile("lan", 0.3),
+    "metro": NetProfile("metro", 5.0, 0.5),
+    "region": NetProfile("region", 30.0, 3.0, 0.001),
+    "continent": NetProfile("continent", 100.0, 10.0, 0.005),
+    "intercontinent": NetProfile("intercontinent", 180.0, 20.0, 0.01),
+}
+MODES = ("AGAVE:sequential", "AGAVE:armed", "AGAVE:bg", "FD:sequential", "FD:armed", "FD:bg")
+
+MSS = 1448
+RTO_MIN_MS = 200.0                  # Linux minimum retransmission timeout
+SSH_HANDSHAKE_RTTS = 4              # new connection: TCP + version/KEXINIT + KEX + NEWKEYS/auth
+SSH_MUX_RTTS = 1                    # reused ControlMaster: channel open
+SSH_CONTROL_PERSIST_S = 60.0
+RESULT_TAG = "__WANLAB__:"
+
+
+def parse_profile(s: str) -> NetProfile:
+    """Profile name or `rtt[:jitter[:loss]]` (ms, ms, probability)."""
+    if s in PROFILES:
+        return PROFILES[s]
+    parts = s.split(":")
+    try:
+        vals = [float(x) for x in parts]
+    except ValueError:
+        raise ValueError(f"unknown profile {s!r} (use {', '.join(PROFILES)} or rtt[:jitter[:loss]])")
+    return NetProfile(f"rtt{parts[0]}", *vals)
+
+
+# ------------------------------- Latency/loss proxy -------------------------------
+
+class WanProxy:
+    """
+    TCP proxy on 127.0.0.1 that delays every chunk by one-way latency ± jitter. A lost segment is
+    modelled as a tail-loss retransmission: the chunk (and everything behind it, in-order delivery)
+    is held back by max(RTO_MIN_MS, RTT + 4·jitter).
+    """
+
+    def __init__(self, upstream: tuple[str, int], profile: NetProfile, seed: int = 1):
+        self.upstream = upstream
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.srv = socket.create_server(("127.0.0.1", 0))
+        self.port = self.srv.getsockname()[1]
+        self.lost = 0
+        self._closed = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self) -> None:
+        self._closed = True
+        self.srv.close()
+
+    def _accept(self) -> None:
+        while not self._closed:
+            try:
+                cli, _ = self.srv.accept()
+            except OSError:
+                return
+            try:
+                up = socket.create_connection(self.upstream)
+            except OSError:
+                cli.close()
+                continue
+            for s in (cli, up):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._pipe(cli, up)
+            self._pipe(up, cli)
+
+    def _delay_s(self, nbytes: int) -> float:
+        p = self.profile
+        d = p.rtt_ms / 2 + self.rng.uniform(-p.jitter_ms / 2, p.jitter_ms / 2)
+        if p.loss > 0:
+            segs = max(1, -(-nbytes // MSS))
+            if self.rng.random() < 1 - (1 - p.loss) ** segs:
+                self.lost += 1
+                d += max(RTO_MIN_MS, p.rtt_ms + 4 * p.jitter_ms)
+        return max(0.0, d) / 1000.0
+
+    def _pipe(self, src: socket.socket, dst: socket.socket) -> None:
+        q: queue.Queue = queue.Queue()
+
+        def reader():
+            last = 0.0
+            while True:
+                try:
+                    data = src.recv(65536)
+                except OSError:
+                    data = b""
+                # in-order delivery: a delayed (lost) chunk holds back the ones behind it
+                last = max(last, time.monotonic() + (self._delay_s(len(data)) if data else 0.0))
+                q.put((last, data))
+                if not data:
+                    return
+
+        def writer():
+            while True:
+                at, data = q.get()
+                wait = at - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    if data:
+                        dst.sendall(data)
+                    else:
+                        dst.shutdown(socket.SHUT_WR)
+                        return
+                except OSError:
+                    return
+
+        threading.Thread(target=reader, daemon=True).start()
+        threading.Thread(target=writer, daemon=True).start()
+
+
+# ---------------------------------- SSH stand-in ----------------------------------
+# Frames: 1-byte channel + 4-byte length + payload. Client -> server: 0 = stdin (empty = EOF).
+# Server -> client: 1 = stdout, 2 = stderr, 3 = exit code. Before the header the client plays
+# ping-pong round trips standing in for the SSH handshake (or a ControlMaster channel open).
+
+_FRAME_PY = r'''
+import json, socket, struct
+def send_frame(sock, ch, data=b""):
+    sock.sendall(struct.pack(">BI", ch, len(data)) + data)
+def recv_exact(sock, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+def recv_frame(sock):
+    head = recv_exact(sock, 5)
+    if head is None:
+        return None, None
+    ch, n = struct.unpack(">BI", head)
+    return ch, (recv_exact(sock, n) if n else b"")
+'''
+_frame_ns: dict = {}
+exec(compile(_FRAME_PY, "<wanlab-frame>", "exec"), _frame_ns)
+send_frame, recv_exact, recv_frame = _frame_ns["send_frame"], _frame_ns["recv_exact"], _frame_ns["recv_frame"]
+
+_CLIENT_PY = r'''
+import os, sys, threading, time
+def _opts(argv, with_arg):
+    opts, pos, i = {}, [], 0
+    while i < len(argv):
+        a = argv[i]
+        if pos:
+            pos.append(a)
+            i += 1
+        elif a in with_arg and i + 1 < len(argv):
+            if a == "-o":
+                k, _, v = argv[i + 1].partition("=")
+                opts[k.lower()] = v
+            else:
+                opts[a] = argv[i + 1]
+            i += 2
+        elif a.startswith("-"):
+            i += 1
+        else:
+            pos.append(a)
+            i += 1
+    return opts, pos
+def _handshake_rtts(opts, user, host, port):
+    cp = opts.get("controlpath", "none")
+    if opts.get("controlmaster", "no") == "no" or cp == "none":
+        return HANDSHAKE
+    path = os.path.expanduser(cp.replace("%r", user).replace("%h", host).replace("%p", str(port)))
+    fresh = os.path.exists(path) and time.time() - os.path.getmtime(path) < PERSIST
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "a").close()
+    os.utime(path)
+    return MUX if fresh else HANDSHAKE
+def _dest(s):
+    user, _, host = s.rpartition("@")
+    return user or os.environ.get("USER", "root"), host
+def connect(opts, user, host, port, cmd):
+    s = socket.create_connection(("127.0.0.1", port))
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    for _ in range(_handshake_rtts(opts, user, host, port)):
+        s.sendall(b"P")
+        recv_exact(s, 1)
+    hdr = json.dumps({"cmd": cmd}).encode()
+    s.sendall(b"H" + struct.pack(">I", len(hdr)) + hdr)
+    return s
+def pump(s, stdin, stdout, stderr):
+    def feed():
+        try:
+            while True:
+                data = os.read(stdin.fileno(), 65536) if stdin is not None else b""
+                send_frame(s, 0, data)
+                if not data:
+                    return
+        except OSError:
+            pass
+    threading.Thread(target=feed, daemon=True).start()
+    while True:
+        ch, data = recv_frame(s)
+        if ch is None:
+            return 255
+        if ch == 3:
+            return int(data)
+        out = stdout if ch == 1 else stderr
+        out.write(data)
+        out.flush()
+'''
+
+_SSH_SHIM = r'''
+def main():
+    opts, pos = _opts(sys.argv[1:], ("-p", "-i", "-o", "-l", "-F", "-E", "-b", "-c", "-m"))
+    user, host = _dest(pos[0])
+    cmd = " ".join(pos[1:]) or None
+    s = connect(opts, user, host, int(opts.get("-p", 22)), cmd)
+    rc = pump(s, sys.stdin.buffer, sys.stdout.buffer, sys.stderr.buffer)
+    sys.stdout.flush()
+    os._exit(rc)
+main()
+'''
+
+_SCP_SHIM = r'''
+import shlex
+def main():
+    opts, pos = _opts(sys.argv[1:], ("-P", "-i", "-o", "-l", "-F", "-c", "-S"))
+    src, dst = pos[0], pos[1]
+    remote = lambda p: ":" in p and not p.startswith("/")
+    if remote(dst):
+        who, _, path = dst.partition(":")
+        user, host = _dest(who)
+        s = connect(opts, user, host, int(opts.get("-P", 22)), "cat > " + shlex.quote(path))
+        with open(src, "rb") as f:
+            rc = pump(s, f, sys.stdout.buffer, sys.stderr.buffer)
+    else:
+        who, _, path = src.partition(":")
+        user, host = _dest(who)
+        s = connect(opts, user, host, int(opts.get("-P", 22)), "cat " + shlex.quote(path))
+        with open(dst, "wb") as f:
+            rc = pump(s, None, f, sys.stderr.buffer)
+    os._exit(rc)
+main()
+'''
+
+
+class StandInServer:
+    """Exec server behind the proxy: runs each command with HOME set to SECONDARY's sandbox home."""
+
+    def __init__(self, home: Path, env: dict | None = None):
+        self.env = {**os.environ, **(env or {}), "HOME": str(home)}
+        self.home = home
+        self.srv = socket.create_server(("127.0.0.1", 0))
+        self.port = self.srv.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self) -> None:
+        self.srv.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self.srv.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            while True:
+                b = recv_exact(conn, 1)
+                if b != b"P":
+                    break
+                conn.sendall(b"P")
+            if b != b"H":
+                return
+            hdr = json.loads(recv_exact(conn, int.from_bytes(recv_exact(conn, 4), "big")))
+            cmd = hdr.get("cmd")
+            p = subprocess.Popen(["bash", "-c", cmd] if cmd else ["bash"], cwd=self.home, env=self.env,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 start_new_session=True)
+            lock = threading.Lock()
+            alive = [True]
+
+            def send(ch: int, data: bytes) -> None:
+                if not alive[0]:
+                    return
+                try:
+                    with lock:
+                        send_frame(conn, ch, data)
+                except OSError:
+                    alive[0] = False
+
+            def stdin_feed():
+                try:
+                    while True:
+                        ch, data = recv_frame(conn)
+                        if ch is None or not data:
+                            break
+                        p.stdin.write(data)
+                        p.stdin.flush()
+                except OSError:
+                    pass
+                try:
+                    p.stdin.close()
+                except OSError:
+                    pass
+
+            def drain(pipe, ch: int):
+                while True:
+                    data = os.read(pipe.fileno(), 65536)
+                    if not data:
+                        return
+                    send(ch, data)
+
+            threading.Thread(target=stdin_feed, daemon=True).start()
+            outs = [threading.Thread(target=drain, args=(p.stdout, 1)), threading.Thread(target=drain, args=(p.stderr, 2))]
+            for t in outs:
+                t.start()
+            for t in outs:
+                t.join()
+            send(3, str(p.wait()).encode())
+        except (OSError, ValueError, TypeError):
+            pass
+        finally:
+            conn.close()
+
+
+def write_shims(bin_dir: Path) -> None:
+    """`ssh` / `scp` shims talking to the stand-in (put bin_dir first in PATH)."""
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    consts = (f"HANDSHAKE = {SSH_HANDSHAKE_RTTS}\nMUX = {SSH_MUX_RTTS}\nPERSIST = {SSH_CONTROL_PERSIST_S}\n")
+    for name, body in (("ssh", _SSH_SHIM), ("scp", _SCP_SHIM)):
+        p = bin_dir / name
+        p.write_text(f"#!{sys.executable}\n" + _FRAME_PY + consts + _CLIENT_PY + body)
+        p.chmod(0o755)
+
+
+# ------------------------------------- Sandbox -------------------------------------
+
+_FAKE_CLI = r'''#!/bin/bash
+# wanlab stand-in for agave-validator / fdctl / solana-keygen ({role})
+case " $* " in
+  *" monitor "*) echo "Identity: $(cat "$HOME/solana/validator-keypair.json.pub")"; exec sleep 30;;
+  *" set-identity "*)
+    sleep "${{WANLAB_SI_S:-0.05}}"
+    echo "$(date +%s.%N) {role} switch ${{@: -1}}" >> "{events}"
+    echo "Set identity ok"; exit 0;;
+  *" pubkey "*) for a; do k="$a"; done; cat "$k.pub";;
+  *) echo "wanlab-cli 0.0";;
+esac
+'''
+VALIDATOR_PUBKEY = "7Np41oeYqPefeNQEHSv1UDhYrehxin3NStELsSKCT4K2"
+UNSTAKED_PUBKEY = "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"
+
+
+def build_sandbox(root: Path) -> dict:
+    """MAIN and SECONDARY homes with the layout remote_config.py expects by default."""
+    events = root / "events.log"
+    for role in ("main", "secondary"):
+        home = root / role
+        cli = _FAKE_CLI.format(role=role.upper(), events=events)
+        for rel in (".local/share/solana/install/active_release/bin/agave-validator",
+                    ".local/share/solana/install/active_release/bin/solana-keygen",
+                    "firedancer/bin/fdctl"):
+            p = home / rel
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text(cli)
+            p.chmod(0o755)
+        (home / "config.toml").write_text("# wanlab\n")
+        (home / "ledger").mkdir(parents=True, exist_ok=True)
+        (home / "solana").mkdir(parents=True, exist_ok=True)
+        for name, pub in (("validator-keypair.json", VALIDATOR_PUBKEY), ("unstaked-identity.json", UNSTAKED_PUBKEY)):
+            (home / "solana" / name).write_text("[" + ",".join(["1"] * 64) + "]")
+            (home / "solana" / (name + ".pub")).write_text(pub + "\n")
+    bin_dir = root / "main" / "bin"
+    (bin_dir).mkdir(parents=True, exist_ok=True)
+    for name in ("agave-validator", "solana-keygen"):
+        link = bin_dir / name
+        if not link.exists():
+            link.symlink_to(root / "main/.local/share/solana/install/active_release/bin" / name)
+    return {"root": root, "events": events, "main": root / "main", "secondary": root / "secondary",
+            "main_bin": bin_dir, "shims": root / "shims"}
+
+
+def dark_window_ms(events: Path) -> float | None:
+    """SECONDARY switch - MAIN switch; negative means both held the identity at once."""
+    t = {}
+    for line in events.read_text().splitlines() if events.exists() else []:
+        ts, role, _, _ = (line.split(" ", 3) + ["", "", ""])[:4]
+        t.setdefault(role, float(ts))
+    if "MAIN" not in t or "SECONDARY" not in t:
+        return None
+    return (t["SECONDARY"] - t["MAIN"]) * 1000.0
+
+
+# ------------------------------------- Matrix -------------------------------------
+
+def _case_main(spec: dict) -> None:
+    """Child process: HOME is MAIN's sandbox home, SSH settings come from the environment."""
+    import remote_config as rc
+    if spec.get("remote_paths"):
+        # real sshd: SECONDARY sandbox is addressed by absolute paths
+        sec = spec["secondary"]
+        rc.REMOTE_AGAVE_CLI = f"{sec}/.local/share/solana/install/active_release/bin/agave-validator"
+        rc.REMOTE_FDCTL = f"{sec}/firedancer/bin/fdctl"
+        rc.REMOTE_FD_CONFIG_PATH = f"{sec}/config.toml"
+    from verify_identity import verify_and_swap
+    remote_client, mode = spec["mode"].split(":")
+    t0 = time.perf_counter()
+    err = ""
+    try:
+        code, _ = verify_and_swap(
+            Path(spec["main"]) / "ledger", Path(spec["main"]) / "solana/validator-keypair.json",
+            remote_validator_key=f"{spec['secondary']}/solana/validator-keypair.json",
+            remote_ledger=Path(spec["secondary"]) / "ledger",
+            assume_yes=True, force_main_client=spec["main_client"], force_remote_client=remote_client,
+            fd_mode=mode, agave_mode=mode, max_slot_lag=None, verbose=spec.get("verbose", False),
+        )
+    except Exception as e:
+        code, err = 1, f"{type(e).__name__}: {e}"
+    total = (time.perf_counter() - t0) * 1000.0
+    print(RESULT_TAG + json.dumps({"code": code, "total_ms": total, "error": err}), flush=True)
+
+
+def run_case(sb: dict, port: int, mode: str, *, main_client: str = "AGAVE", si_ms: float = 50.0,
+             sshd: bool = False, verbose: bool = False) -> dict:
+    events: Path = sb["events"]
+    events.write_text("")
+    env = {**os.environ, "HOME": str(sb["main"]), "SSH_HOST": "127.0.0.1", "SSH_PORT": str(port),
+           "SSH_USER": os.environ.get("USER", "root"), "WANLAB_SI_S": str(si_ms / 1000.0)}
+    env["PATH"] = os.pathsep.join(([] if sshd else [str(sb["shims"])]) + [str(sb["main_bin"]), env.get("PATH", "")])
+    spec = {"mode": mode, "main": str(sb["main"]), "secondary": str(sb["secondary"]), "main_client": main_client,
+            "remote_paths": sshd, "verbose": verbose}
+    t0 = time.perf_counter()
+    res = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--case", json.dumps(spec)],
+                         env=env, cwd=str(Path(__file__).resolve().parent), capture_output=True, text=True)
+    row = {"code": res.returncode or 1, "total_ms": (time.perf_counter() - t0) * 1000.0, "error": ""}
+    for line in res.stdout.splitlines():
+        if line.startswith(RESULT_TAG):
+            row = json.loads(line[len(RESULT_TAG):])
+    if row["code"] != 0 and not row["error"]:
+        tail = (res.stderr.strip() or res.stdout.strip()).splitlines()
+        row["error"] = tail[-1] if tail else ""
+    m = re.search(r"\[SWAP\] outage ≈ (\d+) ms", res.stdout)
+    row["reported_ms"] = float(m.group(1)) if m else None
+    row["dark_ms"] = dark_window_ms(events)
+    if verbose:
+        print(res.stdout)
+    return row
+
+
+def run_matrix(profiles: list[NetProfile], modes: list[str], *, repeat: int = 1, sshd: tuple[str, int] | None = None,
+               main_client: str = "AGAVE", si_ms: float = 50.0, workdir: Path | None = None,
+               verbose: bool = False) -> list[dict]:
+    root = Path(workdir or tempfile.mkdtemp(prefix="wanlab."))
+    sb = build_sandbox(root)
+    write_shims(sb["shims"])
+    server = None if sshd else StandInServer(sb["secondary"], {"WANLAB_SI_S": str(si_ms / 1000.0)})
+    upstream = sshd or ("127.0.0.1", server.port)
+    rows = []
+    try:
+        for prof in profiles:
+            proxy = WanProxy(upstream, prof)
+            try:
+                for mode in modes:
+                    runs = [run_case(sb, proxy.port, mode, main_client=main_client, si_ms=si_ms,
+                                     sshd=sshd is not None, verbose=verbose) for _ in range(repeat)]
+                    ok = [r for r in runs if r["code"] == 0]
+                    med = lambda k: round(statistics.median([r[k] for r in ok if r[k] is not None]), 1) if any(
+                        r[k] is not None for r in ok) else None
+                    row = {"profile": prof.name, "rtt_ms": prof.rtt_ms, "jitter_ms": prof.jitter_ms, "loss": prof.loss,
+                           "mode": mode, "runs": repeat, "ok": len(ok), "dark_ms": med("dark_ms"),
+                           "reported_ms": med("reported_ms"), "total_ms": med("total_ms"),
+                           "error": next((r["error"] for r in runs if r["code"] != 0), "")}
+                    rows.append(row)
+                    print(_fmt_row(row), flush=True)
+            finally:
+                proxy.close()
+    finally:
+        if server is not None:
+            server.close()
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return rows
+
+
+def _fmt_row(r: dict) -> str:
+    f = lambda v: "-" if v is None else f"{v:.0f}"
+    s = (f"[WANLAB] {r['profile']:<15} rtt {r['rtt_ms']:>6.1f} ms  {r['mode']:<17} "
+         f"dark {f(r['dark_ms']):>6} ms  reported {f(r['reported_ms']):>6} ms  total {f(r['total_ms']):>7} ms  "
+         f"ok {r['ok']}/{r['runs']}")
+    return s + (f"  ({r['error'][:100]})" if r["error"] else "")
+
+
+# -------------------------------------- Report --------------------------------------
+
+def write_csv(rows: list[dict], path: Path) -> None:
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+
+def write_svg(rows: list[dict], path: Path) -> None:
+    """Two panels (dark window, total duration) vs RTT, one line per mode; no plotting dependency."""
+    modes = list(dict.fromkeys(r["mode"] for r in rows))
+    colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"]
+    W, H, M = 520, 320, 50
+    xs = [r["rtt_ms"] for r in rows]
+    xmax = max(xs) or 1.0
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{2 * W}" height="{H + 30 + 18 * len(modes)}" '
+           f'font-family="sans-serif" font-size="11">']
+    for pi, (key, title) in enumerate((("dark_ms", "dark window, ms"), ("total_ms", "verify + swap total, ms"))):
+        ox = pi * W
+        vals = [r[key] for r in rows if r[key] is not None]
+        ymin, ymax = min(0.0, min(vals, default=0.0)), max(vals, default=1.0) or 1.0
+        X = lambda x: ox + M + (W - 2 * M) * x / xmax
+        Y = lambda y: H - M + (M - (H - M)) * (y - ymin) / ((ymax - ymin) or 1.0)
+        out.append(f'<text x="{ox + W / 2}" y="18" text-anchor="middle" font-size="13">{title}</text>')
+        out.append(f'<line x1="{X(0)}" y1="{Y(ymin)}" x2="{X(xmax)}" y2="{Y(ymin)}" stroke="black"/>')
+        out.append(f'<line x1="{X(0)}" y1="{Y(ymin)}" x2="{X(0)}" y2="{Y(ymax)}" stroke="black"/>')
+        for i in range(5):
+            yv = ymin + (ymax - ymin) * i / 4
+            xv = xmax * i / 4
+            out.append(f'<text x="{X(0) - 4}" y="{Y(yv) + 4}" text-anchor="end">{yv:.0f}</text>')
+            out.append(f'<text x="{X(xv)}" y="{Y(ymin) + 14}" text-anchor="middle">{xv:.0f}</text>')
+        out.append(f'<text x="{ox + W / 2}" y="{H - M + 30}" text-anchor="middle">RTT, ms</text>')
+        for mi, mode in enumerate(modes):
+            pts = sorted((r["rtt_ms"], r[key]) for r in rows if r["mode"] == mode and r[key] is not None)
+            c = colors[mi % len(colors)]
+            if pts:
+                out.append(f'<polyline fill="none" stroke="{c}" stroke-width="1.5" points="'
+                           + " ".join(f"{X(x):.1f},{Y(y):.1f}" for x, y in pts) + '"/>')
+                out += [f'<circle cx="{X(x):.1f}" cy="{Y(y):.1f}" r="2.5" fill="{c}"/>' for x, y in pts]
+    for mi, mode in enumerate(modes):
+        y = H + 24 + 18 * mi
+        out.append(f'<rect x="{M}" y="{y - 9}" width="12" height="10" fill="{colors[mi % len(colors)]}"/>')
+        out.append(f'<text x="{M + 18}" y="{y}">{mode}</text>')
+    out.append("</svg>")
+    path.write_text("\n".join(out))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--case":
+        _case_main(json.loads(sys.argv[2]))
+        raise SystemExit(0)
+    ap = argparse.ArgumentParser(description="verify + swap under simulated WAN latency/jitter/loss")
+    ap.add_argument("--profiles", default=",".join(PROFILES),
+                    help=f"comma list of {', '.join(PROFILES)} or rtt[:jitter[:loss]]")
+    ap.add_argument("--modes", default=",".join(MODES), help="comma list of CLIENT:mode (SECONDARY client)")
+    ap.add_argument("--main-client", choices=["AGAVE", "FD"], default="AGAVE")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per cell (median reported)")
+    ap.add_argument("--si-ms", type=float, default=50.0, help="fake set-identity duration")
+    ap.add_argument("--sshd", default=None, help="HOST:PORT of a real sshd instead of the stand-in")
+    ap.add_argument("--out", type=Path, default=Path("wanlab-out"))
+    ap.add_argument("--keep", action="store_true", help="keep the sandbox under --out")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    a = ap.parse_args()
+    sshd = None
+    if a.sshd:
+        h, _, p = a.sshd.rpartition(":")
+        sshd = (h, int(p))
+    a.out.mkdir(parents=True, exist_ok=True)
+    rows = run_matrix([parse_profile(s) for s in a.profiles.split(",") if s], [m for m in a.modes.split(",") if m],
+                      repeat=a.repeat, sshd=sshd, main_client=a.main_client, si_ms=a.si_ms,
+                      workdir=(a.out / "sandbox" if a.keep else None), verbose=a.verbose)
+    if rows:
+        write_csv(rows, a.out / "wanlab.csv")
+        write_svg(rows, a.out / "wanlab.svg")
+        print(f"[WANLAB] results: {a.out / 'wanlab.csv'}, plot: {a.out / 'wanlab.svg'}")